@@ -0,0 +1,30 @@
+import os
+import shutil
+import sys
+
+# Allows sharing modules with the dashboard when run as python .github/scripts/<script>.py
+sys.path.insert( 0, os.path.abspath( os.path.join( os.path.dirname( __file__ ), "..", ".." ) ) )
+
+from src.figure_cache import PRECOMPUTED_DIR
+
+def build_default_figures( output_dir=PRECOMPUTED_DIR ):
+    """ Renders the figures shown on the main pages before any filter is set, so that the dashboard can serve them
+    without running the callbacks. They are keyed on the version of the datasets in resources/ and need to be rebuilt
+    whenever those change.
+    """
+    # Importing the app loads the datasets and registers the callbacks, exactly as when serving.
+    import app
+    from src.callbacks import DEFAULT_VIEWS, figure_cache
+
+    if os.path.exists( output_dir ):
+        shutil.rmtree( output_dir )
+
+    for name, args in DEFAULT_VIEWS:
+        path = figure_cache.precompute( name, *args, output_dir=output_dir )
+        print( f"Rendered {name}{args} to {path}" )
+
+    return app.datasets.version
+
+if __name__ == "__main__":
+    version = build_default_figures()
+    print( f"Default figures built for datasets version {version}" )
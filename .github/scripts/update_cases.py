@@ -1,11 +1,24 @@
-from urllib.error import HTTPError
+import os
+import sys
+
+# Allows sharing modules with the dashboard when run as python .github/scripts/<script>.py
+sys.path.insert( 0, os.path.abspath( os.path.join( os.path.dirname( __file__ ), "..", ".." ) ) )
+
+import io
 import pandas as pd
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from tableauscraper import TableauScraper as TS
+from src.daily_cases import interpolate_daily_cases
+from src.fetch import FetchError, fetch, fetch_first
+from src.snapshots import format_cases, write_snapshot
+
+CASES_LOC = "resources/cases.csv"
+CASES_SNAPSHOT_LOC = "resources/cases.arrow"
 
 def append_wastewater( sd ):
     zip_loc = "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_WasteWater_San-Diego/master/Zipcodes.csv"
-    zips = pd.read_csv( zip_loc, usecols=["Zip_code", "Wastewater_treatment_plant"], dtype={"Zip_code" : str, "Wastewater_treatment_plant" : str } )
+    zips = pd.read_csv( io.BytesIO( fetch( zip_loc ) ), usecols=["Zip_code", "Wastewater_treatment_plant"], dtype={"Zip_code" : str, "Wastewater_treatment_plant" : str } )
     zips.columns = ["ziptext", "catchment_new"]
     zips["catchment_new"] = zips["catchment_new"].str.replace( " " , "" )
     zips = zips.set_index( "ziptext" )
@@ -34,13 +47,6 @@ def download_sd_cases():
 
         return dataframe
 
-    def _add_missing_cases( entry, start ):
-        entry = entry.set_index( "updatedate" ).reindex( pd.date_range( start, entry["updatedate"].max() ) ).rename_axis( "updatedate" ).reset_index()
-        indexer = pd.api.indexers.FixedForwardWindowIndexer(window_size=7)
-        entry["new_cases"] = entry.rolling( window=indexer, min_periods=1 )["new_cases"].apply( lambda x: x.max() / 7 )
-        entry["new_cases"] = entry["new_cases"].fillna(0)
-        return entry
-
     # First, we load current dataset of cases
     sd = pd.read_csv( "resources/cases.csv", parse_dates=["updatedate"] )
     sd = sd.loc[~sd["ziptext"].isna()]
@@ -83,9 +89,8 @@ def download_sd_cases():
     date = sd["updatedate"].unique()[-2]
 
     sdprob = sd.loc[sd["updatedate"]>date]
-    sdprob = sdprob.groupby( "ziptext" ).apply( _add_missing_cases, start=date + pd.Timedelta( days=1 ) )
-    sdprob = sdprob.drop( columns="ziptext" ).reset_index()
-    sdprob = sdprob.drop( columns="level_1" )
+    sdprob = interpolate_daily_cases( sdprob, start=date + pd.Timedelta( days=1 ) )
+    sdprob["new_cases"] = sdprob["new_cases"].fillna(0)
 
     sd = sd.loc[sd["updatedate"]<=date]
     sd = pd.concat( [sd,sdprob] )
@@ -108,21 +113,19 @@ def download_bc_cases():
     pandas.DataFrame
         DateFrame detailing the daily number of cases in Baja California, Mexico
     """
-    today = datetime.datetime.today()
+    # The file is published under the date it was generated. Try the last 10 days at once and keep the newest.
     date_range = 10
-    attempts = 0
-    while attempts < date_range:
-        print( f"Attemping to load BC data from {today.strftime( '%Y-%m-%d')}" )
-        date_url = int( today.strftime( "%Y%m%d" ) )
-        bc_url = f"https://datos.covid-19.conacyt.mx/Downloads/Files/Casos_Diarios_Estado_Nacional_Confirmados_{date_url}.csv"
-
-        try:
-            bc = pd.read_csv( bc_url, index_col="nombre" )
-            break
-        except HTTPError:
-            today = today - datetime.timedelta( days=1 )
-    else:
-        raise RuntimeError( f"Unable to find a valid download link. Last url tried was {bc_url}" )
+    dates = [datetime.datetime.today() - datetime.timedelta( days=i ) for i in range( date_range )]
+    bc_urls = { f"https://datos.covid-19.conacyt.mx/Downloads/Files/Casos_Diarios_Estado_Nacional_Confirmados_{date.strftime( '%Y%m%d' )}.csv" : date for date in dates }
+    print( f"Attemping to load BC data from {dates[-1].strftime( '%Y-%m-%d' )} to {dates[0].strftime( '%Y-%m-%d' )}" )
+
+    try:
+        bc_url, content = fetch_first( bc_urls, timeout=(5, 60), retries=1 )
+    except FetchError as err:
+        raise RuntimeError( f"Unable to find a valid download link. Last url tried was {err.url}" )
+    today = bc_urls[bc_url]
+    print( f"Loaded BC data from {today.strftime( '%Y-%m-%d' )}" )
+    bc = pd.read_csv( io.BytesIO( content ), index_col="nombre" )
 
     bc = bc.drop( columns=["cve_ent", "poblacion"] )
     bc = bc.T
@@ -149,12 +152,18 @@ def download_cases():
     pandas.DataFrame
         DataFrame detailing the cummulative cases in each ZIP code.
     """
-    sd = download_sd_cases()
-    bc = download_bc_cases()
-    c = pd.concat( [sd,bc] )
+    # Both sources are independent, so download them at the same time.
+    with ThreadPoolExecutor( max_workers=2 ) as pool:
+        sd = pool.submit( download_sd_cases )
+        bc = pool.submit( download_bc_cases )
+        c = pd.concat( [sd.result(), bc.result()] )
 
     return c
 
 if __name__ == "__main__":
     cases = download_cases()
-    cases.to_csv( "resources/cases.csv", index=False )
\ No newline at end of file
+    cases.to_csv( CASES_LOC, index=False )
+
+    # Typed snapshot of the cases just written, keyed to the hash of the CSV so readers can tell when it's stale. The
+    # CSV is read back so the snapshot holds exactly what a reader of the CSV would get.
+    write_snapshot( format_cases( pd.read_csv( CASES_LOC ) ), CASES_SNAPSHOT_LOC, source=CASES_LOC )
\ No newline at end of file
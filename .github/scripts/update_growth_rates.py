@@ -1,16 +1,26 @@
+import os
+import sys
+
+# Allows sharing modules with the dashboard when run as python .github/scripts/<script>.py
+sys.path.insert( 0, os.path.abspath( os.path.join( os.path.dirname( __file__ ), "..", ".." ) ) )
+
+import argparse
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 import matplotlib.dates as mdates
 from subprocess import run
 import json
 from pango_aliasor.aliasor import Aliasor
-import re
-from scipy.special import expit, logit
 import pickle
+from src.growth_model import fit_growth_model
+from src.growth_predictions import predict_prevalence
+from src.growth_scan import REGIONS, scan_growth_rates
+from src.lineage_collapse import LineageCollapser
 
 SEQS_LOCATION = "resources/sequences.csv"
 VOC_LOCATION = "resources/voc.txt"
+MODEL_LOCATION = "resources/clinical.model"
+SCAN_LOCATION = "resources/growth_rates_scan.csv"
 
 aliasor = Aliasor()
 
@@ -28,48 +38,16 @@ def load_cdc_variants():
         variants.append( entry["variant"] )
     return variants
 
-def load_sequences():
+def load_sequences( states=("San Diego",) ):
     seqs = pd.read_csv( SEQS_LOCATION, usecols=["ID", "collection_date", "epiweek", "lineage", "state"],
                        parse_dates=["collection_date", "epiweek"] )
-    seqs = seqs.loc[seqs["state"] == "San Diego"]
+    seqs = seqs.loc[seqs["state"].isin( states )]
     return seqs
 
-def collapse_lineage( entry : str, accepted_lineages: set[str] ):
-    if entry in accepted_lineages or "." not in entry:
-        return entry
-    elif re.match( "[A-Z]{2}.\d+$", entry ):
-        return aliasor.partial_compress( aliasor.uncompress( entry ), accepted_aliases=["BA"] )
-    return ".".join( entry.split( "." )[:-1] )
-
-
-def calculate_CIs( entry, name, model ):
-    return_df = entry.copy()
-    se = model.cov_params().loc[name,name].to_numpy()
-    se = np.sqrt( [xx@se@xx for xx in [[i, 1] for i in return_df.index]] )
-    return_df["upper"] = expit( logit( return_df["prevalence"] ) + 1.96 * se )
-    return_df["lower"] = expit( logit( return_df["prevalence"] ) - 1.96 * se )
-    return return_df
-
-
-def format_model_results( model_results, weeks : list ):
-    results = pd.DataFrame( model_results.predict( [[i, 1] for i in weeks] ), index=weeks,
-                            columns=model_results.model._ynames_map.values() )
-    results = results.drop( columns=["Other"] )
-    results = results.melt( var_name="variant", value_name="prevalence", ignore_index=False )
-    results = results.groupby( "variant" ).apply( lambda x: calculate_CIs( x, x.name, model_results ) )
-    return results
-
-
 def model_sequence_counts( df : pd.DataFrame, weeks : list ):
-    mdata = df.copy()
-    mdata["const"] = 1
-    X = mdata[["epiweek", "const"]]
-    Y = mdata["collapsed_linege"]
+    res = fit_growth_model( df["epiweek"], df["collapsed_linege"], previous_model=MODEL_LOCATION )
 
-    model = sm.MNLogit( Y, X, missing="drop" )
-    res = model.fit_regularized( maxiter=1000 )
-
-    results = format_model_results( res, weeks )
+    results = predict_prevalence( res, weeks )
 
     return results, res
 
@@ -83,7 +61,7 @@ def calculate_growth_rate( results ):
     return coeff
 
 def dump_model_names( model, collapsed_names ):
-    with open( "resources/clinical.model", "wb" ) as model_file:
+    with open( MODEL_LOCATION, "wb" ) as model_file:
         pickle.dump( model, model_file )
     with open( "resources/collapsed_names.csv", "w" ) as cn:
         cn.write( "lineage,collapsed_lineage\n" )
@@ -92,21 +70,8 @@ def dump_model_names( model, collapsed_names ):
 def smooth_sequence_counts( df : pd.DataFrame, weeks : list, forced_lineages : list[str], rounds : int = 10, min_sequences : int = 50 ):
     last_seqs = df.loc[df["epiweek"].isin( weeks )].copy()
 
-    previous_round = "lineage"
-    for i in range( rounds ):
-        counts = last_seqs[previous_round].value_counts()
-        accepted = set( list( counts.loc[counts > min_sequences].index ) + forced_lineages )
-        last_seqs[f"round_{i}"] = last_seqs[previous_round].apply( lambda x: collapse_lineage( x, accepted ) )
-
-        previous_round = f"round_{i}"
-        counts = last_seqs[previous_round].value_counts()
-        print(
-            f"Round {i} allowed {len( set( list( counts.loc[counts > min_sequences].index ) + forced_lineages ) )} lineages from {len( accepted )}" )
-    else:
-        last_seqs["collapsed_linege"] = last_seqs[previous_round]
-        last_seqs = last_seqs.drop( columns=[i for i in last_seqs.columns if i.startswith( "round" )] )
-        accepted = set( list( counts.loc[counts > min_sequences].index ) + forced_lineages )
-        last_seqs.loc[~last_seqs["collapsed_linege"].isin( accepted ), "collapsed_linege"] = "Other"
+    collapsed_names = LineageCollapser( aliasor ).collapse( last_seqs["lineage"], forced_lineages, rounds=rounds, min_sequences=min_sequences )
+    last_seqs["collapsed_linege"] = last_seqs["lineage"].map( collapsed_names )
 
     last_seqs["epiweek"] = mdates.date2num( last_seqs["epiweek"] )
 
@@ -114,7 +79,6 @@ def smooth_sequence_counts( df : pd.DataFrame, weeks : list, forced_lineages : l
     prediction_weeks = [max( last_weeks )+7*i for i in range(1,4)]
     last_week_prediction = last_weeks + prediction_weeks
 
-    collapsed_names = last_seqs.groupby( "lineage" ).first()["collapsed_linege"].to_dict()
     cat = last_seqs["collapsed_linege"].unique()
     cat = np.append( ["Other"], cat[cat != "Other"] )
     last_seqs["collapsed_linege"] = last_seqs["collapsed_linege"].astype( 'category' ).cat.set_categories( new_categories=cat )
@@ -199,9 +163,8 @@ def add_collapsed_lineages( seqs: pd.DataFrame, names: dict[str] ):
     seqs["collapsed_lineage"] = seqs["lineage"].replace( names )
     return seqs
 
-def calculate_growth_rates():
-    cdc_lineages = load_cdc_variants()
-    seqs = load_sequences()
+def calculate_growth_rates( seqs : pd.DataFrame, cdc_lineages : list[str] ):
+    seqs = seqs.loc[seqs["state"] == "San Diego"].copy()
     last_weeks = calculate_last_weeks( seqs )
     smooth_seqs, rates, names = smooth_sequence_counts( seqs, last_weeks, forced_lineages=cdc_lineages )
     rates = rates.sort_values( "growth_rate", ascending=False )
@@ -213,6 +176,15 @@ def calculate_growth_rates():
 
 
 if __name__ == "__main__":
-    growth_rates_filtered, all = calculate_growth_rates()
-    growth_rates_filtered.to_csv( "resources/growth_rates.csv", index=False )
-    all.to_csv( "resources/growth_rates_all.csv", index=False )
\ No newline at end of file
+    parser = argparse.ArgumentParser( description="Estimates lineage growth rates from resources/sequences.csv." )
+    parser.add_argument( "--scan", action="store_true", help=f"only scan growth rates over several windows in each region, to {SCAN_LOCATION}." )
+    args = parser.parse_args()
+
+    cdc_lineages = load_cdc_variants()
+    if args.scan:
+        scan = scan_growth_rates( load_sequences( states=REGIONS ), LineageCollapser( aliasor ), cdc_lineages )
+        scan.to_csv( SCAN_LOCATION, index=False )
+    else:
+        growth_rates_filtered, all = calculate_growth_rates( load_sequences(), cdc_lineages )
+        growth_rates_filtered.to_csv( "resources/growth_rates.csv", index=False )
+        all.to_csv( "resources/growth_rates_all.csv", index=False )
\ No newline at end of file
@@ -1,6 +1,36 @@
+import os
+import sys
+
+# Allows sharing modules with the dashboard when run as python .github/scripts/<script>.py
+sys.path.insert( 0, os.path.abspath( os.path.join( os.path.dirname( __file__ ), "..", ".." ) ) )
+
+import argparse
+import hashlib
+import inspect
+import json
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import pandas as pd
-from epiweeks import Week
-import datetime
+from src.epiweek import epiweek_start
+from src.fetch import FetchError, download, stream
+from src.snapshots import SEQUENCES_CSV, SEQUENCES_SNAPSHOT, format_sequences, write_snapshot
+from src.variants import ALIAS_KEY, ALIAS_KEY_URL
+
+SEARCH_MD = "https://raw.githubusercontent.com/andersen-lab/HCoV-19-Genomics/master/metadata.csv"
+PANGO_LOC = "https://raw.githubusercontent.com/andersen-lab/HCoV-19-Genomics/master/lineage_report.csv"
+METADATA_COLUMNS = ["ID", "collection_date", "location", "authors", "originating_lab", "zipcode", "host", "percent_coverage_cds"]
+# Upstream files are streamed and filtered this many rows at a time, so memory use doesn't grow with their size.
+CHUNKSIZE = 50000
+
+# ID and hash of each upstream row from the previous run. The normalized rows themselves are read back from
+# resources/sequences.csv, so the state isn't a second copy of the dataset.
+STATE_LOC = "resources/sequences_state.csv"
+# Local files used during normalization. If any of them change, every row is normalized again.
+NORMALIZATION_SOURCES = ["resources/excite_providers.csv", "resources/sdphl_sequences.txt"]
+# Bump to normalize every row again after a change to the normalization that normalization_version() can't see, e.g. in
+# a module other than those whose source it hashes.
+NORMALIZATION_VERSION = 1
 
 def load_excite_providers() :
     excite = pd.read_csv( "resources/excite_providers.csv" )
@@ -11,16 +41,29 @@ def load_file_as_list( loc ):
     with open( loc, "r" ) as open_file:
         return [line.strip() for line in open_file]
 
-def download_search():
-    """ Downloads the metadata from the SEARCH github repository. Removes entries with very wrong dates.
-    Returns
-    -------
-    pandas.DataFrame:
-        Data frame containing the metadata for all sequences generated by SEARCH
+@contextmanager
+def open_stream( loc ):
+    """ Opens a local file or URL for reading without loading it fully into memory.
     """
+    if loc.startswith( "http" ):
+        with stream( loc, timeout=(10, 120) ) as response:
+            response.raw.decode_content = True
+            yield response.raw
+    else:
+        with open( loc, "rb" ) as f:
+            yield f
 
-    search_md = "https://raw.githubusercontent.com/andersen-lab/HCoV-19-Genomics/master/metadata.csv"
-    md = pd.read_csv( search_md, usecols=["ID", "collection_date", "location", "authors", "originating_lab", "zipcode", "host", "percent_coverage_cds"] )
+def id_number( ids ):
+    """ Numeric part of SEARCH IDs, used to join metadata and lineages. IDs from elsewhere are kept as is.
+    """
+    num = ids.str.extract( "SEARCH-([0-9]+)", expand=False )
+    return num.fillna( ids )
+
+def filter_metadata( md ):
+    """ Keeps human samples from San Diego and Baja California with a sensible collection date, and adds the ID number
+    used to join with the lineage report. Each row is filtered independently, so this can be applied chunk by chunk.
+    """
+    md = md.copy()
     md["collection_date"] = md["collection_date"].astype( str )
 
     # Filter out incorrect samples or wastewater
@@ -36,6 +79,53 @@ def download_search():
 
     md = md.loc[~md["host"].isin(["Environment","Environmental"] )]
 
+    md["num"] = id_number( md["ID"] )
+
+    return md
+
+def load_metadata( loc=SEARCH_MD ):
+    """ Downloads the metadata from the SEARCH github repository. The file is streamed in chunks which are filtered as
+    they arrive, so only the sequences of interest are ever held in memory.
+    Returns
+    -------
+    pandas.DataFrame:
+        Raw metadata for the sequences of interest.
+    """
+    # Read everything as text, so a row hashes the same whatever the type inferred for the rest of its column.
+    with open_stream( loc ) as stream:
+        chunks = [filter_metadata( chunk ) for chunk in pd.read_csv( stream, usecols=METADATA_COLUMNS, dtype=str, chunksize=CHUNKSIZE )]
+    return pd.concat( chunks, ignore_index=True )
+
+def hash_rows( md ):
+    """ Hash of each row of raw metadata.
+    """
+    return pd.util.hash_pandas_object( md[METADATA_COLUMNS], index=False ).values
+
+def file_hash( loc ):
+    with open( loc, "rb" ) as f:
+        return hashlib.sha1( f.read() ).hexdigest()
+
+def normalization_version():
+    """ Hash of everything normalized rows depend on other than the upstream row: NORMALIZATION_VERSION, the source of
+    the normalization code and the local files it reads. Rows normalized under another version are all normalized again.
+    """
+    version = hashlib.sha1( str( NORMALIZATION_VERSION ).encode() )
+    for function in [normalize_metadata, load_excite_providers, load_file_as_list, epiweek_start]:
+        version.update( inspect.getsource( function ).encode() )
+    for loc in NORMALIZATION_SOURCES:
+        version.update( file_hash( loc ).encode() )
+    return version.hexdigest()
+
+def normalize_metadata( md ):
+    """ Cleans up the raw metadata: location, zipcode, dates, lab names, sequencer and provider. Each row is normalized
+    independently of the others, so rows can be processed in any grouping.
+    Returns
+    -------
+    pandas.DataFrame:
+        Normalized metadata, with the numeric part of the ID in num for joining with the lineage report.
+    """
+    md = md.copy()
+
     # Generate an identifiable location column
     md["state"] = "Baja California"
     md.loc[md["location"]=="North America/USA/California/San Diego","state"] = "San Diego"
@@ -46,9 +136,8 @@ def download_search():
     # Will covert all zipcodes to int except those with alphabetical characters.
     md["zipcode"] = pd.to_numeric( md["zipcode"], errors="coerce", downcast="integer" )
 
-    md["epiweek"] = md["collection_date"].apply( lambda x: Week.fromdate( datetime.datetime.strptime( x, "%Y-%m-%d" ).date() ).startdate() )
     md["collection_date"] = pd.to_datetime( md["collection_date"], format="%Y-%m-%d" ).dt.normalize()
-    md["days_past"] = ( md["collection_date"].max() - md["collection_date"] ).dt.days
+    md["epiweek"] = epiweek_start( md["collection_date"] )
 
     md["originating_lab"] = md["originating_lab"].replace( { 'UC San Diego Center for Advanced Laboratory Medicine' :  "UCSD CALM Lab",
                                                             "UCSD EXCITE" : "UCSD EXCITE Lab",
@@ -83,16 +172,29 @@ def download_search():
                                              "Genomica Lab Molecular, México" : "Genomica Laboratorio"} )
     md.loc[md["provider"].isna(),"provider"] = md["sequencer"]
 
-    # Add pangolin lineage information
-    pango_loc = "https://raw.githubusercontent.com/andersen-lab/HCoV-19-Genomics/master/lineage_report.csv"
-    pango = pd.read_csv( pango_loc, usecols=["taxon", "lineage"] )
-    pango["num"] = pango["taxon"].str.extract( "SEARCH-([0-9]+)" )
-    pango.loc[pango["num"].isna(),"num"] = pango["taxon"]
-    pango = pango[["num", "lineage"]]
+    return md[["ID", "collection_date", "zipcode", "epiweek", "sequencer", "provider", "state", "num"]]
 
+def load_lineages( nums, loc=PANGO_LOC ):
+    """ Streams the pangolin lineage report, keeping only the sequences in nums.
+    Parameters
+    ----------
+    nums : iterable
+        ID numbers, as returned by id_number(), of the sequences of interest.
+    """
+    nums = set( nums )
+    chunks = list()
+    with open_stream( loc ) as stream:
+        for chunk in pd.read_csv( stream, usecols=["taxon", "lineage"], chunksize=CHUNKSIZE ):
+            chunk["num"] = id_number( chunk["taxon"] )
+            chunks.append( chunk.loc[chunk["num"].isin( nums ), ["num", "lineage"]] )
+    return pd.concat( chunks, ignore_index=True )
 
-    md["num"] = md["ID"].str.extract( "SEARCH-([0-9]+)" )
-    md.loc[md["num"].isna(),"num"] = md["ID"]
+def add_lineages( md, pango ):
+    """ Adds pangolin lineage information to normalized metadata. Run over every sequence, as lineages are reassigned
+    whenever pangolin is updated.
+    """
+    md = md.copy()
+    md["days_past"] = ( md["collection_date"].max() - md["collection_date"] ).dt.days
 
     md = md.merge( pango, left_on="num", right_on="num", how="left", validate="one_to_one" )
 
@@ -103,6 +205,115 @@ def download_search():
 
     return md
 
+def load_state( loc=STATE_LOC, sequences_loc=SEQUENCES_CSV ):
+    """ Normalized metadata from the previous run: the rows of sequences_loc, along with the hash of the upstream row
+    each was normalized from.
+    Returns
+    -------
+    pandas.DataFrame:
+        Normalized metadata with row hashes, or None if there is no usable state. The state isn't usable if it was written
+        under another normalization_version(), or alongside a different sequences_loc than the one now on disk.
+    """
+    if not os.path.exists( loc ) or not os.path.exists( sequences_loc ):
+        return None
+    try:
+        with open( loc, "r" ) as f:
+            header = json.loads( f.readline().lstrip( "#" ) )
+            hashes = pd.read_csv( f, dtype={ "ID" : str, "row_hash" : "uint64" } )
+    except ValueError:
+        print( f"Unable to read {loc}. Normalizing every sequence." )
+        return None
+
+    if header.get( "normalization" ) != normalization_version():
+        print( "Normalization changed since the previous run. Normalizing every sequence." )
+        return None
+    if header.get( "sequences" ) != file_hash( sequences_loc ):
+        print( f"{sequences_loc} wasn't written with {loc}. Normalizing every sequence." )
+        return None
+
+    sequences = pd.read_csv( sequences_loc, usecols=["ID", "collection_date", "zipcode", "epiweek", "sequencer", "provider", "state"],
+                             parse_dates=["collection_date", "epiweek"], dtype={ "ID" : str } )
+    sequences["num"] = id_number( sequences["ID"] )
+    # Sequences dropped for their lineage aren't in sequences_loc, so they are normalized again.
+    return sequences.merge( hashes, on="ID", how="inner", validate="one_to_one" )
+
+def save_state( md, loc=STATE_LOC, sequences_loc=SEQUENCES_CSV ):
+    """ Writes the ID and row hash of md, with a header recording the normalization_version() and the hash of
+    sequences_loc, which must already hold the sequences built from md.
+    """
+    header = { "normalization" : normalization_version(), "sequences" : file_hash( sequences_loc ) }
+    temp = f"{loc}.tmp"
+    with open( temp, "w" ) as f:
+        f.write( f"# {json.dumps( header )}\n" )
+        md[["ID", "row_hash"]].to_csv( f, index=False )
+    os.replace( temp, loc )
+
+def update_metadata( md, state=None ):
+    """ Normalizes the raw metadata, reusing the entries of a previous run for rows which haven't changed upstream.
+    Parameters
+    ----------
+    md : pandas.DataFrame
+        output of load_metadata().
+    state : pandas.DataFrame
+        output of load_state(); normalized metadata from a previous run, with the row hashes it was computed from.
+
+    Returns
+    -------
+    pandas.DataFrame:
+        Normalized metadata for every row of md, in the same order, with the row hashes to use as the next state.
+    """
+    md = md.copy()
+    md["row_hash"] = hash_rows( md )
+
+    if state is None:
+        delta = md
+        unchanged = pd.DataFrame()
+    else:
+        previous = md["ID"].map( state.set_index( "ID" )["row_hash"] )
+        changed = previous.isna() | ( previous != md["row_hash"] )
+        delta = md.loc[changed]
+        unchanged = state.loc[state["ID"].isin( md.loc[~changed, "ID"] )]
+        print( f"{len( delta )} new or updated sequences, {len( state ) - len( unchanged )} not reused from the previous run." )
+
+    normalized = normalize_metadata( delta )
+    normalized["row_hash"] = delta["row_hash"]
+    normalized = pd.concat( [unchanged, normalized] ) if len( unchanged ) > 0 else normalized
+    return normalized.set_index( "ID" ).reindex( md["ID"] ).reset_index()
+
+def download_search( incremental=True ):
+    """ Downloads the metadata from the SEARCH github repository. Removes entries with very wrong dates. Only rows which
+    are new or were modified since the previous run are normalized, unless incremental is False. Writes the sequences to
+    resources/sequences.csv, followed by the state for the next run.
+    Returns
+    -------
+    pandas.DataFrame:
+        Data frame containing the metadata for all sequences generated by SEARCH
+    """
+    # The lineage report is downloaded to disk while the metadata is streamed, then filtered to the sequences kept.
+    with tempfile.TemporaryDirectory() as tempdir, ThreadPoolExecutor( max_workers=1 ) as pool:
+        pango_loc = pool.submit( download, PANGO_LOC, os.path.join( tempdir, "lineage_report.csv" ), timeout=(10, 120) )
+
+        state = load_state() if incremental else None
+        md = update_metadata( load_metadata(), state )
+        seqs = add_lineages( md.drop( columns=["row_hash"] ), load_lineages( md["num"], loc=pango_loc.result() ) )
+
+    seqs.to_csv( SEQUENCES_CSV, index=False )
+    # Written last, as it records the hash of the sequences it goes with.
+    save_state( md )
+    return seqs
+
 if __name__ == "__main__":
-    seqs_md = download_search()
-    seqs_md.to_csv( "resources/sequences.csv", index=False )
+    parser = argparse.ArgumentParser( description="Updates resources/sequences.csv from the SEARCH repository." )
+    parser.add_argument( "--full", action="store_true", help="normalize every sequence rather than only new or updated ones." )
+    args = parser.parse_args()
+
+    download_search( incremental=not args.full )
+
+    # Typed snapshot loaded by the dashboard. Built from the CSV so that both load identically.
+    write_snapshot( format_sequences( pd.read_csv( SEQUENCES_CSV ) ), SEQUENCES_SNAPSHOT, source=SEQUENCES_CSV )
+
+    # Lets the dashboard classify lineages designated under a new alias by the variant they descend from.
+    try:
+        download( ALIAS_KEY_URL, ALIAS_KEY )
+    except FetchError as err:
+        print( f"{err}. Keeping the previous alias key." )
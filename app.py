@@ -3,7 +3,10 @@ from dash import html, dcc
 import dash_bootstrap_components as dbc
 import src.format_resources as format_data
 import dash
+from src.api import register_api
 from src.callbacks import register_callbacks
+from src.dataset_manager import DatasetManager
+from src.http_cache import register_http_cache
 
 external_stylesheets = [dbc.themes.ZEPHYR, dbc.icons.BOOTSTRAP]
 app = dash.Dash( __name__, external_stylesheets=external_stylesheets )
@@ -17,12 +20,18 @@ app.scripts.append_script( {
     "external_url" : "https://raw.githubusercontent.com/watronfire/lone_pine/master/assets/gtag.js"
 })
 
-sequences = format_data.load_sequences()
-cases_whole = format_data.load_cases()
-growth_rates = format_data.load_growth_rates()
-ww_growth_rates = format_data.load_ww_growth_rates()
+datasets = DatasetManager()
+format_data.load_ww_growth_rates()
+# Started from the first request of each process, so that the refresh thread never runs in the gunicorn master, which
+# imports the app when preload_app is set.
+server.before_request( format_data.remote_data.start )
 
-register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rates )
+register_callbacks( app, datasets )
+register_api( server, datasets )
+
+# Callbacks read the local datasets and remote files. The commit date is refreshed in the background on its own schedule.
+register_http_cache( server, lambda: f"{datasets.version}:{format_data.remote_data.combined_version()}",
+                     uncached_outputs=["commit-date"] )
 
 app.layout = html.Div( children=[
     dcc.Location(id='url', refresh=False),
@@ -0,0 +1,22 @@
+## Gunicorn settings shared by the Dockerfile and Procfile. The app (and therefore every dataset loaded by app.py) is
+## imported once in the master process before forking, so workers share those pages copy-on-write instead of each
+## loading a private copy. Worker count can be overridden on the command line or through WEB_CONCURRENCY.
+import gc
+import logging
+import os
+
+bind = os.environ.get( "GUNICORN_BIND", "0.0.0.0:8000" )
+workers = int( os.environ.get( "WEB_CONCURRENCY", 3 ) )
+threads = 1
+preload_app = True
+
+# Messages logged by the app, e.g. dataset reloads, which happen in each worker separately.
+logging.basicConfig( level=logging.INFO, format="[%(process)d] [%(levelname)s] %(name)s: %(message)s" )
+
+
+def when_ready( server ):
+    # Called in the master once the app is loaded. Freezing moves everything allocated so far to a permanent
+    # generation the garbage collector never scans, otherwise the first collection in each worker would write to (and
+    # therefore copy) every page holding a tracked object.
+    gc.collect()
+    gc.freeze()
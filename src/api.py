@@ -0,0 +1,219 @@
+## api.py serves the numbers behind the dashboard's graphs as JSON or CSV under /api/v1, so they can be used without
+## going through the Dash callbacks. Responses are built from the same in-memory aggregates as the figures, cached per
+## version of the data and carry an ETag, which lets clients revalidate with If-None-Match.
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from flask import Blueprint, Response, jsonify, request
+
+import src.format_resources as format_data
+from src.figure_cache import FigureCache
+
+API_PREFIX = "/api/v1"
+FORMATS = { "json" : "application/json", "csv" : "text/csv" }
+REGIONS = { "sandiego" : "San Diego", "bajacalifornia" : "Baja California" }
+MAX_AGE = 60
+
+# Responses smaller than this aren't worth compressing.
+MIN_COMPRESS_SIZE = 1024
+# Number of encoded responses kept in memory by each process.
+MAX_RESPONSES = 256
+
+
+class ApiError( Exception ):
+    def __init__( self, message: str, status: int = 400 ):
+        super().__init__( message )
+        self.status = status
+
+
+class ResponseCache:
+    """ Least recently used response bodies, keyed on the endpoint, version of its data, arguments and encoding. Only
+    kept in memory: bodies are cheap to rebuild from the aggregates every worker holds.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of bodies kept.
+    """
+
+    def __init__( self, maxsize: int = MAX_RESPONSES ):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get( self, key: tuple ):
+        with self._lock:
+            body = self._entries.get( key )
+            if body is not None:
+                self._entries.move_to_end( key )
+        return body
+
+    def put( self, key: tuple, body: bytes ):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end( key )
+            while len( self._entries ) > self.maxsize:
+                self._entries.popitem( last=False )
+
+    def __len__( self ):
+        return len( self._entries )
+
+
+def _format_dates( df: pd.DataFrame ) -> pd.DataFrame:
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype( df[column] ):
+            df[column] = df[column].dt.strftime( "%Y-%m-%d" )
+    return df
+
+
+def serialize( df: pd.DataFrame, fmt: str ) -> bytes:
+    """ Encodes a DataFrame as a CSV or as a JSON list of records, with dates written as YYYY-MM-DD.
+    """
+    df = _format_dates( df )
+    if fmt == "csv":
+        return df.to_csv( index=False ).encode()
+    return df.to_json( orient="records" ).encode()
+
+
+def _get_region():
+    region = request.args.get( "region", "sandiego" ).lower()
+    if region not in REGIONS:
+        raise ApiError( f"Unknown region '{region}'. Use one of: {', '.join( REGIONS )}." )
+    return REGIONS[region]
+
+
+def _get_window():
+    window = request.args.get( "window" )
+    if not window:
+        return None
+    try:
+        return int( window )
+    except ValueError:
+        raise ApiError( f"window must be a number of days, not '{window}'." )
+
+
+def _get_filters() -> tuple:
+    return _get_region(), _get_window(), request.args.get( "provider" ), request.args.get( "sequencer" ), request.args.getlist( "zip" )
+
+
+def _wastewater_version() -> str:
+    urls = list( format_data.WW_TITER_URLS.values() ) + list( format_data.WW_SEQS_URLS.values() )
+    return hashlib.sha1( "".join( format_data.remote_data.version( url ) or "" for url in urls ).encode() ).hexdigest()
+
+
+def register_api( server, datasets, cache: ResponseCache = None ):
+    """ Adds the /api/v1 routes to the Flask server behind the dashboard.
+    Parameters
+    ----------
+    server : flask.Flask
+        app.server.
+    datasets : DatasetManager
+        provides the current version of the local datasets.
+    cache : ResponseCache
+        holds the encoded responses. Defaults to one holding MAX_RESPONSES.
+    """
+    cache = cache if cache is not None else ResponseCache()
+    api = Blueprint( "api", __name__, url_prefix=API_PREFIX )
+
+    def respond( name: str, version: str, args: tuple, build ):
+        fmt = request.args.get( "format", "json" ).lower()
+        if fmt not in FORMATS:
+            raise ApiError( f"Unknown format '{fmt}'. Use one of: {', '.join( FORMATS )}." )
+
+        etag = FigureCache.key( name, version, fmt, *args )
+        headers = { "ETag" : f'"{etag}"', "Cache-Control" : f"public, max-age={MAX_AGE}", "Vary" : "Accept-Encoding" }
+        if request.if_none_match.contains( etag ):
+            return Response( status=304, headers=headers )
+
+        # The ETag covers the endpoint, version of the data and arguments.
+        body = cache.get( (etag, "identity") )
+        if body is None:
+            body = serialize( build(), fmt )
+            cache.put( (etag, "identity"), body )
+
+        if len( body ) >= MIN_COMPRESS_SIZE and "gzip" in request.accept_encodings:
+            compressed = cache.get( (etag, "gzip") )
+            if compressed is None:
+                compressed = gzip.compress( body )
+                cache.put( (etag, "gzip"), compressed )
+            body = compressed
+            headers["Content-Encoding"] = "gzip"
+        return Response( body, mimetype=FORMATS[fmt], headers=headers )
+
+    @api.errorhandler( ApiError )
+    def handle_error( err ):
+        response = jsonify( { "error" : str( err ) } )
+        response.status_code = err.status
+        return response
+
+    @api.route( "/lineages" )
+    def lineages():
+        """ Number of sequences of each lineage per epiweek.
+        """
+        data = datasets.get()
+        filters = _get_filters()
+        state, window, provider, sequencer, zip_f = filters
+
+        def build():
+            counts = data.lineage_counts.counts( state, window, provider, sequencer, zip_f )
+            counts = counts.stack().rename( "sequences" ).reset_index()
+            return counts.loc[counts["sequences"] > 0].reset_index( drop=True )
+        return respond( "lineages", data.version, filters, build )
+
+    @api.route( "/zips" )
+    def zips():
+        """ Cummulative cases, sequences, and fraction of cases sequenced for each ZIP code.
+        """
+        data = datasets.get()
+        state, window, provider, sequencer, _ = filters = _get_filters()
+
+        def build():
+            cases = data.case_matrix.cases_total( state, window )
+            return format_data.format_zip_summary( cases, data.sequences.select( state, window, provider, sequencer ) )
+        return respond( "zips", data.version, filters[:4], build )
+
+    @api.route( "/cases" )
+    def cases():
+        """ Daily and cummulative cases and sequences.
+        """
+        data = datasets.get()
+        filters = _get_filters()
+        return respond( "cases", data.version, filters, lambda: data.case_matrix.seqs_per_case( *filters ) )
+
+    @api.route( "/wastewater" )
+    def wastewater():
+        """ Viral load measured at each wastewater treatment plant.
+        """
+        sites = request.args.getlist( "site" )
+
+        def build():
+            ww, _ = format_data.load_wastewater_data()
+            if sites:
+                ww = ww.loc[ww["source"].isin( sites )]
+            return ww.reset_index( drop=True )
+        return respond( "wastewater", _wastewater_version(), (sites,), build )
+
+    @api.route( "/wastewater/cases" )
+    def wastewater_cases():
+        """ Smoothed cases per capita within the catchment area of a wastewater treatment plant.
+        """
+        data = datasets.get()
+        site = request.args.get( "site", "PointLoma" )
+        if site not in data.catchment_cases:
+            raise ApiError( f"Unknown site '{site}'. Use one of: {', '.join( data.catchment_cases )}.", status=404 )
+        return respond( "wastewater-cases", data.version, (site,), lambda: data.catchment_cases[site].reset_index() )
+
+    @api.route( "/growth-rates" )
+    def growth_rates():
+        """ Estimated growth rate of each lineage.
+        """
+        data = datasets.get()
+        return respond( "growth-rates", data.version, (), lambda: data.growth_rates )
+
+    server.register_blueprint( api )
+    return api
@@ -1,4 +1,3 @@
-from scipy.signal import savgol_filter
 import src.plot as dashplot
 import src.format_resources as format_data
 import src.pages.mainpage as mainpage
@@ -9,9 +8,10 @@ import src.pages.growth_table as growth_table
 import src.pages.graphonly as graphonly
 import src.pages.ww_growth_table as ww_growth_table
 from dash import Input, Output, html
-from datetime import datetime, timezone, timedelta
-import requests
+from datetime import timezone, timedelta
 from urllib.parse import parse_qs
+from src.commit_dates import CommitDateService
+from src.figure_cache import FigureCache
 
 
 PATH_GIT_DICT = {
@@ -22,11 +22,11 @@ PATH_GIT_DICT = {
     "/" : "https://api.github.com/repos/andersen-lab/HCoV-19-Genomics/git/refs/heads/master",
 }
 
-def register_url_sequences( df, url ):
+def register_url_state( url ):
     if url == "/bajacalifornia":
-        return df.loc[df["state"]=="Baja California"]
+        return "Baja California"
     else:
-        return df.loc[df["state"]=="San Diego"]
+        return "San Diego"
 
 def register_url_cases( df, url ):
     if url == "/bajacalifornia":
@@ -34,34 +34,49 @@ def register_url_cases( df, url ):
     else:
         return df.loc[df["ziptext"]!="None"]
 
+# Inputs of the memoized callbacks when the main pages are first opened, before any filter is set. Their outputs are
+# rendered ahead of time by .github/scripts/build_default_figures.py.
+DEFAULT_VIEWS = [("growth-table", ())]
+for _url in ["/", "/bajacalifornia"]:
+    DEFAULT_VIEWS += [("zip-graph", (_url, None, None, None)),
+                      ("cum-graph", (_url, None, None, None, None)),
+                      ("lineage-graph", (_url, None, None, None, None))]
+    DEFAULT_VIEWS += [("lineage-time-graph", (_url, None, None, lineage, None, scaleby, None))
+                      for lineage in [None, "all-voc"] for scaleby in ["sequences", "fraction"]]
+
+commit_dates = CommitDateService()
+figure_cache = FigureCache()
+
 def get_last_commit_date( url ):
-    try:
-        last_commit = requests.get( url ).json()["object"]["url"]
-        last_commit_date = requests.get( last_commit ).json()["author"]["date"]
-        last_commit_date = datetime.strptime( last_commit_date, "%Y-%m-%dT%H:%M:%SZ" ).replace( tzinfo=timezone.utc ).astimezone( timezone( timedelta( hours=-7 ) ) )
-        last_date = last_commit_date.strftime( "%B %d @ %I:%M %p PDT" )
-        return f"Updated at {last_date}"
-    except KeyError:
+    last_commit_date = commit_dates.get( url )
+    if last_commit_date is None:
         #return "Updating at the moment..."
         return ""
+    last_commit_date = last_commit_date.astimezone( timezone( timedelta( hours=-7 ) ) )
+    last_date = last_commit_date.strftime( "%B %d @ %I:%M %p PDT" )
+    return f"Updated at {last_date}"
 
-def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rates ):
+def register_callbacks( app, datasets ):
+    # Datasets are reloaded in the background, so each callback fetches the current version once with datasets.get()
+    # and uses it throughout rather than mixing two versions.
 
-    def get_sequences( seqs, url, window=None, provider=None, sequencer=None, zip_f=None ):
-        new_seqs = seqs.copy()
+    # Started from the first request of each process, so that no refresh thread runs in the gunicorn master.
+    @app.server.before_request
+    def start_commit_dates():
+        commit_dates.start( PATH_GIT_DICT.values() )
 
-        new_seqs = register_url_sequences( new_seqs, url )
+    def data_version():
+        return datasets.get().version
 
-        if window:
-            new_seqs = new_seqs.loc[sequences["days_past"] <= window]
-        if provider:
-            new_seqs = new_seqs.loc[new_seqs['provider']==provider]
-        if sequencer:
-            new_seqs = new_seqs.loc[new_seqs["sequencer"]==sequencer]
-        if zip_f:
-            new_seqs = new_seqs.loc[new_seqs["zipcode"]==zip_f]
+    def get_sequences( seqs, url, window=None, provider=None, sequencer=None, zip_f=None ):
+        return seqs.select( register_url_state( url ), window, provider, sequencer, zip_f )
+
+    def get_lineage_counts( lineage_counts, url, window=None, provider=None, sequencer=None, zip_f=None ):
+        return lineage_counts.counts( register_url_state( url ), window, provider, sequencer, zip_f )
 
-        return new_seqs
+    @figure_cache.memoize( "growth-table", data_version )
+    def get_growth_table():
+        return growth_table.get_table( datasets.get().growth_rates )
 
     def get_cases( cases, url, window=None, source=None ):
         new_cases = cases.copy()
@@ -72,14 +87,15 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
             new_cases = cases.loc[cases["days_past"] <= window]
 
         if source:
-            new_cases = cases.loc[cases["catchment"] == source].groupby( "updatedate" ).agg(
-                reported_cases=("new_cases", sum),
-                population=("population", sum ) )
-            new_cases["reported_cases_rolling"] = savgol_filter( new_cases["reported_cases"], window_length=21, polyorder=2 )
-            new_cases.loc[new_cases["reported_cases_rolling"] < 0] = 0
-            new_cases["reported_cases_rolling"] = new_cases["reported_cases_rolling"] / new_cases["population"]
+            new_cases = format_data.get_catchment_cases( cases, source )
         return new_cases
 
+    def get_catchment_cases( data, source ):
+        # Catchments shown on the wastewater pages are smoothed once per dataset version, anything else on request.
+        if source in data.catchment_cases:
+            return data.catchment_cases[source]
+        return get_cases( data.cases, "/", source=source )
+
     @app.callback(
         Output( "page-contents", "children" ),
         Input( "url", "pathname" )
@@ -131,16 +147,16 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
         if url == "/bajacalifornia":
             return [html.Table( id="summary-table" )]
         elif url == "/wastewater":
-            return ww_growth_table.get_table( format_data.load_ww_growth_rates() )
+            return ww_growth_table.get_table( format_data.load_ww_growth_rates().copy() )
         else:
-            return growth_table.get_table( growth_rates )
+            return get_growth_table()
 
     @app.callback(
         Output( "zip-drop", "options" ),
         Input( "url", "pathname" )
     )
     def update_zip_drop( url ):
-        new_cases = get_cases( cases_whole, url )
+        new_cases = get_cases( datasets.get().cases, url )
         return [{"label" : i, "value": i } for i in new_cases["ziptext"].sort_values().unique()]
 
     @app.callback(
@@ -158,7 +174,7 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "zip-drop", "value")]
     )
     def update_sequencer_drop( url, window, provider, zip_f ):
-        new_sequences = get_sequences( sequences, url, window, provider, None, zip_f )
+        new_sequences = get_sequences( datasets.get().sequences, url, window, provider, None, zip_f )
         return format_data.get_provider_sequencer_values( new_sequences, "sequencer" )
 
     @app.callback(
@@ -169,7 +185,7 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "zip-drop", "value")]
     )
     def update_sequencer_drop( url, window, sequencer, zip_f ):
-        new_sequences = get_sequences( sequences, url, window, None, sequencer, zip_f )
+        new_sequences = get_sequences( datasets.get().sequences, url, window, None, sequencer, zip_f )
         return format_data.get_provider_sequencer_values( new_sequences, "provider" )
 
     @app.callback(
@@ -181,7 +197,7 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( 'sequencer-drop', "value")]
     )
     def update_lineage_drop( url, window, zip_f, provider, sequencer ):
-        new_sequences = get_sequences( sequences, url, window, provider, sequencer, zip_f )
+        new_sequences = get_sequences( datasets.get().sequences, url, window, provider, sequencer, zip_f )
         return format_data.get_lineage_values( new_sequences )
 
     @app.callback(
@@ -192,8 +208,10 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "zip-drop", "value")]
     )
     def update_summary_table( url, provider, sequencer, zip_f ):
-        new_sequences = get_sequences( sequences, url, None, provider, sequencer, zip_f )
-        return format_data.get_summary_table( new_sequences )
+        # Lineages are classified once per dataset, the selected rows only take their codes.
+        store = datasets.get().sequences
+        idx = store.indices( register_url_state( url ), None, provider, sequencer, zip_f )
+        return format_data.get_summary_table( store.sequences.take( idx ), store.voc_codes[idx] )
 
     @app.callback(
         Output( "zip-graph", "figure" ),
@@ -202,9 +220,11 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "provider-drop", "value"),
          Input( 'sequencer-drop', "value")]
     )
+    @figure_cache.memoize( "zip-graph", data_version )
     def update_zip_graph( url, window, provider, sequencer ):
-        new_sequences = get_sequences( sequences, url, window, provider, sequencer )
-        new_cases = format_data.format_cases_total( get_cases( cases_whole, url, window ) )
+        data = datasets.get()
+        new_sequences = get_sequences( data.sequences, url, window, provider, sequencer )
+        new_cases = data.case_matrix.cases_total( register_url_state( url ), window )
         return dashplot.plot_zips( format_data.format_zip_summary( new_cases, new_sequences ) )
 
     @app.callback(
@@ -217,9 +237,9 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "provider-drop", "value"),
          Input( 'sequencer-drop', "value")]
     )
+    @figure_cache.memoize( "cum-graph", data_version )
     def update_cummulative_graph( url, window, zip_f, provider, sequencer ):
-        new_sequences = get_sequences( sequences, url, window, provider, sequencer )
-        new_seqs_per_case = format_data.get_seqs_per_case( get_cases( cases_whole, url, window ), new_sequences, zip_f=zip_f )
+        new_seqs_per_case = datasets.get().case_matrix.seqs_per_case( register_url_state( url ), window, provider, sequencer, zip_f )
 
         return_plots = [dashplot.plot_cummulative_cases_seqs( new_seqs_per_case ),
                         dashplot.plot_daily_cases_seqs( new_seqs_per_case ),
@@ -235,9 +255,10 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "provider-drop", "value"),
          Input( 'sequencer-drop', "value")]
     )
+    @figure_cache.memoize( "lineage-graph", data_version )
     def update_lineages_graph( url, window, zip_f, provider, sequencer ):
-        new_sequences = get_sequences( sequences, url, window, provider, sequencer, zip_f )
-        return dashplot.plot_lineages( new_sequences )
+        new_counts = get_lineage_counts( datasets.get().lineage_counts, url, window, provider, sequencer, zip_f )
+        return dashplot.plot_lineages( new_counts )
 
     @app.callback(
         Output( "lineage-time-graph", "figure" ),
@@ -249,17 +270,18 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "lineage-type", "value"),
          Input( 'sequencer-drop', "value")]
     )
+    @figure_cache.memoize( "lineage-time-graph", data_version )
     def update_lineage_time_graph( url, window, zip_f, lineage, provider, scaleby, sequencer ):
-        new_sequences = get_sequences( sequences, url, window, provider, sequencer, zip_f )
+        new_counts = get_lineage_counts( datasets.get().lineage_counts, url, window, provider, sequencer, zip_f )
 
         if lineage == "all-voc":
-            return dashplot.plot_voc( new_sequences, scaleby, focus="VOC" )
+            return dashplot.plot_voc( new_counts, scaleby, focus="VOC" )
         elif lineage == "all-delta":
-            return dashplot.plot_voc( new_sequences, scaleby, focus="Delta" )
+            return dashplot.plot_voc( new_counts, scaleby, focus="Delta" )
         elif lineage == "all-omicron":
-            return dashplot.plot_voc( new_sequences, scaleby, focus="Omicron" )
+            return dashplot.plot_voc( new_counts, scaleby, focus="Omicron" )
         else:
-            return dashplot.plot_lineages_time( new_sequences, lineage, scaleby )
+            return dashplot.plot_lineages_time( new_counts, lineage, scaleby )
 
     @app.callback(
         Output('zip-drop', 'value'),
@@ -293,7 +315,7 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "ww-source-radio", "value" )]
     )
     def update_wastewater_graph( scale, source ):
-        return dashplot.plot_wastewater( *format_data.load_wastewater_data(), cases=get_cases( cases_whole, "/", source=source ), scale=scale, source=source )
+        return dashplot.plot_wastewater( *format_data.load_wastewater_data(), cases=get_catchment_cases( datasets.get(), source ), scale=scale, source=source )
 
     @app.callback(
         Output( "indiv-wastewater-graph", "figure"),
@@ -307,7 +329,7 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
                 source = search_dict["site"][0]
         return dashplot.plot_wastewater(
             *format_data.load_wastewater_data(),
-            cases=get_cases( cases_whole, "/", source=source ),
+            cases=get_catchment_cases( datasets.get(), source ),
             source=source, seq_indicator=False
         )
 
@@ -318,7 +340,7 @@ def register_callbacks( app, sequences, cases_whole, growth_rates, ww_growth_rat
          Input( "smooth-radio", "value")]
     )
     def update_wastewater_seq_graph( norm_type, source, smooth ):
-        return dashplot.plot_wastewater_seqs( *format_data.load_wastewater_data(), config=format_data.load_ww_plot_config(), cases=get_cases( cases_whole, "/", source=source), norm_type=norm_type, source=source, smooth=smooth )
+        return dashplot.plot_wastewater_seqs( *format_data.load_wastewater_data(), config=format_data.load_ww_plot_config(), cases=get_catchment_cases( datasets.get(), source ), norm_type=norm_type, source=source, smooth=smooth )
 
     @app.callback(
         Output( "monkeypox-graph", "figure"),
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+from src.sequence_store import SequenceStore
+
+# Cases reported for Baja California as a whole are stored under this ZIP code.
+BAJA_CALIFORNIA_ZIP = "None"
+BAJA_CALIFORNIA = "Baja California"
+
+
+class CaseMatrix:
+    """ Dense ZIP code x date matrices of the reported cases, and state x ZIP code x date counts of sequences, built once
+    per version of the data. The summaries shown on the main page are answered by slicing and summing these rather than
+    filtering, pivoting and merging the full DataFrames on every request.
+
+    Parameters
+    ----------
+    cases : pandas.DataFrame
+        output of load_cases(), with at most one row per ZIP code and date.
+    sequences : SequenceStore
+        indexed sequences.
+    """
+
+    def __init__( self, cases: pd.DataFrame, sequences: SequenceStore ):
+        self.sequences = sequences
+        seqs = sequences.sequences
+
+        case_dates = cases["updatedate"].to_numpy( dtype="datetime64[ns]" )
+        seq_dates = seqs["collection_date"].to_numpy( dtype="datetime64[ns]" )
+        self.dates = np.unique( np.concatenate( [case_dates[~np.isnat( case_dates )], seq_dates[~np.isnat( seq_dates )]] ) )
+
+        # Cases. Rows without a ZIP code are kept in an additional last row, they count towards San Diego's totals but
+        # not towards any ZIP code.
+        zip_codes, self.zips = pd.factorize( cases["ziptext"], sort=True )
+        zip_codes = np.where( zip_codes < 0, len( self.zips ), zip_codes )
+        date_codes = self._date_codes( case_dates )
+        keep = date_codes >= 0
+        zip_codes, date_codes = zip_codes[keep], date_codes[keep]
+        case_count = cases["case_count"].to_numpy( dtype=float )[keep]
+        shape = (len( self.zips ) + 1, len( self.dates ))
+
+        self.case_dtype = cases["case_count"].dtype
+        self.reported = np.zeros( shape, dtype=bool )
+        self.reported[zip_codes, date_codes] = True
+        self.counted = np.zeros( shape, dtype=bool )
+        self.counted[zip_codes, date_codes] = ~np.isnan( case_count )
+        self.case_count = np.zeros( shape )
+        np.add.at( self.case_count, (zip_codes, date_codes), np.nan_to_num( case_count ) )
+        self.days_past = np.full( shape, np.inf )
+        self.days_past[zip_codes, date_codes] = cases["days_past"].to_numpy( dtype=float )[keep]
+
+        self._baja = np.append( np.asarray( self.zips == BAJA_CALIFORNIA_ZIP ), False )
+
+        # Sequences. Those without a ZIP code are again kept in an additional last row.
+        seq_states = sequences.codes["state"]
+        seq_zips = sequences.codes["zipcode"]
+        seq_zips = np.where( seq_zips < 0, len( sequences.categories["zipcode"] ), seq_zips )
+        self._seq_date_codes = self._date_codes( seq_dates )
+        self._seq_valid = ( self._seq_date_codes >= 0 ) & seqs["ID"].notna().to_numpy()
+
+        keep = self._seq_valid & ( seq_states >= 0 )
+        shape = (len( sequences.categories["state"] ), len( sequences.categories["zipcode"] ) + 1, len( self.dates ))
+        keys = np.ravel_multi_index( (seq_states[keep], seq_zips[keep], self._seq_date_codes[keep]), shape )
+        self.sequence_counts = np.bincount( keys, minlength=int( np.prod( shape ) ) ).reshape( shape )
+
+        # The recency of a sequence only depends on its collection date, so windows can be applied to the date axis.
+        seq_days_past = seqs["days_past"].to_numpy( dtype=float )
+        self._seq_days_past = np.full( len( self.dates ), np.inf )
+        self._seq_days_past[self._seq_date_codes[keep]] = seq_days_past[keep]
+        self._window_by_date = bool( np.all( self._seq_days_past[self._seq_date_codes[keep]] == seq_days_past[keep] ) )
+
+    def _date_codes( self, dates: np.ndarray ) -> np.ndarray:
+        codes = np.searchsorted( self.dates, dates )
+        return np.where( np.isnat( dates ), -1, codes )
+
+    def _case_cells( self, state=None, window=None, zip_f=None ) -> np.ndarray:
+        # Mirrors get_cases() in callbacks.py, where the window filter is applied to the cases of both states.
+        if window:
+            cells = self.reported & ( self.days_past <= window )
+        elif state == BAJA_CALIFORNIA:
+            cells = self.reported & self._baja[:, None]
+        else:
+            cells = self.reported & ~self._baja[:, None]
+        if zip_f:
+            selected = np.zeros( len( self.zips ) + 1, dtype=bool )
+            selected[:-1] = np.isin( np.asarray( self.zips ), zip_f )
+            cells = cells & selected[:, None]
+        return cells
+
+    def _new_sequences( self, state=None, window=None, provider=None, sequencer=None, zip_f=None ) -> np.ndarray:
+        if provider or sequencer or ( window and not self._window_by_date ) or state not in self.sequences.categories["state"]:
+            idx = self.sequences.indices( state, window, provider, sequencer, zip_f )
+            idx = idx[self._seq_valid[idx]]
+            return np.bincount( self._seq_date_codes[idx], minlength=len( self.dates ) )
+
+        counts = self.sequence_counts[self.sequences.categories["state"].get_loc( state )]
+        if zip_f:
+            zip_codes = self.sequences.value_codes( "zipcode", zip_f )
+            counts = counts[zip_codes[zip_codes >= 0]]
+        counts = counts.sum( axis=0 )
+        if window:
+            counts = np.where( self._seq_days_past <= window, counts, 0 )
+        return counts
+
+    def seqs_per_case( self, state=None, window=None, provider=None, sequencer=None, zip_f=None ) -> pd.DataFrame:
+        """ Cummulative cases and sequences per day for a filter combination. Equivalent to
+        format_data.get_seqs_per_case( get_cases( cases, url, window ), get_sequences( seqs, url, window, provider, sequencer ), zip_f )
+        with the helpers in callbacks.py.
+
+        Returns
+        -------
+        pandas.DataFrame
+            date, cases, new_sequences, sequences, and new_cases for every day with either cases or sequences.
+        """
+        if zip_f and type( zip_f ) != list:
+            zip_f = [zip_f]
+
+        cells = self._case_cells( state, window, zip_f )
+        reported = cells.any( axis=0 )
+        case_count = np.where( cells, self.case_count, 0 ).sum( axis=0 )
+        new_sequences = self._new_sequences( state, window, provider, sequencer, zip_f )
+
+        days = reported | ( new_sequences > 0 )
+        reported, case_count, new_sequences = reported[days], case_count[days], new_sequences[days]
+
+        # Keep the dtypes pandas ends up with: columns only remain integers if the merge didn't introduce missing values.
+        if reported.all() and np.issubdtype( self.case_dtype, np.integer ):
+            case_count = case_count.astype( np.int64 )
+        if not ( new_sequences > 0 ).all() or len( new_sequences ) == 0:
+            new_sequences = new_sequences.astype( float )
+
+        cases = pd.DataFrame( { "date" : self.dates[days],
+                                "cases" : np.maximum.accumulate( case_count ) if len( case_count ) else case_count,
+                                "new_sequences" : new_sequences } )
+        cases["sequences"] = cases["new_sequences"].cumsum()
+        cases["new_cases"] = cases["cases"].diff()
+        cases["new_cases"] = cases["new_cases"].fillna( 0.0 )
+        cases.loc[cases["new_cases"] < 0, "new_cases"] = 0
+        return cases
+
+    def cases_total( self, state=None, window=None ) -> pd.DataFrame:
+        """ Latest cummulative case count of each ZIP code. Equivalent to the ziptext and case_count columns of
+        format_data.format_cases_total( get_cases( cases, url, window ) ).
+
+        Returns
+        -------
+        pandas.DataFrame
+            ziptext and case_count, sorted by ZIP code.
+        """
+        cells = self._case_cells( state, window )[:-1]
+        if cells.size == 0:
+            return pd.DataFrame( { "ziptext" : self.zips[:0], "case_count" : np.zeros( 0, dtype=self.case_dtype ) } )
+        zips = cells.any( axis=1 )
+        counted = cells & self.counted[:-1]
+
+        # Index of the last counted date of each ZIP code.
+        last = counted.shape[1] - 1 - np.argmax( counted[:, ::-1], axis=1 )
+        case_count = np.where( counted.any( axis=1 ), self.case_count[np.arange( len( self.zips ) ), last], np.nan )
+
+        totals = pd.DataFrame( { "ziptext" : self.zips[zips], "case_count" : case_count[zips] } )
+        if np.issubdtype( self.case_dtype, np.integer ) and counted[zips].any( axis=1 ).all():
+            totals["case_count"] = totals["case_count"].astype( np.int64 )
+        return totals
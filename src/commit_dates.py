@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TTL = 5 * 60
+DEFAULT_TIMEOUT = (3.05, 5)
+DEFAULT_MAXSIZE = 64
+
+
+class RateLimited( Exception ):
+    pass
+
+
+class CommitDateService:
+    """ Looks up the date of the last commit to a branch through the GitHub API. Dates are cached per branch and
+    revalidated asynchronously once older than the TTL, so callers always get the cached (possibly stale) value
+    immediately. Requests reuse a pooled session, carry explicit timeouts and use conditional requests, which GitHub
+    doesn't count against the rate limit. When the rate limit is exhausted, refreshes are paused until it resets.
+
+    Parameters
+    ----------
+    ttl : float
+        Number of seconds before a cached date is refreshed.
+    timeout : float or tuple
+        Connect and read timeout passed to requests.
+    maxsize : int
+        Maximum number of cached API responses, and of cached commit dates. The least recently used are dropped beyond
+        that.
+    """
+
+    def __init__( self, ttl: float = DEFAULT_TTL, timeout=DEFAULT_TIMEOUT, maxsize: int = DEFAULT_MAXSIZE ):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.maxsize = maxsize
+
+        self._session = self._new_session()
+        self._pid = os.getpid()
+
+        self._dates = dict()
+        self._responses = OrderedDict()
+        self._commit_dates = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self._started_pid = None
+
+    @staticmethod
+    def _new_session() -> requests.Session:
+        session = requests.Session()
+        session.mount( "https://", HTTPAdapter( pool_connections=4, pool_maxsize=4 ) )
+        session.headers.update( { "Accept" : "application/vnd.github+json" } )
+        if "GITHUB_TOKEN" in os.environ:
+            session.headers.update( { "Authorization" : f"token {os.environ['GITHUB_TOKEN']}" } )
+        return session
+
+    def _check_fork( self ):
+        # Threads and pooled connections don't survive a fork (e.g. gunicorn workers with preload_app), so refreshes
+        # started by the parent will never complete here.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._session = self._new_session()
+            self._lock = threading.Lock()
+            self._refreshing = set()
+
+    def _recall( self, cache: OrderedDict, key: str ):
+        with self._lock:
+            value = cache.get( key )
+            if value is not None:
+                cache.move_to_end( key )
+        return value
+
+    def _remember( self, cache: OrderedDict, key: str, value ):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end( key )
+            while len( cache ) > self.maxsize:
+                cache.popitem( last=False )
+
+    def _get_json( self, url: str ) -> dict:
+        headers = dict()
+        cached = self._recall( self._responses, url )
+        if cached is not None:
+            headers["If-None-Match"] = cached[0]
+
+        response = self._session.get( url, headers=headers, timeout=self.timeout )
+        if response.status_code == 304 and cached is not None:
+            return cached[1]
+        if response.status_code in (403, 429) and response.headers.get( "X-RateLimit-Remaining" ) == "0":
+            self._blocked_until = float( response.headers.get( "X-RateLimit-Reset", time.time() + self.ttl ) )
+            raise RateLimited( f"GitHub API rate limit exceeded until {self._blocked_until:.0f}" )
+        response.raise_for_status()
+
+        content = response.json()
+        if "ETag" in response.headers:
+            self._remember( self._responses, url, (response.headers["ETag"], content) )
+        return content
+
+    def refresh( self, url: str ):
+        """ Fetches the date of the last commit for a branch reference.
+        Parameters
+        ----------
+        url : str
+            GitHub API URL of a git reference, i.e. https://api.github.com/repos/{owner}/{repo}/git/refs/heads/{branch}
+        """
+        try:
+            commit_url = self._get_json( url )["object"]["url"]
+            # Commits are immutable, so only the reference needs to be revalidated.
+            commit_date = self._recall( self._commit_dates, commit_url )
+            if commit_date is None:
+                commit_date = self._get_json( commit_url )["author"]["date"]
+                commit_date = datetime.strptime( commit_date, "%Y-%m-%dT%H:%M:%SZ" ).replace( tzinfo=timezone.utc )
+                self._remember( self._commit_dates, commit_url, commit_date )
+            with self._lock:
+                self._dates[url] = (commit_date, time.time())
+        except (requests.RequestException, RateLimited, KeyError, ValueError) as err:
+            print( f"Unable to refresh last commit date from {url}: {err}" )
+        finally:
+            with self._lock:
+                self._refreshing.discard( url )
+
+    def refresh_async( self, url: str ):
+        """ Refreshes the date for a branch in a background thread, unless a refresh is already running or the rate
+        limit is exhausted.
+        """
+        if time.time() < self._blocked_until:
+            return
+        self._check_fork()
+        with self._lock:
+            if url in self._refreshing:
+                return
+            self._refreshing.add( url )
+        threading.Thread( target=self.refresh, args=(url,), name="commit-date-refresh", daemon=True ).start()
+
+    def prefetch( self, urls ):
+        for url in set( urls ):
+            self.refresh_async( url )
+
+    def start( self, urls ):
+        """ Prefetches urls the first time it is called in each process. Should be called from the processes serving
+        requests rather than at import, which with preload_app happens in the gunicorn master, where the refresh threads
+        could hold the lock at the moment a worker is forked.
+        """
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self.prefetch( urls )
+
+    def get( self, url: str ):
+        """ Returns the cached date of the last commit for a branch, scheduling a refresh if it is missing or stale.
+
+        Returns
+        -------
+        datetime.datetime or None
+            Date of the last commit in UTC, or None if it hasn't been fetched yet.
+        """
+        entry = self._dates.get( url )
+        if entry is None or time.time() - entry[1] >= self.ttl:
+            self.refresh_async( url )
+        if entry is None:
+            return None
+        return entry[0]
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def forward_window_max( values: np.ndarray, window: int = 7 ) -> np.ndarray:
+    """ Maximum over the forward-looking window [i, i + window) along the last axis, ignoring NaNs. Windows are truncated
+    at the end of the array. Equivalent to a pandas rolling max with a FixedForwardWindowIndexer and min_periods=1.
+    Parameters
+    ----------
+    values : numpy.ndarray
+        1D array, or 2D array with one series per row.
+    window : int
+        size of the window.
+
+    Returns
+    -------
+    numpy.ndarray
+        array of the same shape as values. Windows with no values are NaN.
+    """
+    values = np.asarray( values, dtype=float )
+    padding = [(0, 0)] * ( values.ndim - 1 ) + [(0, window - 1)]
+    windows = sliding_window_view( np.pad( values, padding, constant_values=np.nan ), window, axis=-1 )
+    result = np.full( values.shape, np.nan )
+    observed = ~np.isnan( windows ).all( axis=-1 )
+    result[observed] = np.nanmax( windows[observed], axis=-1 )
+    return result
+
+
+def interpolate_daily_cases( df: pd.DataFrame, start=None, group: str = "ziptext", date: str = "updatedate",
+                             value: str = "new_cases", window: int = 7 ) -> pd.DataFrame:
+    """ Spreads cases reported at irregular (mostly weekly) intervals over the days in between. Each group is extended
+    to daily frequency and every day receives the largest count reported within the following week divided by the
+    window size. All groups are processed at once on a group x date matrix. Equivalent to applying
+        entry = entry.set_index( date ).reindex( pd.date_range( start, entry[date].max() ) ).rename_axis( date ).reset_index()
+        entry[value] = entry.rolling( window=FixedForwardWindowIndexer( window_size=window ), min_periods=1 )[value].apply( lambda x: x.max() / window )
+    through df.groupby( group ).apply(), then moving the group back into a column.
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        counts with at most one row per group and date.
+    start : datetime-like
+        first day of every group. Defaults to the first date of each group.
+    group, date, value : str
+        columns holding the group, the reporting date and the count.
+    window : int
+        number of days covered by each report.
+
+    Returns
+    -------
+    pandas.DataFrame
+        one row per group and day, sorted by group then date, with group and date as the first columns. Other columns
+        are NaN on the days that were added. Counts are NaN for days with no report in the following window.
+    """
+    group_codes, groups = pd.factorize( df[group], sort=True )
+    dates = df[date].to_numpy( dtype="datetime64[ns]" )
+
+    firsts = np.full( len( groups ), np.datetime64( "NaT", "ns" ) )
+    lasts = np.full( len( groups ), np.datetime64( "NaT", "ns" ) )
+    order = np.argsort( dates, kind="stable" )
+    lasts[group_codes[order]] = dates[order]
+    firsts[group_codes[order[::-1]]] = dates[order[::-1]]
+    if start is not None:
+        firsts[:] = np.datetime64( pd.Timestamp( start ).to_datetime64(), "ns" )
+
+    origin = firsts.min()
+    days = ( ( lasts.max() - origin ) // np.timedelta64( 1, "D" ) ) + 1
+    day_codes = ( dates - origin ) // np.timedelta64( 1, "D" )
+
+    matrix = np.full( (len( groups ), max( days, 0 )), np.nan )
+    keep = day_codes >= 0
+    matrix[group_codes[keep], day_codes[keep]] = df[value].to_numpy( dtype=float )[keep]
+    spread = forward_window_max( matrix, window ) / window
+
+    # Cells from each group's first to last day, in group then date order.
+    day_range = np.arange( matrix.shape[1] )
+    first_days = ( firsts - origin ) // np.timedelta64( 1, "D" )
+    last_days = ( lasts - origin ) // np.timedelta64( 1, "D" )
+    cells = ( day_range >= first_days[:, None] ) & ( day_range <= last_days[:, None] )
+    cell_groups, cell_days = np.nonzero( cells )
+
+    result = pd.DataFrame( { group : groups.take( cell_groups ),
+                             date : origin + cell_days.astype( "timedelta64[D]" ) } )
+    others = [column for column in df.columns if column not in (group, date)]
+    result = result.merge( df[[group, date] + others], on=[group, date], how="left" )
+    result[value] = spread[cell_groups, cell_days]
+    return result
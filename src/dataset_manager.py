@@ -0,0 +1,188 @@
+import hashlib
+import logging
+import os
+import threading
+
+import src.format_resources as format_data
+import src.snapshots as snapshots
+from src.case_matrix import CaseMatrix
+from src.lineage_counts import LineageCube
+from src.sequence_store import SequenceStore
+
+GROWTH_RATES_CSV = "resources/growth_rates.csv"
+WATCHED_FILES = [snapshots.SEQUENCES_CSV, snapshots.SEQUENCES_SNAPSHOT, snapshots.CASES_CSV, snapshots.CASES_SNAPSHOT,
+                 GROWTH_RATES_CSV]
+DEFAULT_INTERVAL = 60
+
+logger = logging.getLogger( __name__ )
+
+# Catchment areas of the wastewater sites, whose smoothed case series are computed along with each dataset.
+CATCHMENTS = ["PointLoma", "Encina", "SouthBay", "Other"]
+
+
+class Dataset:
+    """ A single, read-only version of the local datasets used by the callbacks. A new Dataset is built whenever the
+    files it was loaded from change, existing ones are never modified.
+
+    Parameters
+    ----------
+    sequences : SequenceStore
+        indexed sequences.
+    lineage_counts : LineageCube
+        pre-aggregated lineage counts built from sequences.
+    cases : pandas.DataFrame
+        output of load_cases().
+    growth_rates : pandas.DataFrame
+        output of load_growth_rates().
+    version : str
+        content hash of the files the dataset was loaded from.
+    case_matrix : CaseMatrix
+        ZIP code x date matrices of cases and sequences built from cases and sequences.
+    catchment_cases : dict
+        output of get_catchment_cases() for each catchment area, keyed by its name.
+    """
+    def __init__( self, sequences, lineage_counts, cases, growth_rates, version: str, case_matrix=None, catchment_cases=None ):
+        self.sequences = sequences
+        self.lineage_counts = lineage_counts
+        self.cases = cases
+        self.growth_rates = growth_rates
+        self.version = version
+        self.case_matrix = case_matrix
+        self.catchment_cases = catchment_cases if catchment_cases is not None else dict()
+
+
+def load_catchment_cases( cases ) -> dict:
+    catchment_cases = dict()
+    for source in CATCHMENTS:
+        try:
+            catchment_cases[source] = format_data.get_catchment_cases( cases, source )
+        except ValueError:
+            # Too few days to smooth. Left to the callbacks, which report the error for that catchment alone.
+            continue
+    return catchment_cases
+
+
+def load_dataset( version: str = None ) -> Dataset:
+    sequences = SequenceStore( format_data.load_sequences() )
+    cases = format_data.load_cases()
+    return Dataset( sequences, LineageCube( sequences ), cases, format_data.load_growth_rates(), version,
+                    case_matrix=CaseMatrix( cases, sequences ), catchment_cases=load_catchment_cases( cases ) )
+
+
+class DatasetManager:
+    """ Holds the current Dataset and replaces it when the files it was loaded from change. A background thread polls
+    the files' size and modification time and, once a change has settled for a full interval, compares content hashes
+    and builds the new version before swapping it in. Callbacks should call get() once and use the returned Dataset
+    throughout, so requests in flight during a swap finish on the version they started with.
+
+    The first version is loaded when the app is imported, which happens once in the gunicorn master with preload_app,
+    so workers share it copy-on-write. The watcher only runs in the workers, and each one builds its own copy of later
+    versions, so after a reload memory use grows to one copy of the datasets per worker. Reloading in the master instead
+    would need it to run a thread and fork new workers from a process holding its locks. Restarting the server (not a
+    HUP, which forks the new workers from the same preloaded master) loads the new files in the master and restores the
+    sharing.
+
+    Parameters
+    ----------
+    paths : list
+        files to watch. Missing files are ignored.
+    loader : callable
+        builds a Dataset from the watched files, given its version.
+    interval : float
+        Number of seconds between polls.
+    """
+
+    def __init__( self, paths=None, loader=load_dataset, interval: float = DEFAULT_INTERVAL ):
+        self.paths = list( paths ) if paths is not None else WATCHED_FILES
+        self.loader = loader
+        self.interval = interval
+
+        self._stats = self._stat()
+        self._pending = None
+        self.current = self.loader( self._hash() )
+
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    def _stat( self ) -> tuple:
+        stats = list()
+        for path in self.paths:
+            try:
+                stat = os.stat( path )
+                stats.append( (path, stat.st_size, stat.st_mtime_ns) )
+            except OSError:
+                stats.append( (path, None, None) )
+        return tuple( stats )
+
+    def _hash( self ) -> str:
+        digest = hashlib.sha1()
+        for path in self.paths:
+            digest.update( path.encode() )
+            if os.path.exists( path ):
+                with open( path, "rb" ) as f:
+                    digest.update( hashlib.sha1( f.read() ).digest() )
+        return digest.hexdigest()
+
+    @property
+    def version( self ) -> str:
+        return self.current.version
+
+    def check( self ) -> bool:
+        """ Rebuilds the dataset if the watched files changed and haven't been modified since the previous check, which
+        avoids loading files that are still being written.
+
+        Returns
+        -------
+        bool
+            True if a new version was swapped in.
+        """
+        stats = self._stat()
+        if stats == self._stats:
+            self._pending = None
+            return False
+        if stats != self._pending:
+            self._pending = stats
+            return False
+
+        self._stats = stats
+        self._pending = None
+        version = self._hash()
+        if version == self.current.version:
+            return False
+
+        try:
+            dataset = self.loader( version )
+        except Exception as err:
+            logger.warning( "Unable to load new version of datasets, keeping %s: %s", self.current.version, err )
+            return False
+        # Attribute assignment is atomic, callbacks holding the previous version keep a reference to it.
+        self.current = dataset
+        logger.info( "Loaded new version of datasets: %s", version )
+        return True
+
+    def get( self ) -> Dataset:
+        """ Returns the current version of the datasets, starting the watcher if needed.
+        """
+        self.start()
+        return self.current
+
+    def start( self, interval: float = None ):
+        """ Starts the watcher thread if it isn't running in this process. Safe to call repeatedly, and after a fork,
+        which doesn't carry threads over.
+        """
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        interval = interval if interval is not None else self.interval
+
+        def _run():
+            while not self._stop.wait( interval ):
+                self.check()
+
+        self._stop.clear()
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread( target=_run, name="dataset-watcher", daemon=True )
+        self._thread.start()
+
+    def stop( self ):
+        self._stop.set()
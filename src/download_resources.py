@@ -1,7 +1,8 @@
 import datetime
 from urllib.error import HTTPError
 import pandas as pd
-from epiweeks import Week
+from src.daily_cases import interpolate_daily_cases
+from src.epiweek import epiweek_start
 from arcgis.gis import GIS
 
 # Download metadata from SEARCH repository
@@ -48,8 +49,8 @@ def download_search():
     md["zipcode"] = md["zipcode"].astype( "str" )
     md["zipcode"] = md["zipcode"].apply( lambda x: x.split( "-" )[0] )
 
-    md["epiweek"] = md["collection_date"].apply( lambda x: Week.fromdate( datetime.datetime.strptime( x, "%Y-%m-%d" ).date() ).startdate() )
     md["collection_date"] = pd.to_datetime( md["collection_date"], format="%Y-%m-%d" ).dt.normalize()
+    md["epiweek"] = epiweek_start( md["collection_date"] )
     md["days_past"] = ( md["collection_date"].max() - md["collection_date"] ).dt.days
 
     md["originating_lab"] = md["originating_lab"].replace( { 'UC San Diego Center for Advanced Laboratory Medicine' :  "UCSD CALM Lab",
@@ -146,12 +147,6 @@ def download_sd_cases():
         dataframe = dataframe.drop( columns=["Zip"] ).rename( columns={"Total Population" : "population"} )
         return dataframe
 
-    def _add_missing_cases( entry ):
-        entry = entry.set_index( "updatedate" ).reindex( pd.date_range( entry["updatedate"].min(), entry["updatedate"].max() ) ).rename_axis( "updatedate" ).reset_index()
-        indexer = pd.api.indexers.FixedForwardWindowIndexer(window_size=7)
-        entry["new_cases"] = entry.rolling( window=indexer, min_periods=1 )["new_cases"].apply( lambda x: x.max() / 7 )
-        return entry
-
     gis = GIS()
     cases_loc = "34b6df47e084441790813348c69d49ee"
     gis_layer = gis.content.get( cases_loc )
@@ -172,9 +167,7 @@ def download_sd_cases():
 
     # Brief hack because SD stopped reporting daily cases and instead reports weekly cases after 2021-06-29.
     sdprob = sd.loc[sd["updatedate"]>"2021-06-28"]
-    sdprob = sdprob.groupby( "ziptext" ).apply( _add_missing_cases )
-    sdprob = sdprob.drop( columns="ziptext" ).reset_index()
-    sdprob = sdprob.drop( columns="level_1" )
+    sdprob = interpolate_daily_cases( sdprob )
 
     sd = sd.loc[sd["updatedate"]<="2021-06-28"]
     sd = pd.concat( [sd,sdprob] )
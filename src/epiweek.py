@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+
+def epiweek_start( dates ):
+    """ Start date of the CDC (MMWR) epiweek containing each date, equivalent to Week.fromdate( date ).startdate() from
+    the epiweeks package but computed for the whole array at once. Epiweeks start on Sunday.
+    Parameters
+    ----------
+    dates : pandas.Series, pandas.DatetimeIndex or array-like
+        dates, or strings parsable by pandas.to_datetime().
+
+    Returns
+    -------
+    pandas.Series or pandas.DatetimeIndex
+        normalized start dates of the epiweeks, with the same index as dates if it was a Series.
+    """
+    if isinstance( dates, pd.Series ):
+        dates = pd.to_datetime( dates ).dt.normalize()
+        return dates - pd.to_timedelta( ( dates.dt.dayofweek + 1 ) % 7, unit="D" )
+    dates = pd.DatetimeIndex( pd.to_datetime( dates ) ).normalize()
+    return dates - pd.to_timedelta( np.asarray( ( dates.dayofweek + 1 ) % 7 ), unit="D" )
@@ -0,0 +1,159 @@
+## fetch.py downloads independent remote files concurrently, with timeouts, retries and a bound on the number of
+## simultaneous requests. Used by the update scripts and to warm the dashboard's remote data cache.
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 1.0
+DEFAULT_WORKERS = 8
+
+# Responses worth retrying. Anything else, such as a 404, is reported straight away.
+RETRY_STATUS = { 429, 500, 502, 503, 504 }
+
+
+class FetchError( Exception ):
+    def __init__( self, url: str, reason ):
+        super().__init__( f"Unable to download {url}: {reason}" )
+        self.url = url
+        self.reason = reason
+
+
+def _request( url: str, timeout, retries: int, backoff: float, stream: bool = False ) -> requests.Response:
+    for attempt in range( retries + 1 ):
+        try:
+            response = requests.get( url, timeout=timeout, stream=stream )
+        except requests.RequestException as err:
+            reason = err
+        else:
+            if response.status_code == 200:
+                return response
+            reason = f"status code {response.status_code}"
+            response.close()
+            if response.status_code not in RETRY_STATUS:
+                break
+        if attempt < retries:
+            time.sleep( backoff * 2 ** attempt )
+    raise FetchError( url, reason )
+
+
+def fetch( url: str, timeout=DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF ) -> bytes:
+    """ Downloads a single file, retrying connection errors, timeouts and server errors with exponential backoff.
+    Parameters
+    ----------
+    url : str
+        location of the file.
+    timeout : float or tuple
+        connect and read timeout passed to requests.
+    retries : int
+        number of additional attempts after the first one fails.
+    backoff : float
+        seconds to wait before the first retry, doubled for every subsequent retry.
+
+    Returns
+    -------
+    bytes
+        content of the file.
+    """
+    return _request( url, timeout, retries, backoff ).content
+
+
+def stream( url: str, timeout=DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF ) -> requests.Response:
+    """ Opens a file for streaming, with the same retries as fetch(). The response should be used as a context manager
+    so the connection is released.
+    """
+    return _request( url, timeout, retries, backoff, stream=True )
+
+
+def download( url: str, path: str, timeout=DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+              chunk_size: int = 1 << 20 ) -> str:
+    """ Streams a file to disk without holding it in memory. Arguments are the same as fetch().
+
+    Returns
+    -------
+    str
+        path the file was written to.
+    """
+    with stream( url, timeout, retries, backoff ) as response:
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open( temp, "wb" ) as f:
+            for chunk in response.iter_content( chunk_size=chunk_size ):
+                f.write( chunk )
+    os.replace( temp, path )
+    return path
+
+
+def map_concurrent( func, items, max_workers: int = DEFAULT_WORKERS ) -> list:
+    """ Applies func to every item using a bounded pool of threads. Results are returned in the order of items and
+    exceptions are re-raised.
+    """
+    items = list( items )
+    if len( items ) <= 1:
+        return [func( item ) for item in items]
+    with ThreadPoolExecutor( max_workers=min( max_workers, len( items ) ) ) as pool:
+        return list( pool.map( func, items ) )
+
+
+def fetch_all( urls, max_workers: int = DEFAULT_WORKERS, **kwargs ) -> dict:
+    """ Downloads several files concurrently. Keyword arguments are passed to fetch().
+
+    Returns
+    -------
+    dict
+        content of each file, keyed by URL.
+
+    Raises
+    ------
+    FetchError
+        if any of the files couldn't be downloaded.
+    """
+    urls = list( dict.fromkeys( urls ) )
+    contents = map_concurrent( lambda url: fetch( url, **kwargs ), urls, max_workers=max_workers )
+    return dict( zip( urls, contents ) )
+
+
+def _close_response( future ):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def fetch_first( urls, max_workers: int = DEFAULT_WORKERS, **kwargs ):
+    """ Requests every candidate URL concurrently and returns the first one, in the given order of preference, which
+    downloads successfully. Candidates are opened for streaming, so only the body of the chosen one is downloaded, and
+    the others are closed as soon as their headers arrive. Keyword arguments are passed to fetch().
+
+    Returns
+    -------
+    tuple
+        URL of the chosen candidate and its content.
+
+    Raises
+    ------
+    FetchError
+        if none of the candidates could be downloaded, with the reason for the last one.
+    """
+    urls = list( urls )
+    if not urls:
+        raise ValueError( "No candidate URLs provided." )
+    error = None
+    # Not used as a context manager, which would wait for every request before returning.
+    pool = ThreadPoolExecutor( max_workers=min( max_workers, len( urls ) ) )
+    futures = [pool.submit( stream, url, **kwargs ) for url in urls]
+    try:
+        for url, future in zip( urls, futures ):
+            try:
+                with future.result() as response:
+                    return url, response.content
+            except FetchError as err:
+                error = err
+            except requests.RequestException as err:
+                error = FetchError( url, err )
+        raise error
+    finally:
+        pool.shutdown( wait=False, cancel_futures=True )
+        for future in futures:
+            future.add_done_callback( _close_response )
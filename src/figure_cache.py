@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import plotly.io as pio
+
+DEFAULT_MAXSIZE = 256
+DEFAULT_CACHE_DIR = "resources/cache/figures"
+PRECOMPUTED_DIR = "resources/figures"
+DEFAULT_DISK_MAXSIZE = 4096
+
+
+def normalize_value( value ):
+    """ Maps the equivalent values a dropdown can send to a single value: an empty selection is None whatever its type
+    and a multi-select's order doesn't matter.
+    """
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance( value, (list, tuple, set) ):
+        return sorted( normalize_value( v ) for v in value )
+    return value
+
+
+class FigureCache:
+    """ Bounded LRU cache of serialized callback outputs (mostly Plotly figures), keyed on the callback, its normalized
+    inputs and the version of the data it was computed from. Entries are also written to disk, which shares them with
+    the other workers on the same host, and every lookup increments the hit or miss counter. Entries rendered ahead of
+    time by precompute() are looked up in a read-only directory shipped with the data.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries held in memory.
+    cache_dir : str
+        Directory holding the on-disk entries. Set to None to disable.
+    disk_maxsize : int
+        Maximum number of on-disk entries. The least recently written entries are removed beyond that.
+    precomputed_dir : str
+        Directory holding the entries written by precompute(). Set to None to disable.
+    """
+
+    def __init__( self, maxsize: int = DEFAULT_MAXSIZE, cache_dir: str = DEFAULT_CACHE_DIR, disk_maxsize: int = DEFAULT_DISK_MAXSIZE,
+                  precomputed_dir: str = PRECOMPUTED_DIR ):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.disk_maxsize = disk_maxsize
+        self.precomputed_dir = precomputed_dir
+        self.hits = 0
+        self.misses = 0
+
+        self._callbacks = dict()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @staticmethod
+    def key( name: str, version: str, *args ) -> str:
+        """ Cache key for the output of callback name, given its inputs and the version of its data.
+        """
+        inputs = json.dumps( [name, version, [normalize_value( arg ) for arg in args]], default=str )
+        return hashlib.sha1( inputs.encode() ).hexdigest()
+
+    @staticmethod
+    def _read_file( directory: str, key: str ):
+        if directory is None:
+            return None
+        try:
+            with open( os.path.join( directory, f"{key}.json" ), "r" ) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _read_disk( self, key: str ):
+        value = self._read_file( self.precomputed_dir, key )
+        if value is None:
+            value = self._read_file( self.cache_dir, key )
+        return value
+
+    def _write_disk( self, key: str, value: str ):
+        if self.cache_dir is None:
+            return
+        os.makedirs( self.cache_dir, exist_ok=True )
+        path = os.path.join( self.cache_dir, f"{key}.json" )
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open( temp, "w" ) as f:
+            f.write( value )
+        os.replace( temp, path )
+
+        self._writes += 1
+        if self._writes % 64 == 0:
+            self._prune_disk()
+
+    def _prune_disk( self ):
+        try:
+            files = [entry for entry in os.scandir( self.cache_dir ) if entry.name.endswith( ".json" )]
+            if len( files ) <= self.disk_maxsize:
+                return
+            files.sort( key=lambda entry: entry.stat().st_mtime )
+            for entry in files[:len( files ) - self.disk_maxsize]:
+                os.remove( entry.path )
+        except OSError:
+            # Another worker may be pruning at the same time.
+            pass
+
+    def _remember( self, key: str, value: str ):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end( key )
+            while len( self._entries ) > self.maxsize:
+                self._entries.popitem( last=False )
+
+    def get( self, key: str ):
+        """ Returns the serialized output stored under key, or None if it isn't cached.
+        """
+        with self._lock:
+            value = self._entries.get( key )
+            if value is not None:
+                self._entries.move_to_end( key )
+        if value is None:
+            value = self._read_disk( key )
+            if value is not None:
+                self._remember( key, value )
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put( self, key: str, value: str ):
+        """ Stores a serialized output in memory and on disk.
+        """
+        self._remember( key, value )
+        self._write_disk( key, value )
+
+    def stats( self ) -> dict:
+        return { "hits" : self.hits, "misses" : self.misses, "entries" : len( self._entries ) }
+
+    def memoize( self, name: str, version ):
+        """ Decorator caching the output of a callback. The output is returned as plain JSON-compatible data on a hit,
+        which Dash serializes the same way as the figures the callback returns.
+        Parameters
+        ----------
+        name : str
+            identifies the callback in the cache key.
+        version : callable
+            returns the version of the data the callback reads, so outputs computed from a previous version are never
+            served.
+        """
+        def decorator( func ):
+            self._callbacks[name] = (func, version)
+
+            @wraps( func )
+            def wrapper( *args ):
+                key = self.key( name, version(), *args )
+                value = self.get( key )
+                if value is not None:
+                    return json.loads( value )
+                result = func( *args )
+                self.put( key, pio.json.to_json_plotly( result ) )
+                return result
+            return wrapper
+        return decorator
+
+    def precompute( self, name: str, *args, output_dir: str = PRECOMPUTED_DIR ) -> str:
+        """ Renders the output of a memoized callback for the given inputs into output_dir, where it is found by caches
+        whose precomputed_dir points there, as long as the version of the data matches.
+
+        Returns
+        -------
+        str
+            location of the rendered output.
+        """
+        func, version = self._callbacks[name]
+        key = self.key( name, version(), *args )
+        os.makedirs( output_dir, exist_ok=True )
+        path = os.path.join( output_dir, f"{key}.json" )
+        with open( path, "w" ) as f:
+            f.write( pio.json.to_json_plotly( func( *args ) ) )
+        return path
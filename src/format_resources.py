@@ -1,28 +1,43 @@
+import glob
+import os
+import pickle
 from typing import List
 
 import numpy as np
 import pandas as pd
 from dash import html
-from epiweeks import Week
+from src.epiweek import epiweek_start
+from src.daily_cases import forward_window_max
 
-from src.variants import VOC, VOI
+from src.variants import CLASSIFIER
 from scipy.optimize import curve_fit
 from scipy.signal import savgol_filter
 from numpy import exp, log
-import geopandas as gpd
+from src.remote_cache import RemoteCache
+import src.snapshots as snapshots
+
+WW_REPO = "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_WasteWater_San-Diego/master"
+MPX_REPO = "https://raw.githubusercontent.com/andersen-lab/MPX_WasteWater_San-Diego/master"
+SGTF_URL = "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_SGTF_San-Diego/main/SGTF_San_Diego_new.csv"
+WW_GROWTH_RATES_URL = f"{WW_REPO}/rel_growth_rates.csv"
+WW_PLOT_CONFIG_URL = f"{WW_REPO}/plot_config.yml"
+WW_LOCATIONS = ["PointLoma", "Encina", "SouthBay"]
+WW_TITER_URLS = { loc : f"{WW_REPO}/{loc}_sewage_qPCR.csv" for loc in WW_LOCATIONS }
+WW_SEQS_URLS = { loc : f"{WW_REPO}/{loc}_sewage_seqs.csv" for loc in WW_LOCATIONS }
+MPX_TITER_URLS = { loc : f"{MPX_REPO}/MPX_{loc}_qpcr.csv" for loc in WW_LOCATIONS }
+MPX_CASES_URL = f"{MPX_REPO}/MPX_cases.csv"
+
+# Remote datasets are served from memory and revalidated in the background.
+remote_data = RemoteCache()
+remote_data.register( WW_PLOT_CONFIG_URL, fallback="resources/ww_seqs.yml" )
+# Not memoized, the fit is cached on disk instead. Registered so that it counts towards remote_data.combined_version().
+remote_data.register( SGTF_URL )
 
 def load_sequences( window=None ):
-    sequences = pd.read_csv( "resources/sequences.csv" )
-
-    # Convert to dates correctly.
-    sequences["collection_date"] = pd.to_datetime( sequences["collection_date"] ).dt.tz_localize( None )
-    sequences["collection_date"] = sequences["collection_date"].dt.normalize()
-    sequences["epiweek"] = pd.to_datetime( sequences["epiweek"] ).dt.tz_localize( None )
-    sequences["epiweek"] = sequences["epiweek"].dt.normalize()
-
-    sequences["zipcode"] = sequences["zipcode"].apply( lambda x: str(x).split( ":" )[0] )
-    sequences["zipcode"] = sequences["zipcode"].replace(r'^\s*$', np.nan, regex=True)
-    sequences["zipcode"] = sequences["zipcode"].apply( lambda x: f"{float( x ):.0f}" )
+    # Prefer the typed snapshot written by the update scripts, the CSV needs its dates and zipcodes cleaned up.
+    sequences = snapshots.read_snapshot( snapshots.SEQUENCES_SNAPSHOT, source=snapshots.SEQUENCES_CSV )
+    if sequences is None:
+        sequences = snapshots.format_sequences( pd.read_csv( snapshots.SEQUENCES_CSV ) )
 
     if window is not None:
         sequences = sequences.loc[sequences["days_past"] <= window].copy()
@@ -31,11 +46,9 @@ def load_sequences( window=None ):
 
 
 def load_cases( window = None ):
-    cases = pd.read_csv( "resources/new_cases.csv" )
-
-    # Convert to dates correctly.
-    cases["updatedate"] = pd.to_datetime( cases["updatedate"] ).dt.tz_localize( None )
-    cases["updatedate"] = cases["updatedate"].dt.normalize()
+    cases = snapshots.read_snapshot( snapshots.CASES_SNAPSHOT, source=snapshots.CASES_CSV )
+    if cases is None:
+        cases = snapshots.format_cases( pd.read_csv( snapshots.CASES_CSV ) )
 
     if window is not None:
         cases = cases.loc[cases["days_past"] <= window].copy()
@@ -46,14 +59,37 @@ def load_growth_rates():
     return pd.read_csv( "resources/growth_rates.csv" )
 
 
+@remote_data.memoize( WW_GROWTH_RATES_URL )
 def load_ww_growth_rates():
-    return pd.read_csv( "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_WasteWater_San-Diego/master/rel_growth_rates.csv" )
+    return pd.read_csv( remote_data.open( WW_GROWTH_RATES_URL ) )
 
 def format_cases_total( cases_df ):
-    return_df = cases_df.sort_values( "updatedate", ascending=False ).groupby( "ziptext" ).first()
+    return_df = cases_df.sort_values( "updatedate", ascending=False ).groupby( "ziptext", observed=True ).first().sort_index()
     return_df = return_df.reset_index()
     return return_df.drop( columns=["days_past"] )
 
+def get_catchment_cases( cases_df, source ):
+    """ Smoothed number of reported cases per capita within a wastewater catchment area.
+    Parameters
+    ----------
+    cases_df : pandas.DataFrame
+        output of load_cases().
+    source : str
+        name of the catchment area.
+
+    Returns
+    -------
+    pandas.DataFrame
+        reported_cases, population and reported_cases_rolling per day, indexed by updatedate.
+    """
+    cases = cases_df.loc[cases_df["catchment"] == source].groupby( "updatedate" ).agg(
+        reported_cases=("new_cases", sum),
+        population=("population", sum ) )
+    cases["reported_cases_rolling"] = savgol_filter( cases["reported_cases"], window_length=21, polyorder=2 )
+    cases.loc[cases["reported_cases_rolling"] < 0] = 0
+    cases["reported_cases_rolling"] = cases["reported_cases_rolling"] / cases["population"]
+    return cases
+
 def get_seqs_per_case( time_series, seq_md, zip_f=None ):
     """ Combines timeseries of cases and sequences.
     Parameters
@@ -106,7 +142,7 @@ def get_seqs( seq_md, groupby="collection_date", zip_f=None ):
     else:
         seqs = seq_md
 
-    seqs = seqs.groupby( groupby )["ID"].agg( "count" ).reset_index()
+    seqs = seqs.groupby( groupby, observed=True )["ID"].agg( "count" ).reset_index()
     if groupby == "collection_date":
         seqs.columns = ["date", "new_sequences"]
     elif groupby == "zipcode":
@@ -146,23 +182,26 @@ def get_lineage_values( seqs ):
                    {"label" : "All Delta lineages", "value" : "all-delta" },
                    {"label" : "All Omicron lineages", "value" : "all-omicron" },
                    {"label" : " - Variants of concern" , "value" : "None", "disabled" : True}]
-    for i in sorted( VOC.keys() ):
-        if i in values:
+    for i in values:
+        if CLASSIFIER.is_voc( i ):
             return_dict.append( { "label" : i, "value" : i } )
 
     return_dict.append( {"label" : " - Variants of interest" , "value" : "None", "disabled" : True} )
-    for i in sorted( VOI.keys() ):
-        if i in values:
+    for i in values:
+        if CLASSIFIER.is_voi( i ):
             return_dict.append( { "label" : i, "value" : i } )
 
     return_dict.append( {"label" : " - PANGO lineages" , "value" : "None", "disabled" : True} )
     for i in values:
-        if ( i not in VOC ) & ( i not in VOI ):
+        if CLASSIFIER.classify( i ) is None:
             return_dict.append( { "label" : i, "value" : i } )
 
     return return_dict
 
-def get_summary_table( seqs ):
+def get_summary_table( seqs, voc_codes=None ):
+    """ Rows of the summary table. voc_codes are the output of CLASSIFIER.codes() restricted to variants of concern for
+    each row of seqs, e.g. taken from SequenceStore.voc_codes, and are computed if not given.
+    """
     sg = {"textAlign" : "center" }
     sd2 = {"marginLeft" : "50px" }
     table = [html.Tr( [html.Th( "Type", style={"marginLeft" : "20px" } ), html.Th( "Total", style=sg ), html.Th( "Last Month", style=sg )] ),
@@ -170,12 +209,15 @@ def get_summary_table( seqs ):
              html.Tr(html.Td( "", colSpan=3 ) ),
              html.Tr( html.Td( html.B( "Variants of concern", style={"marginLeft" : "10px" } ), colSpan=3))]
 
-    vocs = seqs.copy()
-    vocs["VOC"] = vocs["lineage"].map( VOC )
-    vocs = vocs.loc[~vocs["VOC"].isna()]
+    if voc_codes is None:
+        voc_codes = CLASSIFIER.codes( seqs["lineage"], variants=CLASSIFIER.voc )
+    voc_codes = np.asarray( voc_codes )
+    is_voc = voc_codes >= 0
+    totals = np.bincount( voc_codes[is_voc], minlength=len( CLASSIFIER.variants ) )
+    recent = np.bincount( voc_codes[is_voc & ( seqs['days_past'] < 30 ).to_numpy()], minlength=len( CLASSIFIER.variants ) )
 
-    for i in vocs["VOC"].sort_values().unique():
-        table.append( html.Tr( [html.Td( html.I( i, style={"marginLeft" : "20px" } ) ), html.Td( len( vocs.loc[vocs['VOC']==i] ), style=sg ), html.Td( len( vocs.loc[(vocs['VOC']==i)&(seqs['days_past']<30)] ), style=sg )] ) )
+    for code in np.flatnonzero( totals ):
+        table.append( html.Tr( [html.Td( html.I( CLASSIFIER.variants[code], style={"marginLeft" : "20px" } ) ), html.Td( int( totals[code] ), style=sg ), html.Td( int( recent[code] ), style=sg )] ) )
 
     # Brief hack to get Omicron in table
     #table.append( html.Tr(
@@ -185,11 +227,27 @@ def get_summary_table( seqs ):
     return table
 
 def get_provider_sequencer_values( seqs, value ):
-    labels = [{"label" : f"{i} ({j})", "value": i }for i, j in seqs[value].sort_values().value_counts().iteritems()]
+    counts = seqs[value].value_counts()
+    # Categorical columns also count categories that have been filtered out.
+    counts = counts.loc[counts > 0]
+    labels = [{"label" : f"{i} ({j})", "value": i }for i, j in counts.iteritems()]
     labels = sorted( labels, key=lambda x: x["label"] )
     return labels
 
 
+def _lgm( ndays, x0, r ):
+    return 1 / ( 1 + ( ( ( 1 / x0 ) - 1 ) * exp( -1 * r * ndays ) ) )
+
+def _lgm_mixture( ndays, x0_1, r_1, x0_2, r_2, x0_3, r_3, x0_4, r_4, x0_5, r_5 ):
+    return (_lgm( ndays, x0_1, r_1 )
+            - _lgm( ndays, x0_2, r_2 )
+            + _lgm( ndays, x0_3, r_3 )
+            - _lgm( ndays, x0_4, r_4 )
+            + _lgm( ndays - 50, x0_5, r_5 ) )    # you didn't see anything.
+
+# Fitted SGTF models, keyed on the hash of the SGTF file they were fit to.
+_sgtf_fits = dict()
+
 def load_sgtf_data():
     """ Loads S-gene target failure data from file and fits a logistic growth mixture model. Data comes from clinical
     sequencing in San Diego. Logisitic growth mixture model is a summation of three logisitic growth models. Further
@@ -205,29 +263,81 @@ def load_sgtf_data():
     estimates : pandas.DataFrame
         Estimates and confidence intervals for the growth rate, doubling time, and transmission advantage of the last component of the mixture model.
 
+    Fitting is slow, so the results are cached in memory and on disk, keyed on a hash of the SGTF file. The model is
+    only refit when the data changes. Results must be treated as read-only.
     """
+    key = remote_data.version( SGTF_URL )
+    if key in _sgtf_fits:
+        return _sgtf_fits[key]
 
-    def lgm( ndays, x0, r ):
-        return 1 / ( 1 + ( ( ( 1 / x0 ) - 1 ) * exp( -1 * r * ndays ) ) )
-
-    def lgm_mixture( ndays, x0_1, r_1, x0_2, r_2, x0_3, r_3, x0_4, r_4, x0_5, r_5 ):
-        return (lgm( ndays, x0_1, r_1 )
-                - lgm( ndays, x0_2, r_2 )
-                + lgm( ndays, x0_3, r_3 )
-                - lgm( ndays, x0_4, r_4 )
-                + lgm( ndays - 50, x0_5, r_5 ) )    # you didn't see anything.
-
-    tests = pd.read_csv( "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_SGTF_San-Diego/main/SGTF_San_Diego_new.csv", parse_dates=["Date"] )
+    tests = pd.read_csv( remote_data.open( SGTF_URL ), parse_dates=["Date"] )
     tests = tests.dropna( how='all', axis=1 )
     tests.columns = ["Date", "sgtf_all", "sgtf_likely", "sgtf_unlikely", "no_sgtf", "total_positive", "percent_low", "percen_all"]
     tests = tests.loc[~tests["Date"].isna()]
     tests["percent"] = (tests["sgtf_all"] / tests["total_positive"]).fillna(0)
     tests["percent_filter"] = savgol_filter( tests["percent"], window_length=7, polyorder=2 )
-    tests["ndays"] = tests["Date"].apply(lambda x: x.toordinal())
-    tests["ndays"] = tests["ndays"] - min( tests["ndays"] ) + 1
+    tests["ndays"] = ( tests["Date"] - tests["Date"].min() ).dt.days + 1
+
+    # Shared between gunicorn workers and kept across restarts, unless remote_data doesn't keep anything on disk.
+    fit_path = None
+    if remote_data.cache_dir is not None:
+        fit_path = os.path.join( remote_data.cache_dir, f"sgtf_fit_{key}.pkl" )
+
+    results = None
+    if fit_path is not None:
+        try:
+            with open( fit_path, "rb" ) as fit_file:
+                results = pickle.load( fit_file )["results"]
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+            pass
+
+    if results is None:
+        fit, covar, fit_df, estimates = fit_sgtf_model( tests )
+        results = (fit_df, estimates)
+        if fit_path is not None:
+            _save_sgtf_fit( fit_path, { "fit" : fit, "covar" : covar, "results" : results } )
+    fit_df, estimates = results
+
+    _sgtf_fits.clear()
+    _sgtf_fits[key] = (tests, fit_df, estimates)
+    return _sgtf_fits[key]
+
+def _save_sgtf_fit( fit_path, fit ):
+    """ Writes fit to fit_path, and removes the fits to previous versions of the SGTF file next to it.
+    """
+    os.makedirs( os.path.dirname( fit_path ), exist_ok=True )
+    temp_path = f"{fit_path}.{os.getpid()}.tmp"
+    with open( temp_path, "wb" ) as fit_file:
+        pickle.dump( fit, fit_file )
+    os.replace( temp_path, fit_path )
+
+    for old_path in glob.glob( os.path.join( os.path.dirname( fit_path ), "sgtf_fit_*.pkl" ) ):
+        if old_path != fit_path:
+            try:
+                os.remove( old_path )
+            except OSError:
+                pass
+
+def fit_sgtf_model( tests ):
+    """ Fits the logistic growth mixture model to SGTF data.
+    Parameters
+    ----------
+    tests : pandas.DataFrame
+        Raw SGTF data, as prepared by load_sgtf_data().
 
+    Returns
+    -------
+    fit : numpy.ndarray
+        Fitted parameters of the mixture model.
+    covar : numpy.ndarray
+        Estimated covariance of the fitted parameters.
+    fits : pandas.DataFrame
+        Estimated prevelence of SGTF using Logistic growth mixture model.
+    estimates : pandas.DataFrame
+        Estimates and confidence intervals for the growth rate, doubling time, and transmission advantage of the last component of the mixture model.
+    """
     fit, covar = curve_fit(
-        f=lgm_mixture,
+        f=_lgm_mixture,
         xdata=tests["ndays"],
         ydata=tests["percent_filter"],
         p0=[0.01, 0.1, 0.003, 0.1, 2e-7, 0.1, 1e-9, 0.1, 1e-11, 0.05],
@@ -239,7 +349,7 @@ def load_sgtf_data():
 
     fit_df = pd.DataFrame( {"date" : pd.date_range( tests["Date"].min(), periods=days_sim ) } )
     fit_df["ndays"] = fit_df.index
-    fit_df["fit_y"] = [lgm_mixture(i, *fit) for i in range( days_sim )]
+    fit_df["fit_y"] = _lgm_mixture( fit_df["ndays"].to_numpy(), *fit )
 
     sigma_addition = sigma_ab
     # should be -1 when we want to include the term. I won't for now because the CI is so large.
@@ -248,8 +358,8 @@ def load_sgtf_data():
     sigma_addition[8] *= -0.5   # sneaky little hack to get CIs
     sigma_addition[9] *= -1
 
-    fit_df["fit_lower"] = [lgm_mixture( i, *(fit + sigma_addition) ) for i in range( days_sim )]
-    fit_df["fit_upper"] = [lgm_mixture( i, *(fit - sigma_addition) ) for i in range( days_sim )]
+    fit_df["fit_lower"] = _lgm_mixture( fit_df["ndays"].to_numpy(), *(fit + sigma_addition) )
+    fit_df["fit_upper"] = _lgm_mixture( fit_df["ndays"].to_numpy(), *(fit - sigma_addition) )
 
     min_date = "2023-07-01"
 
@@ -272,14 +382,14 @@ def load_sgtf_data():
     estimates["doubling_time"] = log(2) / estimates["growth_rate"]
     estimates["transmission_increase"] = serial_interval * estimates["growth_rate"]
 
-    return tests, fit_df, estimates
+    return fit, covar, fit_df, estimates
 
 def load_ww_individual( loc: str, source: str, date_col: str, value_col: str, columns: List[str], window_length: int ) -> pd.DataFrame:
     """ Loads wastewater qPCR data from file
     Parameters
     ----------
     loc : str
-        Location of file
+        URL of file. Read through remote_data.
     source : str
         Name of the catchment area the file refers to. Will be encoded in the returned dataframe.
     date_col : str
@@ -296,7 +406,7 @@ def load_ww_individual( loc: str, source: str, date_col: str, value_col: str, co
     pd.DataFrame
         DataFrame containing a time series of qPCR measurements for a given catchment area.
     """
-    temp = pd.read_csv( loc, parse_dates=[date_col] )
+    temp = pd.read_csv( remote_data.open( loc ), parse_dates=[date_col] )
     temp["source"] = source
     temp.columns = columns
     temp.loc[~temp[value_col].isna(), f"{value_col}_rolling"] = savgol_filter(
@@ -304,22 +414,19 @@ def load_ww_individual( loc: str, source: str, date_col: str, value_col: str, co
 
     return temp
 
+@remote_data.memoize( *WW_TITER_URLS.values(), *WW_SEQS_URLS.values() )
 def load_wastewater_data():
     def round_to_odd( value ):
         return np.ceil( np.floor( value ) / 2 ) * 2 - 1
 
     def load_seq_individul( loc, source ):
-        temp = pd.read_csv( loc, parse_dates=["Date"], index_col="Date" )
+        temp = pd.read_csv( remote_data.open( loc ), parse_dates=["Date"], index_col="Date" )
         temp["source"] = source
         return temp
 
-    titer_template = "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_WasteWater_San-Diego/master/{}_sewage_qPCR.csv"
-    seqs_template = "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_WasteWater_San-Diego/master/{}_sewage_seqs.csv"
-    locations = ["PointLoma", "Encina", "SouthBay"]
-
     qpcr_columns = ["date", "gene_copies", "source"]
-    return_df = pd.concat( [load_ww_individual( loc=titer_template.format( loc ), source=loc, date_col="Sample_Date", value_col="gene_copies", columns=qpcr_columns, window_length=11 ) for loc in locations] )
-    seqs = pd.concat( [load_seq_individul( seqs_template.format( loc ), loc ) for loc in locations] )
+    return_df = pd.concat( [load_ww_individual( loc=WW_TITER_URLS[loc], source=loc, date_col="Sample_Date", value_col="gene_copies", columns=qpcr_columns, window_length=11 ) for loc in WW_LOCATIONS] )
+    seqs = pd.concat( [load_seq_individul( WW_SEQS_URLS[loc], loc ) for loc in WW_LOCATIONS] )
 
     return return_df, seqs
 
@@ -327,6 +434,7 @@ def load_catchment_areas():
     zip_loc = "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_WasteWater_San-Diego/master/Zipcodes.csv"
     zips = pd.read_csv( zip_loc, usecols=["Zip_code", "Wastewater_treatment_plant"] )
 
+    import geopandas as gpd
     sd = gpd.read_file( "resources/zips.geojson" )
 
     sd = sd.merge( zips, left_on=["ZIP"], right_on=["Zip_code"], how="outer" )
@@ -348,6 +456,7 @@ def lighten_field( value, alpha, gamma=2.2 ):
     return pow( pow(255, gamma) * (1 - alpha) + pow( value, gamma ) * alpha, 1 / gamma)
 def lighten_color( r, g, b, alpha, gamma=2.2 ):
     return lighten_field(r, alpha, gamma ), lighten_field( g, alpha, gamma ), lighten_field( b, alpha, gamma )
+@remote_data.memoize( WW_PLOT_CONFIG_URL )
 def load_ww_plot_config( delta=0.15 ):
     """ Loads the configuration file for the wastewater seqs plots. Essentially, the file specifies the name and color of
     lineages to be included.
@@ -357,15 +466,9 @@ def load_ww_plot_config( delta=0.15 ):
         Description of the name, lineage members, and color of each trace to be included in the plot.
     """
     import yaml
-    from urllib import request
 
-    try:
-        config_url = request.urlopen( "https://raw.githubusercontent.com/andersen-lab/SARS-CoV-2_WasteWater_San-Diego/master/plot_config.yml" )
-        plot_config = yaml.load( config_url, Loader=yaml.FullLoader )
-    except:
-        print( "Unable to connect to remote config. Defaulting to local, potentially out-of-date copy." )
-        with open( "resources/ww_seqs.yml", "r" ) as f :
-            plot_config = yaml.load( f, Loader=yaml.FullLoader )
+    # Falls back to the local, potentially out-of-date copy in resources/ww_seqs.yml if the remote can't be reached.
+    plot_config = yaml.load( remote_data.open( WW_PLOT_CONFIG_URL ), Loader=yaml.FullLoader )
 
     children_dict = dict()
 
@@ -387,21 +490,19 @@ def load_ww_plot_config( delta=0.15 ):
 
     return plot_config
 
+@remote_data.memoize( *MPX_TITER_URLS.values(), MPX_CASES_URL )
 def load_monkeypox_data():
-    titer_template = "https://raw.githubusercontent.com/andersen-lab/MPX_WasteWater_San-Diego/master/MPX_{}_qpcr.csv"
-    locations = ["PointLoma", "Encina", "SouthBay"]
-    data = pd.concat( [load_ww_individual( loc=titer_template.format( loc ), source=loc, date_col="date", value_col="copies", columns=["date", "source", "copies"], window_length=11 if loc=="PointLoma" else 3 ) for loc in locations] )
+    data = pd.concat( [load_ww_individual( loc=MPX_TITER_URLS[loc], source=loc, date_col="date", value_col="copies", columns=["date", "source", "copies"], window_length=11 if loc=="PointLoma" else 3 ) for loc in WW_LOCATIONS] )
     data.loc[data["copies_rolling"] < 0, "copies_rolling"] = 0
 
-    cases = pd.read_csv( "https://raw.githubusercontent.com/andersen-lab/MPX_WasteWater_San-Diego/master/MPX_cases.csv", parse_dates=["date"] )
+    cases = pd.read_csv( remote_data.open( MPX_CASES_URL ), parse_dates=["date"] )
     cases["cases"] = cases["cases"].diff().fillna(0)
     cases.loc[cases["cases"]<0,"cases"] = 0
-    cases["week"] = cases["date"].apply( lambda x: Week.fromdate( x ).startdate() )
+    cases["week"] = epiweek_start( cases["date"] )
     cases = cases.groupby( "week" )["cases"].agg( "sum" )
     cases = cases.reindex( pd.date_range( cases.index.min(), cases.index.max() ) ).rename_axis( "date" ).reset_index()
-    indexer = pd.api.indexers.FixedForwardWindowIndexer( window_size=7 )
     cases["cases"] = cases["cases"].fillna(0)
-    cases["cases"] = cases.rolling( window=indexer, min_periods=1 )["cases"].apply( lambda x: x.max() / 7 )
+    cases["cases"] = forward_window_max( cases["cases"].to_numpy(), window=7 ) / 7
     cases["cases_rolling"] = savgol_filter( cases["cases"], window_length=11, polyorder=2 )
     cases.loc[cases["cases_rolling"]<0,"cases_rolling"] = 0
 
@@ -0,0 +1,163 @@
+## growth_model.py fits the multinomial logistic regression of lineage on epiweek used to estimate growth rates. The
+## only covariates are the epiweek and a constant, so the model is fit to the number of sequences of each lineage in
+## each epiweek, weighting each row by its count, rather than to one row per sequence.
+
+import pickle
+
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+# Default tolerance of the optimizer used by fit_regularized().
+L1_ACC = 1e-12
+
+
+class WeightedMNLogit( sm.MNLogit ):
+    """ MNLogit where each observation stands for freq_weights identical observations. The log-likelihood, score and
+    hessian are those of the unaggregated data, so estimates and their covariance are unchanged. The number of
+    observations, residual degrees of freedom and null log-likelihood of the results are those of the unaggregated data
+    as well.
+
+    Parameters
+    ----------
+    endog : pd.Series
+        category of each observation.
+    exog : pd.DataFrame
+        exogenous variables of each observation.
+    freq_weights : array_like
+        number of observations each row stands for. Defaults to one each.
+    """
+
+    def __init__( self, endog, exog, freq_weights=None, **kwargs ):
+        super().__init__( endog, exog, **kwargs )
+        if freq_weights is None:
+            freq_weights = np.ones( self.exog.shape[0] )
+        self.freq_weights = np.asarray( freq_weights, dtype=float )
+        self.nobs = self.freq_weights.sum()
+        self.df_resid = self.nobs - self.df_model - ( self.J - 1 )
+
+    def _get_init_kwds( self ):
+        kwds = super()._get_init_kwds()
+        kwds["freq_weights"] = self.freq_weights
+        return kwds
+
+    def fit_regularized( self, *args, **kwargs ):
+        """ See sm.MNLogit.fit_regularized(). The optimizer minimizes the log-likelihood divided by the number of rows,
+        so its tolerance is rescaled to stop where it would on the unaggregated data.
+        """
+        kwargs.setdefault( "acc", L1_ACC * self.nobs / self.exog.shape[0] )
+        results = super().fit_regularized( *args, **kwargs )
+        results._results.nobs = self.nobs
+        results._results.df_resid = self.nobs - results._results.nnz_params
+        # Constant-only model, whose maximum likelihood estimates are the overall proportion of each category.
+        totals = np.dot( self.freq_weights, self.wendog )
+        observed = totals > 0
+        results._results._cache["llnull"] = np.sum( totals[observed] * np.log( totals[observed] / self.nobs ) )
+        return results
+
+    def loglike( self, params ):
+        return np.sum( self.loglikeobs( params ) )
+
+    def loglikeobs( self, params ):
+        return super().loglikeobs( params ) * self.freq_weights[:, None]
+
+    def score( self, params ):
+        residuals = self.wendog[:, 1:] - self.cdf( np.dot( self.exog, params.reshape( self.K, -1, order="F" ) ) )[:, 1:]
+        return np.dot( ( residuals * self.freq_weights[:, None] ).T, self.exog ).flatten()
+
+    def loglike_and_score( self, params ):
+        return self.loglike( params ), self.score( params )
+
+    def score_obs( self, params ):
+        return super().score_obs( params ) * self.freq_weights[:, None]
+
+    def hessian( self, params ):
+        probabilities = self.cdf( np.dot( self.exog, params.reshape( self.K, -1, order="F" ) ) )[:, 1:]
+        # Weighted derivative of the probability of each equation with respect to the log odds of every other.
+        jacobian = self.freq_weights[:, None, None] * probabilities[:, :, None] * ( np.eye( self.J - 1 ) - probabilities[:, None, :] )
+        H = -np.einsum( "nij,na,nb->iajb", jacobian, self.exog, self.exog, optimize=True )
+        return H.reshape( ( self.J - 1 ) * self.K, ( self.J - 1 ) * self.K )
+
+
+def aggregate_counts( weeks: pd.Series, lineages: pd.Series ) -> pd.DataFrame:
+    """ Number of sequences of each lineage in each epiweek. Lineages keep their categories, and combinations without
+    any sequences are left out.
+    """
+    counts = pd.DataFrame( { weeks.name : weeks, lineages.name : lineages } ).groupby( [weeks.name, lineages.name], observed=True ).size()
+    counts = counts.rename( "count" ).reset_index()
+    counts[lineages.name] = counts[lineages.name].astype( lineages.dtype )
+    return counts
+
+
+def load_start_params( loc: str, lineages: list, exog_names: list ):
+    """ Parameters of the model previously pickled to loc, if it was fit on the same lineages and exogenous variables,
+    in the order expected by fit_regularized(). Otherwise None.
+    """
+    try:
+        with open( loc, "rb" ) as model_file:
+            previous = pickle.load( model_file )
+    except FileNotFoundError:
+        return None
+    except ( pickle.UnpicklingError, AttributeError, EOFError, ImportError ) as e:
+        print( f"Unable to load previous model from {loc}: {e}" )
+        return None
+    if list( previous.model._ynames_map.values() ) != list( lineages ) or list( previous.model.exog_names ) != list( exog_names ):
+        return None
+    return np.asarray( previous.params ).ravel( order="F" )
+
+
+def fit_counts( counts: pd.DataFrame, weeks: str, lineages: str, start_params=None, maxiter: int = 1000, disp: bool = True ):
+    """ Fits a multinomial logistic regression of lineage on epiweek to the output of aggregate_counts().
+
+    Parameters
+    ----------
+    counts : pd.DataFrame
+        output of aggregate_counts().
+    weeks : str
+        column of counts containing the epiweek, as a number.
+    lineages : str
+        column of counts containing the categorical lineage. The first category is the reference.
+    start_params : np.ndarray
+        starting values, in the order expected by fit_regularized().
+    maxiter : int
+        maximum number of iterations.
+    disp : bool
+        whether to print convergence messages.
+
+    Returns
+    -------
+    statsmodels.discrete.discrete_model.L1MultinomialResultsWrapper
+    """
+    exog = counts[[weeks]].assign( const=1 )
+    model = WeightedMNLogit( counts[lineages], exog, freq_weights=counts["count"] )
+    return model.fit_regularized( start_params=start_params, maxiter=maxiter, disp=disp )
+
+
+def fit_growth_model( weeks: pd.Series, lineages: pd.Series, previous_model: str = None, maxiter: int = 1000 ):
+    """ Fits a multinomial logistic regression of lineage on epiweek to the number of sequences of each lineage in each
+    epiweek. Equivalent to fitting sm.MNLogit to one row per sequence.
+
+    Parameters
+    ----------
+    weeks : pd.Series
+        epiweek of each sequence, as a number.
+    lineages : pd.Series
+        categorical lineage of each sequence. The first category is the reference.
+    previous_model : str
+        location of a previously pickled fit. Its parameters are used as starting values if it was fit on the same
+        lineages.
+    maxiter : int
+        maximum number of iterations.
+
+    Returns
+    -------
+    statsmodels.discrete.discrete_model.L1MultinomialResultsWrapper
+    """
+    counts = aggregate_counts( weeks, lineages )
+
+    start_params = None
+    if previous_model is not None:
+        start_params = load_start_params( previous_model, lineages.cat.categories, [weeks.name, "const"] )
+        if start_params is not None:
+            print( f"Starting from the parameters of {previous_model}" )
+    return fit_counts( counts, weeks.name, lineages.name, start_params=start_params, maxiter=maxiter )
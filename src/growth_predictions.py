@@ -0,0 +1,101 @@
+## growth_predictions.py predicts the prevalence of each lineage from a multinomial logistic regression of lineage on
+## epiweek, along with confidence intervals. Predictions and standard errors for every lineage and week are computed
+## together from the covariance matrix of the model rather than one lineage and week at a time.
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit, logit
+
+# Two-sided 95% interval.
+Z_95 = 1.96
+
+
+def design_matrix( weeks ) -> np.ndarray:
+    """ Exogenous variables of the growth rate model, epiweek and a constant, for each of weeks.
+    """
+    weeks = np.asarray( weeks, dtype=float )
+    return np.column_stack( [weeks, np.ones_like( weeks )] )
+
+
+def _covariance_blocks( results ) -> np.ndarray:
+    """ Covariance of the parameters of a fitted MNLogit as an array indexed [equation, exog, equation, exog].
+    """
+    k_exog, k_equations = np.shape( results.params )
+    return np.asarray( results.cov_params() ).reshape( k_equations, k_exog, k_equations, k_exog )
+
+
+def linear_predictor_se( results, exog: np.ndarray ) -> np.ndarray:
+    """ Standard error of the log odds of each lineage against the reference lineage, for each row of exog.
+
+    Returns
+    -------
+    np.ndarray
+        array of shape (rows of exog, lineages other than the reference).
+    """
+    variance = np.einsum( "wa,jajb,wb->wj", exog, _covariance_blocks( results ), exog, optimize=True )
+    return np.sqrt( variance )
+
+
+def probability_se( results, exog: np.ndarray, probabilities: np.ndarray ) -> np.ndarray:
+    """ Delta method standard error of the predicted probability of each lineage, including the reference, for each row
+    of exog. The gradient of the probability of lineage j with respect to the parameters of equation m is
+    p_j * ( [j == m] - p_m ) * x.
+
+    Returns
+    -------
+    np.ndarray
+        array of shape (rows of exog, lineages).
+    """
+    k_lineages = probabilities.shape[1]
+    # Covariance of the log odds of every pair of equations, for each row of exog.
+    log_odds_covariance = np.einsum( "wa,manb,wb->wmn", exog, _covariance_blocks( results ), exog, optimize=True )
+    jacobian = probabilities[:, :, None] * ( np.eye( k_lineages )[None, :, 1:] - probabilities[:, None, 1:] )
+    variance = np.einsum( "wjm,wmn,wjn->wj", jacobian, log_odds_covariance, jacobian, optimize=True )
+    return np.sqrt( np.clip( variance, 0, None ) )
+
+
+def predict_prevalence( results, weeks: list, z: float = Z_95, delta: bool = False ) -> pd.DataFrame:
+    """ Predicted prevalence of each lineage in each of weeks, except for the reference lineage of the model (Other).
+    Confidence intervals are computed on the log odds of each lineage against the reference lineage, and transformed
+    back onto the predicted prevalence.
+
+    Parameters
+    ----------
+    results : statsmodels.discrete.discrete_model.MultinomialResults
+        MNLogit of lineage on epiweek and a constant.
+    weeks : list
+        epiweeks, as used to fit the model.
+    z : float
+        critical value of the confidence intervals.
+    delta : bool
+        whether to add delta method confidence intervals on the prevalence, as delta_lower and delta_upper.
+
+    Returns
+    -------
+    pd.DataFrame
+        variant, prevalence, upper and lower, for each variant and week, indexed by week.
+    """
+    exog = design_matrix( weeks )
+    probabilities = np.asarray( results.predict( exog ) )
+    margin = z * linear_predictor_se( results, exog )
+
+    # The reference lineage comes first and has no equation of its own. Lineages are reported in alphabetical order.
+    names = np.array( list( results.model._ynames_map.values() )[1:], dtype=object )
+    order = np.argsort( names, kind="stable" )
+    names = names[order]
+    margin = margin[:, order]
+    prevalence = probabilities[:, 1:][:, order]
+    log_odds = logit( prevalence )
+
+    results_df = pd.DataFrame( {
+        "variant" : np.repeat( names, len( weeks ) ),
+        "prevalence" : prevalence.T.ravel(),
+        "upper" : expit( log_odds + margin ).T.ravel(),
+        "lower" : expit( log_odds - margin ).T.ravel(),
+    }, index=np.tile( np.asarray( weeks ), len( names ) ) )
+
+    if delta:
+        se = probability_se( results, exog, probabilities )[:, 1:][:, order]
+        results_df["delta_upper"] = np.clip( prevalence + z * se, 0, 1 ).T.ravel()
+        results_df["delta_lower"] = np.clip( prevalence - z * se, 0, 1 ).T.ravel()
+    return results_df
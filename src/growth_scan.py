@@ -0,0 +1,218 @@
+## growth_scan.py estimates lineage growth rates over several windows of recent epiweeks in each region, along with a
+## parametric bootstrap of each estimate. Every fit, including every bootstrap replicate, is independent, so fits are
+## spread over a pool of processes. Each replicate draws from its own random stream, derived from the seed and the
+## position of the replicate in the scan, so results don't depend on the number of processes or the order fits finish.
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.growth_model import aggregate_counts, fit_counts
+
+REGIONS = ["San Diego", "Baja California"]
+WINDOWS = [4, 8, 12]
+# Epiweeks with fewer sequences than this are left out of the windows of a region.
+MIN_WEEKLY_SEQUENCES = { "San Diego" : 100, "Baja California" : 20 }
+BOOTSTRAP_REPLICATES = 100
+SEED = 20221201
+Z_95 = 1.96
+
+
+def map_processes( func, items, max_workers: int = None ) -> list:
+    """ Applies func to every item using a pool of processes. Results are returned in the order of items and
+    exceptions are re-raised. func and items have to be picklable.
+    """
+    items = list( items )
+    max_workers = max_workers or os.cpu_count() or 1
+    if len( items ) <= 1 or max_workers <= 1:
+        return [func( item ) for item in items]
+    with ProcessPoolExecutor( max_workers=min( max_workers, len( items ) ) ) as pool:
+        return list( pool.map( func, items, chunksize=max( 1, len( items ) // ( 4 * max_workers ) ) ) )
+
+
+def last_weeks( seqs: pd.DataFrame, n_weeks: int, min_sequences: int ) -> pd.Index:
+    """ Last n_weeks epiweeks with more than min_sequences sequences.
+    """
+    weeks = seqs["epiweek"].value_counts().sort_index()
+    return weeks[weeks > min_sequences][-n_weeks:].index
+
+
+def week_number( epiweeks: pd.Series ) -> pd.Series:
+    """ Days between each epiweek and 1970-01-01, the numeric epiweek used by the growth rate model.
+    """
+    return ( epiweeks - pd.Timestamp( "1970-01-01" ) ) / pd.Timedelta( days=1 )
+
+
+def window_counts( seqs: pd.DataFrame, weeks: pd.Index, collapser, forced_lineages: list[str], **kwargs ) -> pd.DataFrame:
+    """ Number of sequences of each collapsed lineage in each of weeks. Other is the reference lineage, unless every
+    lineage was accepted, in which case the first lineage is. Keyword arguments are passed to collapser.collapse().
+    """
+    window = seqs.loc[seqs["epiweek"].isin( weeks )]
+    collapsed = window["lineage"].map( collapser.collapse( window["lineage"], forced_lineages, verbose=False, **kwargs ) )
+    categories = sorted( set( collapsed.dropna() ) - { "Other" } )
+    if ( collapsed == "Other" ).any():
+        categories = ["Other"] + categories
+    collapsed = pd.Series( pd.Categorical( collapsed, categories=categories ), index=window.index, name="lineage" )
+    return aggregate_counts( week_number( window["epiweek"] ).rename( "week" ), collapsed )
+
+
+def growth_rates( results, z: float = Z_95 ) -> pd.DataFrame:
+    """ Coefficient of epiweek in each equation of a fitted model, which is the daily growth rate of each lineage
+    relative to the reference lineage, and its confidence interval.
+    """
+    reference, *lineages = results.model._ynames_map.values()
+    params = np.asarray( results.params )[0]
+    se = np.sqrt( np.diag( np.asarray( results.cov_params() ) ).reshape( len( lineages ), -1 )[:, 0] )
+    return pd.DataFrame( { "lineage" : lineages, "reference" : reference, "growth_rate" : params, "lower" : params - z * se,
+                           "upper" : params + z * se } )
+
+
+def fit_window( counts: pd.DataFrame ):
+    """ Fits the growth rate model to the output of window_counts().
+
+    Returns
+    -------
+    tuple
+        growth_rates() and the fitted parameters, or None if the fit failed, didn't converge, or has no confidence
+        intervals, as happens when lineages are perfectly separated by epiweek.
+    """
+    try:
+        results = fit_counts( counts, "week", "lineage", disp=False )
+    except np.linalg.LinAlgError:
+        return None
+    params = np.asarray( results.params )
+    if not results.mle_retvals.get( "converged", True ) or not np.isfinite( params ).all():
+        return None
+    rates = growth_rates( results )
+    if not np.isfinite( rates[["lower", "upper"]].to_numpy() ).all():
+        return None
+    return rates, params.ravel( order="F" )
+
+
+def simulate_counts( counts: pd.DataFrame, params: np.ndarray, rng: np.random.Generator ) -> pd.DataFrame:
+    """ Draws the number of sequences of each lineage in each epiweek from the fitted model, keeping the number of
+    sequences in each epiweek.
+    """
+    totals = counts.groupby( "week" )["count"].sum()
+    log_odds = np.column_stack( [totals.index.to_numpy(), np.ones( len( totals ) )] ) @ params.reshape( 2, -1, order="F" )
+    log_odds = np.column_stack( [np.zeros( len( totals ) ), log_odds] )
+    probabilities = np.exp( log_odds - log_odds.max( axis=1, keepdims=True ) )
+    probabilities /= probabilities.sum( axis=1, keepdims=True )
+    draws = np.array( [rng.multinomial( total, p ) for total, p in zip( totals.to_numpy(), probabilities )] )
+
+    categories = counts["lineage"].cat.categories
+    simulated = pd.DataFrame( { "week" : np.repeat( totals.index.to_numpy(), len( categories ) ),
+                                "lineage" : pd.Categorical.from_codes( np.tile( np.arange( len( categories ) ), len( totals ) ), categories=categories ),
+                                "count" : draws.ravel() } )
+    return simulated.loc[simulated["count"] > 0].reset_index( drop=True )
+
+
+def fit_replicate( task ) -> np.ndarray:
+    """ Growth rate of each lineage fit to one parametric bootstrap replicate. Lineages which weren't drawn at all have
+    no estimate, and are left out of the fit, which is the limit of the fit with them included. Estimates are NaN for
+    lineages which weren't drawn, and for every lineage if the reference wasn't drawn or the fit failed.
+
+    Parameters
+    ----------
+    task : tuple
+        output of window_counts(), the parameters fitted to it, and the np.random.SeedSequence of the replicate.
+    """
+    counts, params, seed = task
+    simulated = simulate_counts( counts, params, np.random.default_rng( seed ) )
+    categories = counts["lineage"].cat.categories
+    rates = np.full( len( categories ) - 1, np.nan )
+
+    drawn = np.bincount( simulated["lineage"].cat.codes, minlength=len( categories ) ) > 0
+    if not drawn[0] or drawn.sum() < 2:
+        return rates
+    simulated["lineage"] = simulated["lineage"].cat.remove_unused_categories()
+    start_params = params.reshape( 2, -1, order="F" )[:, drawn[1:]].ravel( order="F" )
+    try:
+        results = fit_counts( simulated, "week", "lineage", start_params=start_params, disp=False )
+    except np.linalg.LinAlgError:
+        return rates
+    if results.mle_retvals.get( "converged", True ):
+        rates[drawn[1:]] = np.asarray( results.params )[0]
+    return rates
+
+
+def scan_growth_rates( seqs: pd.DataFrame, collapser, forced_lineages: list[str], regions: list[str] = None, windows: list[int] = None,
+                       replicates: int = BOOTSTRAP_REPLICATES, seed: int = SEED, max_workers: int = None, **kwargs ) -> pd.DataFrame:
+    """ Growth rate of each lineage over the last epiweeks of each region, for several window lengths, with both Wald
+    and parametric bootstrap confidence intervals. Keyword arguments are passed to collapser.collapse().
+
+    Parameters
+    ----------
+    seqs : pd.DataFrame
+        sequences, with epiweek, lineage, and state columns.
+    collapser : src.lineage_collapse.LineageCollapser
+        used to collapse rare lineages within each window.
+    forced_lineages : list
+        lineages which are never collapsed.
+    regions : list
+        values of seqs["state"] to scan. Defaults to REGIONS.
+    windows : list
+        number of epiweeks in each window. Defaults to WINDOWS.
+    replicates : int
+        number of bootstrap replicates of each fit.
+    seed : int
+        seed of the bootstrap. Results are identical for identical seeds.
+    max_workers : int
+        number of processes. Defaults to the number of CPUs.
+
+    Returns
+    -------
+    pd.DataFrame
+        region, window, lineage, reference, growth_rate, lower, upper, bootstrap_lower, bootstrap_upper, bootstrap_replicates,
+        sequences, first_date, and last_date of each lineage in each window.
+    """
+    regions = REGIONS if regions is None else regions
+    windows = WINDOWS if windows is None else windows
+
+    scans = list()
+    for region_index, region in enumerate( regions ):
+        region_seqs = seqs.loc[seqs["state"] == region]
+        for window_index, window in enumerate( windows ):
+            weeks = last_weeks( region_seqs, window, MIN_WEEKLY_SEQUENCES.get( region, 0 ) )
+            if len( weeks ) < window:
+                print( f"Skipping {window} week window in {region}: only {len( weeks )} epiweeks have enough sequences" )
+                continue
+            counts = window_counts( region_seqs, weeks, collapser, forced_lineages, **kwargs )
+            if len( counts["lineage"].cat.categories ) < 2:
+                print( f"Skipping {window} week window in {region}: no lineages were accepted" )
+                continue
+            scans.append( ( region, window, weeks, counts, ( region_index, window_index ) ) )
+
+    fits = map_processes( fit_window, [scan[3] for scan in scans], max_workers=max_workers )
+    for ( region, window, *_ ), fit in zip( scans, fits ):
+        if fit is None:
+            print( f"Skipping {window} week window in {region}: the model didn't converge" )
+    scans, fits = [scan for scan, fit in zip( scans, fits ) if fit is not None], [fit for fit in fits if fit is not None]
+
+    tasks = list()
+    for ( _, _, _, counts, spawn_key ), ( _, params ) in zip( scans, fits ):
+        seeds = np.random.SeedSequence( seed, spawn_key=spawn_key ).spawn( replicates )
+        tasks.extend( ( counts, params, replicate_seed ) for replicate_seed in seeds )
+    bootstraps = map_processes( fit_replicate, tasks, max_workers=max_workers )
+
+    tables = list()
+    for i, ( ( region, window, weeks, counts, _ ), ( rates, _ ) ) in enumerate( zip( scans, fits ) ):
+        table = rates.copy()
+        if replicates > 0:
+            replicate_rates = pd.DataFrame( np.vstack( bootstraps[i * replicates:( i + 1 ) * replicates] ) )
+            table["bootstrap_lower"] = replicate_rates.quantile( 0.025 ).to_numpy()
+            table["bootstrap_upper"] = replicate_rates.quantile( 0.975 ).to_numpy()
+            table["bootstrap_replicates"] = replicate_rates.notna().sum().to_numpy()
+        sequences = counts.groupby( "lineage", observed=True )["count"].sum()
+        table["sequences"] = table["lineage"].map( sequences ).fillna( 0 ).astype( int )
+        table.insert( 0, "window", window )
+        table.insert( 0, "region", region )
+        table["first_date"] = min( weeks ).strftime( "%Y-%m-%d" )
+        table["last_date"] = max( weeks ).strftime( "%Y-%m-%d" )
+        tables.append( table )
+
+    if not tables:
+        return pd.DataFrame()
+    return pd.concat( tables, ignore_index=True )
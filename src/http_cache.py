@@ -0,0 +1,116 @@
+## http_cache.py compresses the responses of the Flask server behind the dashboard and lets clients revalidate callback
+## responses. Outputs of a callback only depend on its inputs and on the data it reads, so a callback request gets an
+## ETag derived from its body and the version of the data, and an identical request made with If-None-Match is answered
+## with a 304 without running the callback. Dash callbacks are POST requests, which browsers and CDNs never revalidate,
+## so this only benefits clients that send If-None-Match themselves, such as scripts replaying callback requests. Browsers
+## still benefit from the compression, and the data API (src/api.py) serves cacheable GETs.
+
+import gzip
+import hashlib
+import json
+
+from flask import Response, g, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DASH_UPDATE_PATH = "_dash-update-component"
+COMPRESSIBLE_TYPES = { "application/json", "application/javascript", "text/javascript", "text/css", "text/html", "text/csv",
+                       "text/plain", "image/svg+xml" }
+
+# Responses smaller than this aren't worth compressing.
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def choose_encoding( accept_encodings ):
+    """ Preferred content encoding supported by both the client and the server, or None.
+    """
+    if brotli is not None and "br" in accept_encodings:
+        return "br"
+    if "gzip" in accept_encodings:
+        return "gzip"
+    return None
+
+
+def compress( data: bytes, encoding: str ) -> bytes:
+    if encoding == "br":
+        return brotli.compress( data, quality=BROTLI_QUALITY )
+    return gzip.compress( data, compresslevel=GZIP_LEVEL )
+
+
+def output_ids( output: str ) -> set:
+    """ Component ids of the outputs of a callback, given the output string Dash sends, e.g. "zip-graph.figure" or
+    "..cum-graph.figure...daily-graph.figure..".
+    """
+    return { prop.rsplit( ".", 1 )[0] for prop in output.strip( "." ).split( "..." ) }
+
+
+def register_http_cache( server, version, uncached_outputs=() ):
+    """ Adds ETags and 304 revalidation to Dash callback requests, and compression to every response. Only clients that
+    send If-None-Match with a POST get 304s, browsers and CDNs don't.
+    Parameters
+    ----------
+    server : flask.Flask
+        app.server.
+    version : callable
+        returns the version of all the data read by callbacks. Has to be the same in every worker for the same data.
+    uncached_outputs : list
+        ids of components whose callbacks depend on more than their inputs and the data, such as the time. These are
+        never revalidated.
+    """
+    uncached_outputs = set( uncached_outputs )
+
+    def _request_etag():
+        if request.method != "POST" or not request.path.endswith( DASH_UPDATE_PATH ):
+            return None
+        body = request.get_data( cache=True )
+        try:
+            output = json.loads( body )["output"]
+        except (ValueError, KeyError, TypeError):
+            return None
+        if output_ids( output ) & uncached_outputs:
+            return None
+        digest = hashlib.sha1( version().encode() )
+        digest.update( body )
+        return digest.hexdigest()
+
+    @server.before_request
+    def revalidate():
+        etag = _request_etag()
+        g.dash_etag = etag
+        if etag is None:
+            return None
+        # Compressed variants carry their own ETag.
+        if any( request.if_none_match.contains( tag ) for tag in [etag, f"{etag}-br", f"{etag}-gzip"] ):
+            response = Response( status=304 )
+            response.set_etag( etag )
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+        return None
+
+    @server.after_request
+    def finalize( response ):
+        etag = g.get( "dash_etag" )
+        if etag is not None and response.status_code == 200:
+            response.set_etag( etag )
+            response.headers["Cache-Control"] = "no-cache"
+
+        if ( response.status_code != 200 or response.direct_passthrough or response.is_streamed
+             or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_TYPES ):
+            return response
+        response.vary.add( "Accept-Encoding" )
+        encoding = choose_encoding( request.accept_encodings )
+        data = response.get_data()
+        if encoding is None or len( data ) < MIN_COMPRESS_SIZE:
+            return response
+
+        response.set_data( compress( data, encoding ) )
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None:
+            response.set_etag( f"{etag}-{encoding}", weak=weak )
+        return response
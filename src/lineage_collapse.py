@@ -0,0 +1,104 @@
+## lineage_collapse.py collapses rare lineages into their parents before growth rates are modelled. The collapse works
+## on the distinct lineage names rather than on individual sequences: the parent of every name is resolved once, and
+## each round only moves counts along that graph.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Two letter aliases with a single level, e.g. BQ.1, are collapsed into their unaliased parent relative to BA.
+ALIAS_PATTERN = re.compile( r"[A-Z]{2}.\d+$" )
+
+
+class LineageCollapser:
+    """ Parent graph of a set of lineages, used to repeatedly collapse lineages with too few sequences into their
+    parents. The parent of a lineage is its name with the last level dropped, or for aliases like BQ.1 the partially
+    compressed name of its unaliased parent. Parents are resolved once per name, so alias expansion is only done once.
+
+    Parameters
+    ----------
+    aliasor : pango_aliasor.aliasor.Aliasor
+        used to resolve the parents of aliased lineages.
+    """
+
+    def __init__( self, aliasor ):
+        self.aliasor = aliasor
+        self.names = list()
+        self.parents = list()
+        self._ids = dict()
+
+    def node( self, lineage: str ) -> int:
+        """ Position of a lineage in self.names, adding it and all of its ancestors to the graph if necessary.
+        """
+        path = list()
+        while lineage not in self._ids:
+            self._ids[lineage] = len( self.names )
+            self.names.append( lineage )
+            self.parents.append( None )
+            parent = self.parent( lineage )
+            path.append( ( lineage, parent ) )
+            lineage = parent
+        # Ancestors are added after their descendants, so parents are filled in once the whole path is known.
+        for name, parent in path:
+            self.parents[self._ids[name]] = self._ids[parent]
+        return self._ids[path[0][0]] if path else self._ids[lineage]
+
+    def parent( self, lineage: str ) -> str:
+        """ Lineage that lineage is collapsed into. Lineages without a parent are returned unchanged.
+        """
+        if "." not in lineage:
+            return lineage
+        elif ALIAS_PATTERN.match( lineage ):
+            return self.aliasor.partial_compress( self.aliasor.uncompress( lineage ), accepted_aliases=["BA"] )
+        return ".".join( lineage.split( "." )[:-1] )
+
+    def collapse( self, lineages: pd.Series, forced_lineages: list[str], rounds: int = 10, min_sequences: int = 50, verbose: bool = True ) -> dict:
+        """ Collapses lineages with min_sequences or fewer sequences into their parents. In each round, every lineage
+        which isn't accepted moves one level up, where accepted lineages are those with more than min_sequences
+        sequences at the start of the round, along with forced_lineages. Lineages still not accepted after the last
+        round are set to "Other".
+
+        Parameters
+        ----------
+        lineages : pd.Series
+            lineage of each sequence.
+        forced_lineages : list
+            lineages which are always accepted.
+        rounds : int
+            number of rounds.
+        min_sequences : int
+            lineages need more than this many sequences to be accepted.
+        verbose : bool
+            whether to print the number of accepted lineages after each round.
+
+        Returns
+        -------
+        dict
+            collapsed lineage of each distinct lineage.
+        """
+        sizes = lineages.value_counts().sort_index()
+        origins = np.array( [self.node( lineage ) for lineage in sizes.index], dtype=np.int64 )
+        weights = sizes.to_numpy()
+
+        forced_ids = [self.node( lineage ) for lineage in forced_lineages]
+        forced = np.zeros( len( self.names ), dtype=bool )
+        forced[forced_ids] = True
+        parents = np.array( self.parents, dtype=np.int64 )
+
+        def _accepted( current ):
+            counts = np.bincount( current, weights=weights, minlength=len( self.names ) )
+            return ( counts > min_sequences ) | forced
+
+        current = origins
+        accepted = _accepted( current )
+        for i in range( rounds ):
+            moved = np.where( accepted[current], current, parents[current] )
+            previous, accepted = accepted, _accepted( moved )
+            current = moved
+            if verbose:
+                print( f"Round {i} allowed {np.count_nonzero( accepted )} lineages from {np.count_nonzero( previous )}" )
+
+        names = np.array( self.names, dtype=object )
+        collapsed = np.where( accepted[current], names[current], "Other" )
+        return dict( zip( sizes.index, collapsed ) )
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from src.sequence_store import SequenceStore, RECENCY_BUCKETS
+
+CUBE_DIMENSIONS = ["state", "zipcode", "provider", "sequencer", "recency", "epiweek", "lineage"]
+
+
+class LineageCube:
+    """ Pre-aggregated count of sequences along (state, zipcode, provider, sequencer, epiweek, lineage). An additional
+    recency dimension records the smallest recency bucket each sequence falls within so the window filter can be
+    answered from the cube as well. Only non-empty cells are stored.
+
+    Parameters
+    ----------
+    store : SequenceStore
+        indexed sequences to aggregate.
+    """
+
+    def __init__( self, store: SequenceStore ):
+        self.store = store
+        seqs = store.sequences
+
+        self._epiweek_codes, self.epiweeks = pd.factorize( seqs["epiweek"], sort=True )
+        self._lineage_codes, self.lineages = pd.factorize( seqs["lineage"], sort=True )
+        self._recency_codes = np.searchsorted( RECENCY_BUCKETS, store.sequences["days_past"].to_numpy(), side="left" )
+
+        # Missing states, ZIP codes, providers and sequencers get a slot of their own past the last category, which
+        # no filter selects. They still count towards the unfiltered counts, like they do in pivot_table.
+        categorical = [np.where( store.codes[column] < 0, len( store.categories[column] ), store.codes[column] )
+                       for column in ["state", "zipcode", "provider", "sequencer"]]
+        dims = categorical + [self._recency_codes, self._epiweek_codes, self._lineage_codes]
+        shape = [len( store.categories[column] ) + 1 for column in ["state", "zipcode", "provider", "sequencer"]]
+        shape += [len( RECENCY_BUCKETS ) + 1, len( self.epiweeks ), len( self.lineages )]
+
+        # pivot_table drops rows without an epiweek or lineage, and doesn't count rows without an ID.
+        self._valid = ( self._epiweek_codes >= 0 ) & ( self._lineage_codes >= 0 ) & seqs["ID"].notna().to_numpy()
+        keys = np.ravel_multi_index( [d[self._valid] for d in dims], shape )
+        keys, counts = np.unique( keys, return_counts=True )
+
+        self.cells = dict( zip( CUBE_DIMENSIONS, np.unravel_index( keys, shape ) ) )
+        self.counts_array = counts
+
+        self._default = { state : self._aggregate( self.cells["state"] == i )
+                          for i, state in enumerate( store.categories["state"] ) }
+
+    def __len__( self ):
+        return len( self.counts_array )
+
+    def _to_frame( self, matrix: np.ndarray ) -> pd.DataFrame:
+        rows = matrix.any( axis=1 )
+        cols = matrix.any( axis=0 )
+        return pd.DataFrame( matrix[np.ix_( rows, cols )],
+                             index=pd.Index( self.epiweeks[rows], name="epiweek" ),
+                             columns=pd.Index( self.lineages[cols], name="lineage" ) )
+
+    def _bincount( self, epiweek_codes, lineage_codes, weights=None ) -> pd.DataFrame:
+        n_lineages = len( self.lineages )
+        matrix = np.bincount( epiweek_codes * n_lineages + lineage_codes, weights=weights,
+                              minlength=len( self.epiweeks ) * n_lineages )
+        return self._to_frame( matrix.astype( np.int64 ).reshape( len( self.epiweeks ), n_lineages ) )
+
+    def _aggregate( self, mask: np.ndarray ) -> pd.DataFrame:
+        return self._bincount( self.cells["epiweek"][mask], self.cells["lineage"][mask], self.counts_array[mask] )
+
+    def counts( self, state=None, window=None, provider=None, sequencer=None, zip_f=None ) -> pd.DataFrame:
+        """ Counts of sequences per epiweek and lineage for a filter combination. Equivalent to
+        seqs.pivot_table( index="epiweek", columns="lineage", values="ID", aggfunc="count", fill_value=0 ) over the
+        filtered sequences.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Number of sequences with epiweeks as the index and lineages as columns. Only epiweeks and lineages with at
+            least one sequence are included.
+        """
+        if not any( [window, provider, sequencer, zip_f] ) and state in self._default:
+            return self._default[state]
+
+        # Windows which aren't one of the recency buckets can't be answered from the cube.
+        if window and window not in RECENCY_BUCKETS:
+            idx = self.store.indices( state, window, provider, sequencer, zip_f )
+            idx = idx[self._valid[idx]]
+            return self._bincount( self._epiweek_codes[idx], self._lineage_codes[idx] )
+
+        mask = np.ones( len( self ), dtype=bool )
+        if state:
+            mask &= np.isin( self.cells["state"], self.store.value_codes( "state", state ) )
+        if window:
+            mask &= self.cells["recency"] <= RECENCY_BUCKETS.index( window )
+        if provider:
+            mask &= np.isin( self.cells["provider"], self.store.value_codes( "provider", provider ) )
+        if sequencer:
+            mask &= np.isin( self.cells["sequencer"], self.store.value_codes( "sequencer", sequencer ) )
+        if zip_f:
+            mask &= np.isin( self.cells["zipcode"], self.store.value_codes( "zipcode", zip_f ) )
+        return self._aggregate( mask )
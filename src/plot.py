@@ -3,11 +3,11 @@ import plotly.express as px
 from plotly.subplots import make_subplots
 import numpy as np
 import pandas as pd
-from epiweeks import Week
 from scipy.signal import savgol_filter
 from scipy.special import betaincinv
 
-from src.variants import VOC, VOI
+from src.variants import CLASSIFIER
+from src.epiweek import epiweek_start
 import datetime
 
 COLOR_DARK = "#495057"
@@ -71,14 +71,117 @@ def get_date_limits( series ):
     min_lim = pd.to_datetime( f"{year}-{month}-{day}" )
     return [min_lim, max_lim]
 
-def plot_daily_cases_seqs( df ):
+# Line traces spanning the whole history are decimated to about this many points, roughly one per pixel of the graph.
+MAX_POINTS = 500
+# compact_series() sends dates as x0/dx and values as rounded JSON lists rather than typed arrays: plotly 5.10 and the
+# plotly.js bundled with dash 2.4 predate the base64 {dtype, bdata} encoding. On three years of daily data this cuts the
+# case graphs from about 70 KB of JSON to 17-29 KB, and the stacked wastewater lineages from about 300 KB to 63 KB.
+SIGNIFICANT_DIGITS = 6
+
+def lttb( x, y, threshold ):
+    """ Largest-Triangle-Three-Buckets downsampling. Keeps the first and last points and, for each of threshold - 2
+    buckets of consecutive points, the one forming the largest triangle with the previously kept point and the mean of
+    the next bucket, which preserves peaks and troughs of the line.
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        coordinates of the points, sorted by x and without missing values.
+    threshold : int
+        number of points to keep.
+
+    Returns
+    -------
+    numpy.ndarray
+        sorted positions of the points to keep.
+    """
+    n = len( x )
+    if threshold is None or threshold >= n or threshold < 3:
+        return np.arange( n )
+    x = np.asarray( x, dtype=float )
+    y = np.asarray( y, dtype=float )
+
+    every = ( n - 2 ) / ( threshold - 2 )
+    kept = np.empty( threshold, dtype=np.int64 )
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range( threshold - 2 ):
+        start = int( i * every ) + 1
+        end = int( ( i + 1 ) * every ) + 1
+        next_end = min( int( ( i + 2 ) * every ) + 1, n )
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs( ( x[a] - avg_x ) * ( y[start:end] - y[a] ) - ( x[a] - x[start:end] ) * ( avg_y - y[a] ) )
+        a = start + int( np.argmax( area ) )
+        kept[i + 1] = a
+    return kept
+
+def compact_series( x, y, max_points=None, log=False, markers=False ) -> dict:
+    """ Encodes the x and y arrays of a time series trace compactly. Evenly spaced dates are replaced by a start (x0)
+    and a step (dx), other dates are sent as milliseconds since the epoch, both of which require the x-axis to be of
+    type "date". Values are sent as integers if they all are, or rounded to SIGNIFICANT_DIGITS. Line traces can
+    additionally be decimated with lttb().
+    Parameters
+    ----------
+    x : pandas.Series or pandas.Index
+        dates.
+    y : pandas.Series
+        values.
+    max_points : int
+        number of points to keep. Series with missing values, whose gaps would be lost, are never decimated.
+    log : bool
+        whether the values are shown on a log scale, in which case points are chosen based on the log of the values.
+    markers : bool
+        whether the trace only draws markers, in which case missing dates can be filled with empty values to keep the
+        dates evenly spaced.
+
+    Returns
+    -------
+    dict
+        x (or x0 and dx) and y, to be passed to the trace.
+    """
+    dates = pd.to_datetime( pd.Series( x ) )
+    present = dates.notna().to_numpy()
+    x = dates.to_numpy( dtype="datetime64[ms]" )[present].astype( np.int64 )
+    values = pd.Series( y ).to_numpy( dtype=float )[present]
+    ordered = len( x ) < 2 or np.all( np.diff( x ) > 0 )
+
+    if max_points and ordered and not np.isnan( values ).any():
+        shape = values
+        if log:
+            floor = values[values > 0].min() if ( values > 0 ).any() else 1
+            shape = np.log10( np.maximum( values, floor ) )
+        kept = lttb( x, shape, max_points )
+        x, values = x[kept], values[kept]
+
+    if not np.isnan( values ).any() and np.all( values == np.round( values ) ) and np.all( np.abs( values ) < 2**53 ):
+        values = values.astype( np.int64 )
+    else:
+        values = np.array( [float( f"{v:.{SIGNIFICANT_DIGITS}g}" ) for v in values] )
+
+    if ordered and len( x ) > 1:
+        step = np.diff( x ).min()
+        length = ( x[-1] - x[0] ) // step + 1
+        if np.all( ( x - x[0] ) % step == 0 ) and ( length == len( x ) or ( markers and length <= 2 * len( x ) ) ):
+            if length != len( x ):
+                filled = np.full( length, None, dtype=object )
+                filled[( x - x[0] ) // step] = values
+                values = filled
+            return { "x0" : int( x[0] ), "dx" : int( step ), "y" : values }
+    return { "x" : x, "y" : values }
+
+def plot_daily_cases_seqs( df, compact=True ):
     #df.to_csv( "/Users/natem/Downloads/temp_presentation/daily_cases.csv" )
+    def _series( column ):
+        if compact:
+            return compact_series( df["date"], df[column], markers=True )
+        return { "x" : df["date"], "y" : df[column] }
+
     fig = go.Figure()
-    fig.add_trace( go.Scattergl( x=df["date"], y=df["new_cases"],
+    fig.add_trace( go.Scattergl( **_series( "new_cases" ),
                                  mode='markers',
                                  name='Daily Cases',
                                  marker={ "color" : COLOR_DARK } ) )
-    fig.add_trace(go.Scattergl(x=df["date"], y=df["new_sequences"],
+    fig.add_trace(go.Scattergl(**_series( "new_sequences" ),
                                mode='markers',
                                name='Daily Sequences',
                                marker={ "color" : COLOR_LIGHT} ) )
@@ -86,18 +189,24 @@ def plot_daily_cases_seqs( df ):
     min_lim = np.floor( np.log10( 0.75 ) )
     max_lim = np.ceil( np.log10( df["new_cases"].max() ) )
     _add_date_formating( fig, minimum=pd.to_datetime( "2020-01-01" ), maximum=df["date"].max(), ytype="log", ylims=[min_lim, max_lim], ytitle="Number of cases", skip=6 )
+    fig.update_xaxes( type="date" )
 
     return fig
 
-def plot_cummulative_cases_seqs( df ):
+def plot_cummulative_cases_seqs( df, max_points=MAX_POINTS, compact=True ):
     #df.to_csv( "/Users/natem/Downloads/presentation/cum_cases.csv" )
+    def _series( column ):
+        if compact:
+            return compact_series( df["date"], df[column], max_points=max_points, log=True )
+        return { "x" : df["date"], "y" : df[column] }
+
     fig = go.Figure()
-    fig.add_trace( go.Scattergl( x=df["date"], y=df["cases"],
+    fig.add_trace( go.Scattergl( **_series( "cases" ),
                                mode='lines',
                                name='Reported',
                                hovertemplate='%{y:,.0f}',
                                line={ "color" : COLOR_DARK, "width" : 4 } ) )
-    fig.add_trace(go.Scattergl(x=df["date"], y=df["sequences"],
+    fig.add_trace(go.Scattergl(**_series( "sequences" ),
                                mode='lines',
                                name='Sequenced',
                                hovertemplate='%{y:,.0f}',
@@ -107,11 +216,12 @@ def plot_cummulative_cases_seqs( df ):
     max_lim = np.ceil( np.log10( df["cases"].max() ) )
     _add_date_formating( fig, minimum=pd.to_datetime( "2020-01-01" ), maximum=df["date"].max(), ytype="log",
                          ylims=[min_lim, max_lim], ytitle="Cummulative cases", skip=6 )
+    fig.update_xaxes( type="date" )
 
     return fig
 
 def plot_cummulative_sampling_fraction( df ):
-    df["epiweek"] = df["date"].apply( lambda x: Week.fromdate(x).startdate() )
+    df["epiweek"] = epiweek_start( df["date"] )
     plot_df = df.groupby( "epiweek" ).agg( new_cases = ("new_cases", "sum"), new_sequences = ("new_sequences", "sum" ) )
     plot_df = plot_df.loc[plot_df["new_sequences"]>0]
     plot_df["fraction"] = plot_df["new_sequences"] / plot_df["new_cases"]
@@ -143,9 +253,22 @@ def add_missing_to_color_scale( scale, color="white" ):
             return_list.append( [( 1 / len_scale ) * i, col] )
     return return_list
 
-def plot_lineages_time( df, lineage=None, scaleby="fraction" ):
-    plot_df = df.pivot_table( index="epiweek", columns="lineage", values="ID", aggfunc="count" )
-    plot_df = plot_df.fillna( 0 )
+def plot_lineages_time( counts, lineage=None, scaleby="fraction" ):
+    """ Plots the number of sequences per epiweek, optionally highlighting a single lineage.
+    Parameters
+    ----------
+    counts : pandas.DataFrame
+        output of LineageCube.counts(); number of sequences with epiweeks as index and lineages as columns.
+    lineage : str
+        lineage to highlight.
+    scaleby : str
+        whether to plot the number of sequences ("sequences") or the fraction of sequences ("fraction").
+
+    Returns
+    -------
+    plotly.graph_objects.Figure
+    """
+    plot_df = counts
 
     yaxis_label = "Sequences"
 
@@ -178,10 +301,9 @@ def plot_lineages_time( df, lineage=None, scaleby="fraction" ):
 
     return fig
 
-def plot_voc( df, scaleby="fraction", focus="VOC" ):
-    plot_df = df.pivot_table( index="epiweek", columns="lineage", values="state", aggfunc="count", fill_value=0 ).T
-    plot_df["VOC"] = plot_df.index.map( VOC )
-    plot_df.loc[plot_df["VOC"].isna(),"VOC"] = "Other"
+def plot_voc( counts, scaleby="fraction", focus="VOC" ):
+    plot_df = counts.T.copy()
+    plot_df["VOC"] = CLASSIFIER.classify_all( plot_df.index, other="Other", variants=CLASSIFIER.voc ).astype( object )
 
     if focus != "VOC":
         other_df = plot_df.loc[~plot_df["VOC"].str.startswith( focus )]
@@ -232,10 +354,9 @@ def plot_voc( df, scaleby="fraction", focus="VOC" ):
                            legend=dict( bgcolor="white" ) )
     return fig
 
-def plot_delta( df, scaleby="fraction" ):
-    plot_df = df.pivot_table( index="epiweek", columns="lineage", values="state", aggfunc="count", fill_value=0 ).T
-    plot_df["VOC"] = plot_df.index.map( VOC )
-    plot_df.loc[plot_df["VOC"].isna(),"VOC"] = "Other"
+def plot_delta( counts, scaleby="fraction" ):
+    plot_df = counts.T.copy()
+    plot_df["VOC"] = CLASSIFIER.classify_all( plot_df.index, other="Other", variants=CLASSIFIER.voc ).astype( object )
 
     other_df = plot_df.loc[~plot_df["VOC"].str.startswith( "Delta" )]
     other_df = other_df.drop( columns="VOC" ).sum()
@@ -274,15 +395,16 @@ def plot_delta( df, scaleby="fraction" ):
     return fig
 
 
-def plot_lineages( df ):
+def plot_lineages( counts ):
 
-    plot_df = df["lineage"].value_counts().reset_index()
+    totals = counts.sum().sort_values( ascending=False )
+    plot_df = pd.DataFrame( { "index" : totals.index, "lineage" : totals.values } )
 
     colors = list()
     for i in plot_df["index"]:
-        if i in sorted( VOI.keys() ):
+        if CLASSIFIER.is_voi( i ):
             colors.append( "#4977CE" )
-        elif i in sorted( VOC.keys() ):
+        elif CLASSIFIER.is_voc( i ):
             colors.append( "#925c37" )
         else:
             colors.append( COLOR_DARK )
@@ -357,8 +479,8 @@ def binom_conf_interval(k, n, confidence_level=0.95 ):
     return pd.Series( [lowerbound, upperbound] )
 
 def plot_sgtf( sgtf_data ):
-    plot_df = sgtf_data[0]
-    plot_df["week"] = plot_df["Date"].apply( lambda x: Week.fromdate( x ).startdate() )
+    plot_df = sgtf_data[0].copy()
+    plot_df["week"] = epiweek_start( plot_df["Date"] )
     plot_df = plot_df.groupby( "week" )[["sgtf_all", "sgtf_likely", "sgtf_unlikely", "total_positive"]].agg( sum )
     plot_df["percent"] = plot_df["sgtf_all"] / plot_df["total_positive"]
     plot_df[["lower", "upper"]] = plot_df.apply( lambda x: binom_conf_interval( x["sgtf_all"], x["total_positive"] ), axis=1 )
@@ -510,7 +632,7 @@ def plot_catchment_areas( sd_map ):
                                     itemsizing='constant' ) )
     return fig
 
-def plot_wastewater( ww, seqs, cases, scale="linear", source="PointLoma", seq_indicator=True ):
+def plot_wastewater( ww, seqs, cases, scale="linear", source="PointLoma", seq_indicator=True, max_points=MAX_POINTS, compact=True ):
     fig = make_subplots( specs=[[{"secondary_y" : True}]] )
 
     seqs_filter = seqs.loc[seqs["source"]==source]
@@ -532,18 +654,23 @@ def plot_wastewater( ww, seqs, cases, scale="linear", source="PointLoma", seq_in
     #                             visible=False,
     #                             showlegend=True,
     #                             marker={"color" : "#D55E00", "size" : 8 } ), secondary_y=True )
-    fig.add_trace( go.Scattergl( x=cases.dropna().index, y=cases.dropna()["reported_cases_rolling"]*100000,
+    def _series( x, y, lines=True ):
+        if compact:
+            return compact_series( x, y, max_points=max_points if lines else None, log=scale == "log", markers=not lines )
+        return { "x" : x, "y" : y }
+
+    fig.add_trace( go.Scattergl( **_series( cases.dropna().index, cases.dropna()["reported_cases_rolling"]*100000 ),
                                  name="Reported cases per 100,000",
                                  mode="lines",
                                  hovertemplate="%{y:,.0f}",
                                  showlegend=True,
                                  line={"color" : "#D55E00", "width" : 3 } ), secondary_y=True )
-    fig.add_trace( go.Scattergl( x=subset_ww["date"], y=subset_ww["gene_copies"],
+    fig.add_trace( go.Scattergl( **_series( subset_ww["date"], subset_ww["gene_copies"], lines=False ),
                                  name="Viral load in wastewater",
                                  mode="markers",
                                  hovertemplate="%{y:,.0f}",
                                  marker={"color" : "#56B4E9", "size" : 8 } ), secondary_y=False )
-    fig.add_trace( go.Scattergl( x=subset_ww["date"], y=subset_ww["gene_copies_rolling"],
+    fig.add_trace( go.Scattergl( **_series( subset_ww["date"], subset_ww["gene_copies_rolling"] ),
                                  showlegend=False,
                                  name="Viral load in wastewater",
                                  mode="lines",
@@ -556,7 +683,7 @@ def plot_wastewater( ww, seqs, cases, scale="linear", source="PointLoma", seq_in
 
     fig.update_yaxes( showgrid=True, title=f"<b>Mean viral gene copies / Liter</b>", tickfont=dict(color="#56B4E9"), title_font=dict(color="#56B4E9"), secondary_y=False, showline=False, ticks="", type=scale )
     fig.update_yaxes( showgrid=False, title=f"<b>Reported cases / 100,000</b>", tickfont=dict(color="#D55E00"), title_font=dict(color="#D55E00"), secondary_y=True, showline=False, ticks="", type=scale )
-    fig.update_xaxes( dtick="M1", tickformat="%b\n%Y", mirror=True, showline=False, ticks="", range=date_range )
+    fig.update_xaxes( type="date", dtick="M1", tickformat="%b\n%Y", mirror=True, showline=False, ticks="", range=date_range )
 
     if scale == "linear":
         ww_range = [-subset_ww["gene_copies"].max()*0.05, subset_ww["gene_copies"].max()*1.05]
@@ -579,34 +706,42 @@ def plot_wastewater( ww, seqs, cases, scale="linear", source="PointLoma", seq_in
 
     return fig
 
-def plot_monkeypox_concentration( mx_gene: pd.DataFrame, mx_cases: pd.DataFrame, scale: str = "linear", source: str = "PointLoma" ):
+def plot_monkeypox_concentration( mx_gene: pd.DataFrame, mx_cases: pd.DataFrame, scale: str = "linear", source: str = "PointLoma",
+                                  max_points: int = MAX_POINTS, compact: bool = True ):
     subset_ww = mx_gene.loc[mx_gene["source"] == source]
     date_range = get_date_limits( subset_ww["date"] )
 
     fig = make_subplots( specs=[[{"secondary_y" : True}]] )
 
+    def _series( x, y, lines=True ):
+        if compact:
+            return compact_series( x, y, max_points=max_points if lines else None, log=scale == "log", markers=not lines )
+        return { "x" : x, "y" : y }
+
+    below_detection = subset_ww.loc[subset_ww["copies"]==0]
+
     # Concentration plot
-    fig.add_trace( go.Scattergl( x=mx_cases["date"], y=mx_cases["cases_rolling"],
+    fig.add_trace( go.Scattergl( **_series( mx_cases["date"], mx_cases["cases_rolling"] ),
                                  name="Reported cases",
                                  mode="lines",
                                  hovertemplate="%{y:,.0f}",
                                  showlegend=True,
                                  legendgroup="b",
                                  line={"color" : "#D55E00", "width" : 3 } ), secondary_y=True )
-    fig.add_trace( go.Scattergl( x=subset_ww["date"], y=subset_ww["copies"],
+    fig.add_trace( go.Scattergl( **_series( subset_ww["date"], subset_ww["copies"], lines=False ),
                                  name="Viral load in wastewater",
                                  showlegend=False,
                                  mode="markers",
                                  hovertemplate="%{y:f}",
                                  marker={ "color": "#56B4E9", "size": 10 } ), secondary_y=False )
-    fig.add_trace( go.Scattergl( x=subset_ww["date"], y=subset_ww["copies_rolling"],
+    fig.add_trace( go.Scattergl( **_series( subset_ww["date"], subset_ww["copies_rolling"] ),
                                  showlegend=True,
                                  legendgroup="b",
                                  name="Viral load in wastewater",
                                  mode="lines",
                                  hoverinfo="skip",
                                  line={ "color": "#56B4E9", "width": 3 } ), secondary_y=False)
-    fig.add_trace( go.Scattergl( x=subset_ww.loc[subset_ww["copies"]==0, "date"], y=subset_ww.loc[subset_ww["copies"]==0, "copies"],
+    fig.add_trace( go.Scattergl( **_series( below_detection["date"], below_detection["copies"], lines=False ),
                                name="Below detection limit",
                                mode='markers',
                                hoverinfo="skip",
@@ -617,7 +752,7 @@ def plot_monkeypox_concentration( mx_gene: pd.DataFrame, mx_cases: pd.DataFrame,
                       title_font=dict( color="#3C5C94" ), secondary_y=False, showline=False, ticks="", type=scale, )
     fig.update_yaxes( showgrid=False, title=f"<b>Reported cases</b>", tickfont=dict( color="#D55E00" ),
                       title_font=dict( color="#D55E00" ), secondary_y=True, showline=False, ticks="", type=scale, range=(-0.9,13) )
-    fig.update_xaxes( dtick="1209600000", tickformat="%b\n%d", mirror=True, showline=False, ticks="", range=date_range)
+    fig.update_xaxes( type="date", dtick="1209600000", tickformat="%b\n%d", mirror=True, showline=False, ticks="", range=date_range)
 
     fig.update_layout( template="simple_white",
                        hovermode="x unified",
@@ -634,7 +769,7 @@ def plot_monkeypox_concentration( mx_gene: pd.DataFrame, mx_cases: pd.DataFrame,
 
     return fig
 
-def plot_wastewater_seqs( ww_data, seqs, cases, config, norm_type, source="PointLoma", smooth=True ) -> go.Figure:
+def plot_wastewater_seqs( ww_data, seqs, cases, config, norm_type, source="PointLoma", smooth=True, compact=True ) -> go.Figure:
     def hex_to_rgb( hex_color: str ) -> tuple:
         hex_color = hex_color.lstrip( "#" )
         if len( hex_color ) == 3:
@@ -693,13 +828,19 @@ def plot_wastewater_seqs( ww_data, seqs, cases, config, norm_type, source="Point
         plot_df = plot_df.set_index( "Date" )
         plot_df = plot_df.loc[:, plot_df.columns != norm].apply( lambda x : (x / 100) * plot_df[norm] )
 
+    # Stacked traces have to share their dates, so they are encoded compactly but never decimated.
+    def _series( y ):
+        if compact:
+            return compact_series( plot_df.index, y )
+        return { "x" : plot_df.index, "y" : y }
+
     fig = go.Figure()
 
     fill_pattern = go.scatter.Fillpattern( bgcolor=config["Recombinants"]["color"], fgcolor="white", shape="/", solidity=0.5 )
 
     fig.add_trace(
         go.Scatter(
-            x=plot_df.index, y=[0]*plot_df.shape[0],
+            **_series( [0]*plot_df.shape[0] ),
             hoverinfo="skip",
             showlegend=False,
             fillcolor="black",
@@ -710,7 +851,7 @@ def plot_wastewater_seqs( ww_data, seqs, cases, config, norm_type, source="Point
     for i in reversed( list( config.keys() ) ):
         fig.add_trace(
             go.Scatter(
-                x=plot_df.index, y=plot_df[i],
+                **_series( plot_df[i] ),
                 name=config[i]["name"],
                 hovertemplate=ht,
                 hoverinfo='x+y',
@@ -723,7 +864,7 @@ def plot_wastewater_seqs( ww_data, seqs, cases, config, norm_type, source="Point
         )
     fig.add_trace(
         go.Scatter(
-            x=plot_df.index, y=[0]*plot_df.shape[0],
+            **_series( [0]*plot_df.shape[0] ),
             hoverinfo="skip",
             showlegend=False,
             fillcolor="black",
@@ -733,7 +874,7 @@ def plot_wastewater_seqs( ww_data, seqs, cases, config, norm_type, source="Point
     )
     fig.update_yaxes( showgrid=True, title=yaxis_label, range=yrange, tickformat='.0f',
                       ticksuffix=ticksuffix, showline=True, ticks="", mirror=True, linewidth=2 ) # Twice as wide because fake lineages adds with the x-axis
-    fig.update_xaxes( dtick="M1", tickformat="%b\n%Y", mirror=True, showline=True, ticks="", showgrid=False, linewidth=1 )
+    fig.update_xaxes( type="date", dtick="M1", tickformat="%b\n%Y", mirror=True, showline=True, ticks="", showgrid=False, linewidth=1 )
     _add_date_formatting_minimum( fig )
     fig.update_layout( legend=dict( bgcolor="white" ) )
     fig.update_traces( mode="lines" )
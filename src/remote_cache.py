@@ -0,0 +1,288 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import weakref
+from functools import wraps
+
+import requests
+
+from src.fetch import map_concurrent
+
+DEFAULT_TTL = 15 * 60
+DEFAULT_TIMEOUT = 10
+DEFAULT_CACHE_DIR = "resources/cache"
+
+
+class RemoteEntry:
+    """ In-memory copy of a single remote file along with the validators needed to revalidate it.
+    """
+    def __init__( self, url: str, content: bytes = None, etag: str = None, last_modified: str = None, fetched_at: float = 0.0 ):
+        self.url = url
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.version = hashlib.sha1( content ).hexdigest() if content is not None else None
+
+    def metadata( self ) -> dict:
+        return { "url" : self.url, "etag" : self.etag, "last_modified" : self.last_modified, "fetched_at" : self.fetched_at }
+
+
+class RemoteCache:
+    """ Keeps remote files (mostly CSVs on raw.githubusercontent.com) in memory so that callbacks never wait on the
+    network. Entries are revalidated with conditional requests (ETag/Last-Modified) once they are older than the TTL,
+    by a background thread. Every successful download is also written to disk, which is used when the remote can't be
+    reached, including on a cold start.
+
+    The background thread is only started by start(), which should be called from the processes serving requests. With
+    preload_app, the app is imported in the gunicorn master, and a thread running there could hold the lock at the moment
+    a worker is forked. The lock and session are recreated in forked children regardless.
+
+    Parameters
+    ----------
+    ttl : float
+        Number of seconds before an entry is revalidated.
+    cache_dir : str
+        Directory holding the on-disk copies. Set to None to disable.
+    timeout : float
+        Timeout in seconds for each request.
+    background : bool
+        Whether start() runs the background thread. When False, refresh() must be called explicitly.
+    max_workers : int
+        Maximum number of files downloaded or revalidated at the same time.
+    """
+
+    def __init__( self, ttl: float = DEFAULT_TTL, cache_dir: str = DEFAULT_CACHE_DIR, timeout: float = DEFAULT_TIMEOUT, background: bool = True,
+                  max_workers: int = 8 ):
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.background = background
+        self.max_workers = max_workers
+
+        self.urls = list()
+        self._entries = dict()
+        self._fallbacks = dict()
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._session_pid = os.getpid()
+
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+        if hasattr( os, "register_at_fork" ):
+            after_fork = weakref.WeakMethod( self._after_fork )
+            os.register_at_fork( after_in_child=lambda: after_fork() and after_fork()() )
+
+    def _after_fork( self ):
+        # Locks held by threads of the parent at the time of the fork stay locked forever in the child, and pooled
+        # connections can't be shared with the parent.
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._session_pid = os.getpid()
+
+    def register( self, url: str, fallback: str = None ):
+        """ Declares a remote file, optionally with a local copy to use if it can't be downloaded or found on disk.
+        Registered files make up combined_version().
+        """
+        if url not in self.urls:
+            self.urls.append( url )
+        if fallback is not None:
+            self._fallbacks[url] = fallback
+
+    def _disk_path( self, url: str ) -> str:
+        return os.path.join( self.cache_dir, hashlib.sha1( url.encode() ).hexdigest() )
+
+    def _write_disk( self, entry: RemoteEntry, metadata_only: bool = False ):
+        """ Writes the content and metadata of entry to disk. A revalidated entry only needs its metadata updated.
+        """
+        if self.cache_dir is None:
+            return
+        os.makedirs( self.cache_dir, exist_ok=True )
+        path = self._disk_path( entry.url )
+        files = [(".json", json.dumps( entry.metadata() ).encode())]
+        if not metadata_only:
+            files.insert( 0, (".data", entry.content) )
+        for suffix, data in files:
+            temp = f"{path}{suffix}.{os.getpid()}.tmp"
+            with open( temp, "wb" ) as f:
+                f.write( data )
+            os.replace( temp, path + suffix )
+
+    def _read_disk( self, url: str ):
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path( url )
+        try:
+            with open( path + ".data", "rb" ) as f:
+                content = f.read()
+            with open( path + ".json", "r" ) as f:
+                metadata = json.load( f )
+        except (OSError, ValueError):
+            return None
+        return RemoteEntry( url, content, metadata.get( "etag" ), metadata.get( "last_modified" ), metadata.get( "fetched_at", 0.0 ) )
+
+    def _read_fallback( self, url: str ):
+        if url not in self._fallbacks:
+            return None
+        with open( self._fallbacks[url], "rb" ) as f:
+            return RemoteEntry( url, f.read() )
+
+    def _get_session( self ) -> requests.Session:
+        # Pooled connections can't be shared with the parent after a fork (e.g. gunicorn workers with preload_app), on
+        # platforms without os.register_at_fork.
+        if self._session_pid != os.getpid():
+            self._session = requests.Session()
+            self._session_pid = os.getpid()
+        return self._session
+
+    def refresh( self, url: str ) -> bool:
+        """ Revalidates a single entry against the remote.
+
+        Returns
+        -------
+        bool
+            True if the content of the entry changed.
+        """
+        current = self._entries.get( url )
+        headers = dict()
+        if current is not None and current.content is not None:
+            if current.etag:
+                headers["If-None-Match"] = current.etag
+            if current.last_modified:
+                headers["If-Modified-Since"] = current.last_modified
+
+        try:
+            response = self._get_session().get( url, headers=headers, timeout=self.timeout )
+        except requests.RequestException as err:
+            print( f"Unable to refresh {url}: {err}" )
+            return False
+
+        if response.status_code == 304 and current is not None:
+            current.fetched_at = time.time()
+            self._write_disk( current, metadata_only=True )
+            return False
+        if response.status_code != 200:
+            print( f"Unable to refresh {url}: status code {response.status_code}" )
+            return False
+
+        entry = RemoteEntry( url, response.content, response.headers.get( "ETag" ),
+                             response.headers.get( "Last-Modified" ), time.time() )
+        changed = current is None or current.version != entry.version
+        with self._lock:
+            self._entries[url] = entry
+        self._write_disk( entry )
+        return changed
+
+    def refresh_stale( self ):
+        """ Revalidates every entry older than the TTL, concurrently.
+        """
+        now = time.time()
+        stale = [url for url, entry in list( self._entries.items() ) if now - entry.fetched_at >= self.ttl]
+        map_concurrent( self.refresh, stale, max_workers=self.max_workers )
+
+    def prefetch( self, urls ):
+        """ Loads every file not yet in memory, concurrently, so that a loader reading several files doesn't download
+        them one after another.
+        """
+        missing = [url for url in dict.fromkeys( urls ) if url not in self._entries]
+        map_concurrent( self._load, missing, max_workers=self.max_workers )
+
+    def _load( self, url: str ) -> RemoteEntry:
+        """ Used the first time an entry is requested. Prefers the on-disk copy, only falling back to a blocking
+        download when there is none.
+        """
+        with self._lock:
+            if url in self._entries:
+                return self._entries[url]
+            entry = self._read_disk( url )
+            if entry is not None:
+                self._entries[url] = entry
+                return entry
+
+        self.refresh( url )
+        if url not in self._entries:
+            entry = self._read_fallback( url )
+            if entry is None:
+                raise RuntimeError( f"Unable to download {url} and no local copy is available." )
+            print( f"Unable to download {url}. Defaulting to local, potentially out-of-date copy." )
+            with self._lock:
+                self._entries[url] = entry
+        return self._entries[url]
+
+    def get( self, url: str ) -> bytes:
+        """ Returns the content of a remote file from memory.
+        """
+        return self._load( url ).content
+
+    def open( self, url: str ) -> io.BytesIO:
+        """ File-like access to the content of a remote file, suitable for pandas.read_csv() or yaml.load().
+        """
+        return io.BytesIO( self.get( url ) )
+
+    def version( self, url: str ) -> str:
+        """ Content hash of a remote file. Changes whenever a refresh downloads different content.
+        """
+        return self._load( url ).version
+
+    def combined_version( self ) -> str:
+        """ Content hash of every registered file, loading the ones not yet in memory. Only depends on the content of the
+        files, so every process holding the same content reports the same version, whichever files it has used so far.
+        """
+        self.prefetch( self.urls )
+        versions = sorted( (url, self.version( url ) or "") for url in self.urls )
+        return hashlib.sha1( json.dumps( versions ).encode() ).hexdigest()
+
+    def start( self, interval: float = None ):
+        """ Loads every registered file, then starts the background refresh thread, if it isn't running in this process.
+        Safe to call repeatedly, and after a fork, which doesn't carry threads over. Does nothing unless background is set.
+        """
+        if not self.background:
+            return
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        interval = interval if interval is not None else min( self.ttl, 60 )
+
+        # Files are loaded before the first request is served, so that no callback waits on a download. A file that
+        # can't be loaded is left to the loader reading it, which reports the error.
+        try:
+            self.prefetch( self.urls )
+        except RuntimeError as err:
+            print( err )
+
+        def _run():
+            while not self._stop.wait( interval ):
+                self.refresh_stale()
+
+        self._stop.clear()
+        self._thread_pid = os.getpid()
+        self._thread = threading.Thread( target=_run, name="remote-cache-refresh", daemon=True )
+        self._thread.start()
+
+    def stop( self ):
+        self._stop.set()
+
+    def memoize( self, *urls: str ):
+        """ Decorator caching the result of a loader which parses the given remote files, which are registered. The result
+        is recomputed only when the content of one of the files changes, so callers must treat it as read-only.
+        """
+        for url in urls:
+            self.register( url )
+
+        def decorator( func ):
+            results = dict()
+
+            @wraps( func )
+            def wrapper( *args, **kwargs ):
+                self.prefetch( urls )
+                key = (tuple( self.version( url ) for url in urls ), args, tuple( sorted( kwargs.items() ) ))
+                if key not in results:
+                    results.clear()
+                    results[key] = func( *args, **kwargs )
+                return results[key]
+            return wrapper
+        return decorator
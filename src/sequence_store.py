@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from src.variants import CLASSIFIER
+
+# Values offered by the recency dropdown on the main page. Masks for these are built up front, anything else is
+# computed on request.
+RECENCY_BUCKETS = [7, 30, 183, 365]
+
+INDEXED_COLUMNS = ["state", "provider", "sequencer", "zipcode"]
+
+
+class SequenceStore:
+    """ Read-only, pre-indexed view of the sequence metadata returned by load_sequences(). Each indexed column is
+    categorical-encoded and every category gets a packed bitmap of the rows containing it, so a filter combination is
+    answered by AND-ing a handful of bitmaps rather than copying and scanning the full DataFrame.
+
+    Parameters
+    ----------
+    sequences : pandas.DataFrame
+        output of load_sequences(); list of sequences attached to ZIP code and collection date.
+    classifier : src.variants.LineageClassifier
+        used to classify the lineage of each sequence once, into self.voc_codes.
+    """
+
+    def __init__( self, sequences: pd.DataFrame, classifier=CLASSIFIER ):
+        # reset_index() copies every column, which would move the columns of a memory-mapped snapshot into private memory.
+        if not sequences.index.equals( pd.RangeIndex( len( sequences ) ) ):
+            sequences = sequences.reset_index( drop=True )
+        self.sequences = sequences
+        self.size = len( self.sequences )
+
+        # Position in classifier.variants of the variant of concern of each sequence, or -1.
+        self.voc_codes = classifier.codes( self.sequences["lineage"], variants=classifier.voc )
+
+        self.codes = dict()
+        self.categories = dict()
+        self._bitmaps = dict()
+        for column in INDEXED_COLUMNS:
+            codes, categories = pd.factorize( self.sequences[column], sort=True )
+            self.codes[column] = codes
+            self.categories[column] = categories
+            self._bitmaps[column] = { value : self._pack( codes == i ) for i, value in enumerate( categories ) }
+
+        self._days_past = self.sequences["days_past"].to_numpy()
+        self._recency = { window : self._pack( self._days_past <= window ) for window in RECENCY_BUCKETS }
+
+        self._all = self._pack( np.ones( self.size, dtype=bool ) )
+        self._none = self._pack( np.zeros( self.size, dtype=bool ) )
+
+        # Selections that only restrict by state are by far the most common, so keep them around.
+        self._state_frames = { state : self.sequences.take( self._unpack( bitmap ) )
+                               for state, bitmap in self._bitmaps["state"].items() }
+
+    def __len__( self ):
+        return self.size
+
+    @staticmethod
+    def _pack( mask: np.ndarray ) -> np.ndarray:
+        return np.packbits( mask )
+
+    def _unpack( self, bitmap: np.ndarray ) -> np.ndarray:
+        return np.flatnonzero( np.unpackbits( bitmap, count=self.size ) )
+
+    def _value_bitmap( self, column: str, value ):
+        if isinstance( value, (list, tuple, set) ):
+            bitmap = self._none
+            for entry in value:
+                bitmap = bitmap | self._value_bitmap( column, entry )
+            return bitmap
+        return self._bitmaps[column].get( value, self._none )
+
+    def value_codes( self, column: str, value ) -> np.ndarray:
+        """ Category codes of value (or each entry of a list of values) in an indexed column. Unknown values map to -1.
+        """
+        if not isinstance( value, (list, tuple, set) ):
+            value = [value]
+        return self.categories[column].get_indexer( list( value ) )
+
+    def _window_bitmap( self, window: int ):
+        if window in self._recency:
+            return self._recency[window]
+        return self._pack( self._days_past <= window )
+
+    def bitmap( self, state=None, window=None, provider=None, sequencer=None, zip_f=None ) -> np.ndarray:
+        """ Intersects the bitmaps of each requested filter. Filters that are None or empty are ignored.
+
+        Returns
+        -------
+        numpy.ndarray
+            packed bitmap of the rows matching every filter.
+        """
+        bitmap = self._all
+        if state:
+            bitmap = bitmap & self._value_bitmap( "state", state )
+        if window:
+            bitmap = bitmap & self._window_bitmap( window )
+        if provider:
+            bitmap = bitmap & self._value_bitmap( "provider", provider )
+        if sequencer:
+            bitmap = bitmap & self._value_bitmap( "sequencer", sequencer )
+        if zip_f:
+            bitmap = bitmap & self._value_bitmap( "zipcode", zip_f )
+        return bitmap
+
+    def indices( self, state=None, window=None, provider=None, sequencer=None, zip_f=None ) -> np.ndarray:
+        """ Row positions in self.sequences matching the requested filters.
+        """
+        return self._unpack( self.bitmap( state, window, provider, sequencer, zip_f ) )
+
+    def select( self, state=None, window=None, provider=None, sequencer=None, zip_f=None ) -> pd.DataFrame:
+        """ Returns the sequences matching the requested filters. Only the matching rows are materialized; the full
+        DataFrame is never copied.
+
+        Returns
+        -------
+        pandas.DataFrame
+            subset of self.sequences. Should be treated as read-only.
+        """
+        if not any( [window, provider, sequencer, zip_f] ) and state in self._state_frames:
+            return self._state_frames[state]
+        return self.sequences.take( self.indices( state, window, provider, sequencer, zip_f ) )
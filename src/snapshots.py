@@ -0,0 +1,164 @@
+## snapshots.py handles the typed, columnar copies of the datasets loaded by the dashboard. The update scripts write
+## them next to the CSVs and the loaders prefer them, skipping the CSV parsing and per-row cleanup on every start.
+## Snapshots are written as a single record batch, so numeric, date and categorical columns are read as numpy arrays
+## pointing into the memory-mapped file. Those pages belong to the page cache and are shared by every process reading the
+## same snapshot, including workers which reload the datasets on their own. Text columns are still copied into each
+## process as Python strings.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+SEQUENCES_CSV = "resources/sequences.csv"
+SEQUENCES_SNAPSHOT = "resources/sequences.arrow"
+CASES_CSV = "resources/new_cases.csv"
+CASES_SNAPSHOT = "resources/new_cases.arrow"
+
+SEQUENCES_CATEGORIES = ["zipcode", "sequencer", "provider", "lineage", "state"]
+CASES_CATEGORIES = ["ziptext", "catchment"]
+
+
+def _normalize_dates( column: pd.Series ) -> pd.Series:
+    return pd.to_datetime( column ).dt.tz_localize( None ).dt.normalize()
+
+
+def format_sequences( sequences: pd.DataFrame ) -> pd.DataFrame:
+    """ Converts the sequences as read from resources/sequences.csv to the types used by the dashboard.
+    Parameters
+    ----------
+    sequences : pandas.DataFrame
+        raw content of resources/sequences.csv
+
+    Returns
+    -------
+    pandas.DataFrame
+        sequences with normalized dates, ZIP codes formatted as text and categorical metadata columns.
+    """
+    sequences = sequences.copy()
+    sequences["collection_date"] = _normalize_dates( sequences["collection_date"] )
+    sequences["epiweek"] = _normalize_dates( sequences["epiweek"] )
+
+    zipcode = sequences["zipcode"].astype( str ).str.split( ":" ).str[0]
+    zipcode = zipcode.replace( r'^\s*$', np.nan, regex=True ).astype( float ).round()
+    sequences["zipcode"] = zipcode.astype( "Int64" ).astype( str ).replace( "<NA>", "nan" )
+
+    for column in SEQUENCES_CATEGORIES:
+        sequences[column] = sequences[column].astype( "category" )
+    return sequences
+
+
+def format_cases( cases: pd.DataFrame ) -> pd.DataFrame:
+    """ Converts the cases as read from resources/new_cases.csv to the types used by the dashboard.
+    Parameters
+    ----------
+    cases : pandas.DataFrame
+        raw content of resources/new_cases.csv
+
+    Returns
+    -------
+    pandas.DataFrame
+        cases with normalized dates and categorical ZIP code and catchment columns.
+    """
+    cases = cases.copy()
+    cases["updatedate"] = _normalize_dates( cases["updatedate"] )
+    for column in CASES_CATEGORIES:
+        if column in cases.columns:
+            cases[column] = cases[column].astype( "category" )
+    return cases
+
+
+def _file_hash( path: str ) -> bytes:
+    with open( path, "rb" ) as f:
+        return hashlib.sha1( f.read() ).hexdigest().encode()
+
+
+def _source_record( path: str ) -> str:
+    return f"{path}.source.json"
+
+
+def _source_hash( source: str, record: str ) -> bytes:
+    """ Hash of source, reusing the one stored in record if the size and modification time of source haven't changed
+    since, so that a cold start doesn't have to read the whole CSV. The record is rewritten whenever source is hashed.
+    """
+    stat = os.stat( source )
+    try:
+        with open( record, "r" ) as f:
+            stored = json.load( f )
+        if stored["size"] == stat.st_size and stored["mtime_ns"] == stat.st_mtime_ns:
+            return stored["sha1"].encode()
+    except (OSError, ValueError, KeyError):
+        pass
+
+    sha1 = _file_hash( source )
+    temp = f"{record}.{os.getpid()}.tmp"
+    try:
+        with open( temp, "w" ) as f:
+            json.dump( { "size" : stat.st_size, "mtime_ns" : stat.st_mtime_ns, "sha1" : sha1.decode() }, f )
+        os.replace( temp, record )
+    except OSError:
+        pass
+    return sha1
+
+
+def write_snapshot( df: pd.DataFrame, path: str, source: str = None ):
+    """ Writes an uncompressed Arrow IPC (Feather v2) file holding a single record batch, which can be memory-mapped and
+    read without copying. Skipped when pyarrow isn't installed.
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        dataset to write.
+    path : str
+        location of the snapshot.
+    source : str
+        location of the CSV the snapshot was made from. Its size and hash are stored so stale snapshots can be detected.
+    """
+    if pa is None:
+        print( f"pyarrow is not installed. Unable to write {path}." )
+        return
+    table = pa.Table.from_pandas( df.reset_index( drop=True ), preserve_index=False ).combine_chunks()
+    if source is not None:
+        metadata = { b"source_sha1" : _source_hash( source, _source_record( path ) ),
+                     b"source_size" : str( os.path.getsize( source ) ).encode() }
+        table = table.replace_schema_metadata( { **table.schema.metadata, **metadata } )
+    temp = f"{path}.tmp"
+    # Columns split over several batches would have to be concatenated, and therefore copied, when read.
+    feather.write_feather( table, temp, compression="uncompressed", chunksize=max( len( table ), 1 ) )
+    os.replace( temp, path )
+
+
+def read_snapshot( path: str, source: str = None ):
+    """ Reads a snapshot written by write_snapshot(), memory-mapping the file. Columns other than text point into the
+    mapping, so the returned DataFrame must be treated as read-only.
+    Parameters
+    ----------
+    path : str
+        location of the snapshot.
+    source : str
+        location of the CSV the snapshot was made from. If the CSV has changed since, the snapshot is considered stale.
+        A change in size is enough, otherwise the CSV is hashed, unless it hasn't been modified since it was last hashed.
+
+    Returns
+    -------
+    pandas.DataFrame or None
+        None if pyarrow isn't installed or the snapshot is missing or stale, in which case the CSV should be used.
+    """
+    if pa is None or not os.path.exists( path ):
+        return None
+    table = feather.read_table( path, memory_map=True )
+    if source is not None and os.path.exists( source ):
+        metadata = table.schema.metadata or dict()
+        if b"source_size" in metadata and metadata[b"source_size"] != str( os.path.getsize( source ) ).encode():
+            return None
+        if metadata.get( b"source_sha1" ) != _source_hash( source, _source_record( path ) ):
+            return None
+    # split_blocks keeps each column in its own block, rather than consolidating columns of the same type into a copy.
+    return table.to_pandas( split_blocks=True, self_destruct=True )
@@ -1,9 +1,115 @@
 ## variants.py holds all the required variants of interest and concern
 ## so that they can be easily accessed by other modules.
 
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ALIAS_KEY = "resources/alias_key.json"
+ALIAS_KEY_URL = "https://raw.githubusercontent.com/cov-lineages/pango-designation/master/pango_designation/alias_key.json"
+
 def _load_variant_list_from_file( loc ):
     with open( loc, "r" ) as i:
         return { k : v for k, v in map( lambda x: x.strip().split( ",", 1 ), i )}
 
+def load_aliases( loc=ALIAS_KEY ):
+    """ Loads the PANGO alias key, mapping each alias to the full name of the lineage it stands for. Recombinant
+    lineages, which have no single parent, map to themselves. Returns an empty dict if the file is missing, in which case
+    lineages are only matched under the alias they were listed with.
+    """
+    if not os.path.exists( loc ):
+        return dict()
+    with open( loc, "r" ) as f:
+        key = json.load( f )
+    return { alias : alias if type( full ) is list or full == "" else full for alias, full in key.items() }
+
+
+class LineageClassifier:
+    """ Assigns lineages to the variant of concern or interest they descend from. Listed lineages are stored in a trie
+    keyed on the levels of their unaliased names, so a lineage is classified by walking down its own name and keeping
+    the deepest listed ancestor. Sublineages designated after the lists were last updated are therefore classified as
+    well. Results are memoized per lineage.
+
+    Parameters
+    ----------
+    voc : dict
+        variant of concern of each listed lineage.
+    voi : dict
+        variant of interest of each listed lineage.
+    aliases : dict
+        output of load_aliases().
+    """
+
+    def __init__( self, voc: dict, voi: dict = None, aliases: dict = None ):
+        self.aliases = aliases if aliases is not None else dict()
+        self.voc = set( voc.values() )
+        self.voi = set( ( voi or dict() ).values() ) - self.voc
+        self.variants = pd.Index( sorted( self.voc | self.voi ) )
+
+        self._trie = dict()
+        for variants in [voi or dict(), voc]:
+            for lineage, variant in variants.items():
+                node = self._trie
+                for level in self.uncompress( lineage ).split( "." ):
+                    node = node.setdefault( level, dict() )
+                node[None] = variant
+        self._memo = dict()
+
+    def uncompress( self, lineage: str ) -> str:
+        """ Full name of a lineage, e.g. BA.2.12.1 -> B.1.1.529.2.12.1.
+        """
+        alias, _, rest = lineage.partition( "." )
+        full = self.aliases.get( alias, alias )
+        return f"{full}.{rest}" if rest else full
+
+    def classify( self, lineage ):
+        """ Variant a lineage belongs to, or None.
+        """
+        if lineage in self._memo:
+            return self._memo[lineage]
+        variant = None
+        if isinstance( lineage, str ):
+            node = self._trie
+            for level in self.uncompress( lineage ).split( "." ):
+                node = node.get( level )
+                if node is None:
+                    break
+                variant = node.get( None, variant )
+        self._memo[lineage] = variant
+        return variant
+
+    def is_voc( self, lineage ) -> bool:
+        return self.classify( lineage ) in self.voc
+
+    def is_voi( self, lineage ) -> bool:
+        return self.classify( lineage ) in self.voi
+
+    def codes( self, lineages, variants=None ) -> np.ndarray:
+        """ Position in self.variants of the variant each lineage belongs to, or -1. Each distinct lineage is only
+        classified once, the result is expanded with a take. If variants is given, lineages belonging to any other
+        variant are set to -1 as well.
+        """
+        lineage_codes, categories = pd.factorize( lineages )
+        variant_codes = self.variants.get_indexer( [self.classify( lineage ) for lineage in categories] )
+        if variants is not None:
+            selected = np.append( self.variants.isin( list( variants ) ), False )
+            variant_codes = np.where( selected[variant_codes], variant_codes, -1 )
+        return np.append( variant_codes, -1 )[lineage_codes]
+
+    def classify_all( self, lineages, other=None, variants=None ) -> pd.Categorical:
+        """ Variant of each lineage as a Categorical. Lineages which don't belong to any variant, or to one of variants
+        if given, are set to other.
+        """
+        codes = self.codes( lineages, variants )
+        categories = self.variants
+        if other is not None:
+            categories = categories.append( pd.Index( [other] ) )
+            codes = np.where( codes < 0, len( self.variants ), codes )
+        return pd.Categorical.from_codes( codes, categories=categories )
+
+
 VOC = _load_variant_list_from_file( "resources/voc.txt" )
-VOI = _load_variant_list_from_file( "resources/voi.txt" )
\ No newline at end of file
+VOI = _load_variant_list_from_file( "resources/voi.txt" )
+CLASSIFIER = LineageClassifier( VOC, VOI, aliases=load_aliases() )
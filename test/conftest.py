@@ -0,0 +1,42 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class StandInHandler( BaseHTTPRequestHandler ):
+    """ Serves the files in server.files with ETags, answering conditional requests with a 304.
+    """
+    def do_GET( self ):
+        self.server.requests.append( self.path )
+        if self.path not in self.server.files:
+            self.send_response( 404 )
+            self.end_headers()
+            return
+        content = self.server.files[self.path]
+        etag = f'"{hash( content )}"'
+        if self.headers.get( "If-None-Match" ) == etag:
+            self.send_response( 304 )
+            self.end_headers()
+            return
+        self.send_response( 200 )
+        self.send_header( "ETag", etag )
+        self.send_header( "Content-Length", str( len( content ) ) )
+        self.end_headers()
+        self.wfile.write( content )
+
+    def log_message( self, *args ):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer( ("127.0.0.1", 0), StandInHandler )
+    httpd.files = { "/data.csv" : b"a,b\n1,2\n" }
+    httpd.requests = []
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread( target=httpd.serve_forever, daemon=True )
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
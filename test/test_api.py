@@ -0,0 +1,81 @@
+import gzip
+import io
+import json
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+from src.api import ResponseCache, register_api
+from src.dataset_manager import Dataset
+
+
+class StaticDatasets:
+    def __init__( self, dataset ):
+        self.dataset = dataset
+
+    def get( self ):
+        return self.dataset
+
+
+def api_client( cache: ResponseCache = None ):
+    growth_rates = pd.DataFrame( { "lineage" : [f"BA.{i}" for i in range( 100 )], "growth_rate" : [i / 100 for i in range( 100 )],
+                                   "last_date" : pd.Timestamp( "2022-01-02" ) } )
+    server = Flask( __name__ )
+    register_api( server, StaticDatasets( Dataset( None, None, None, growth_rates, "v1" ) ), cache )
+    return server.test_client()
+
+
+@pytest.fixture
+def client():
+    return api_client()
+
+
+def test_json_and_csv( client ):
+    response = client.get( "/api/v1/growth-rates" )
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    records = json.loads( response.data )
+    assert records[1] == { "lineage" : "BA.1", "growth_rate" : 0.01, "last_date" : "2022-01-02" }
+
+    response = client.get( "/api/v1/growth-rates?format=csv" )
+    assert response.mimetype == "text/csv"
+    assert pd.read_csv( io.BytesIO( response.data ) ).shape == (100, 3)
+
+
+def test_etag_revalidation( client ):
+    response = client.get( "/api/v1/growth-rates" )
+    etag = response.headers["ETag"]
+
+    revalidated = client.get( "/api/v1/growth-rates", headers={ "If-None-Match" : etag } )
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+
+    other_format = client.get( "/api/v1/growth-rates?format=csv", headers={ "If-None-Match" : etag } )
+    assert other_format.status_code == 200
+
+
+def test_gzip( client ):
+    plain = client.get( "/api/v1/growth-rates" )
+    compressed = client.get( "/api/v1/growth-rates", headers={ "Accept-Encoding" : "gzip, deflate" } )
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress( compressed.data ) == plain.data
+
+
+def test_invalid_parameters( client ):
+    response = client.get( "/api/v1/growth-rates?format=xml" )
+    assert response.status_code == 400
+    assert "format" in response.get_json()["error"]
+    assert client.get( "/api/v1/lineages?region=mars" ).status_code == 400
+
+
+def test_responses_are_bounded():
+    cache = ResponseCache( maxsize=2 )
+    client = api_client( cache )
+    plain = client.get( "/api/v1/growth-rates" ).data
+    client.get( "/api/v1/growth-rates", headers={ "Accept-Encoding" : "gzip" } )
+    assert len( cache ) == 2, "Each encoding should be cached separately."
+
+    client.get( "/api/v1/growth-rates?format=csv" )
+    assert len( cache ) == 2
+    assert client.get( "/api/v1/growth-rates" ).data == plain, "Evicted responses should be rebuilt."
@@ -0,0 +1,72 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.format_resources as format_data
+from src.case_matrix import CaseMatrix
+from src.sequence_store import SequenceStore
+
+ZIPS = ["91901", "91950", "92037", "92101", "None"]
+
+
+def get_cases( cases, state, window ):
+    """ The filters applied by get_cases() in callbacks.py.
+    """
+    if state == "Baja California":
+        new_cases = cases.loc[cases["ziptext"] == "None"]
+    else:
+        new_cases = cases.loc[cases["ziptext"] != "None"]
+    if window:
+        new_cases = cases.loc[cases["days_past"] <= window]
+    return new_cases
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng( 7 )
+    today = pd.Timestamp( "2022-03-01" )
+    rows = []
+    for zipcode in ZIPS:
+        dates = pd.date_range( "2021-09-01", "2022-02-28" )
+        dates = dates[rng.random( len( dates ) ) > 0.3]
+        counts = np.cumsum( rng.integers( 0, 20, size=len( dates ) ) )
+        for updatedate, count in zip( dates, counts ):
+            rows.append( { "ziptext" : zipcode, "case_count" : count, "updatedate" : updatedate,
+                           "days_past" : ( today - updatedate ).days } )
+    cases = pd.DataFrame( rows )
+    cases["ziptext"] = cases["ziptext"].astype( "category" )
+
+    n = 500
+    seqs = pd.DataFrame( { "ID" : [f"SEQ{i}" for i in range( n )],
+                           "collection_date" : pd.Timestamp( "2021-08-15" ) + pd.to_timedelta( rng.integers( 0, 200, n ), unit="D" ),
+                           "zipcode" : rng.choice( ZIPS[:-1], n ),
+                           "provider" : rng.choice( ["SEARCH", "Helix"], n ),
+                           "sequencer" : rng.choice( ["SEARCH", "Helix"], n ),
+                           "state" : rng.choice( ["San Diego", "Baja California"], n, p=[0.8, 0.2] ),
+                           "lineage" : rng.choice( ["BA.2", "BA.5.2.1", "B.1.617.2"], n ) } )
+    seqs["days_past"] = ( seqs["collection_date"].max() - seqs["collection_date"] ).dt.days
+    for column in ["zipcode", "provider", "sequencer", "state"]:
+        seqs[column] = seqs[column].astype( "category" )
+    return cases, SequenceStore( seqs )
+
+
+# Baja California has no cases in any ZIP code, which get_seqs_per_case() doesn't handle.
+FILTERS = [f for f in itertools.product( ["San Diego", "Baja California"], [None, 30, 183], [None, "Helix"], [None, "91950", ["92037", "92101"]] )
+           if not ( f[0] == "Baja California" and f[1] is None and f[3] )]
+
+
+@pytest.mark.parametrize( "state,window,provider,zip_f", FILTERS )
+def test_seqs_per_case( data, state, window, provider, zip_f ):
+    cases, store = data
+    expected = format_data.get_seqs_per_case( get_cases( cases, state, window ), store.select( state, window, provider ), zip_f=zip_f )
+    result = CaseMatrix( cases, store ).seqs_per_case( state, window, provider, None, zip_f )
+    pd.testing.assert_frame_equal( result, expected )
+
+
+@pytest.mark.parametrize( "state,window", list( itertools.product( ["San Diego", "Baja California"], [None, 30] ) ) )
+def test_cases_total( data, state, window ):
+    cases, store = data
+    expected = format_data.format_cases_total( get_cases( cases, state, window ) )[["ziptext", "case_count"]]
+    pd.testing.assert_frame_equal( CaseMatrix( cases, store ).cases_total( state, window ), expected )
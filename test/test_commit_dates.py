@@ -0,0 +1,126 @@
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from src.commit_dates import CommitDateService
+
+REF_URL = "https://api.github.com/repos/owner/repo/git/refs/heads/{branch}"
+COMMIT_URL = "https://api.github.com/repos/owner/repo/git/commits/{sha}"
+
+
+class StandInResponse:
+    def __init__( self, status_code: int, content=None, headers=None ):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or dict()
+
+    def json( self ):
+        return self.content
+
+    def raise_for_status( self ):
+        if self.status_code >= 400:
+            raise requests.HTTPError( f"status code {self.status_code}" )
+
+
+class StandInSession:
+    """ Serves references and commits with ETags, answering conditional requests with a 304. Set rate_limited to answer
+    every request with a 403 and an exhausted rate limit.
+    """
+    def __init__( self ):
+        self.refs = dict()
+        self.requests = list()
+        self.rate_limited = None
+
+    def get( self, url, headers=None, timeout=None ):
+        self.requests.append( (url, dict( headers or dict() )) )
+        if self.rate_limited is not None:
+            return StandInResponse( 403, headers={ "X-RateLimit-Remaining" : "0", "X-RateLimit-Reset" : str( self.rate_limited ) } )
+        if url.startswith( COMMIT_URL.format( sha="" ) ):
+            sha = url.rsplit( "/", 1 )[1]
+            content = { "author" : { "date" : f"2022-12-{int( sha ):02d}T10:00:00Z" } }
+        else:
+            content = { "object" : { "url" : COMMIT_URL.format( sha=self.refs[url] ) } }
+        etag = f'"{url}:{content}"'
+        if ( headers or dict() ).get( "If-None-Match" ) == etag:
+            return StandInResponse( 304 )
+        return StandInResponse( 200, content, { "ETag" : etag } )
+
+
+def service_with_session( **kwargs ):
+    service = CommitDateService( **kwargs )
+    service._session = StandInSession()
+    return service, service._session
+
+
+def test_etag_is_reused():
+    service, session = service_with_session()
+    url = REF_URL.format( branch="master" )
+    session.refs[url] = "1"
+    service.refresh( url )
+    assert service.get( url ) == datetime( 2022, 12, 1, 10, tzinfo=timezone.utc )
+
+    service.refresh( url )
+    assert "If-None-Match" in session.requests[2][1]
+    assert len( session.requests ) == 3, "The commit is immutable, so only the reference should be revalidated."
+    assert service.get( url ) == datetime( 2022, 12, 1, 10, tzinfo=timezone.utc )
+
+    session.refs[url] = "2"
+    service.refresh( url )
+    assert service.get( url ) == datetime( 2022, 12, 2, 10, tzinfo=timezone.utc )
+
+
+def test_stale_dates_are_refreshed( monkeypatch ):
+    service, session = service_with_session( ttl=60 )
+    url = REF_URL.format( branch="master" )
+    session.refs[url] = "1"
+    service.refresh( url )
+
+    scheduled = list()
+    monkeypatch.setattr( service, "refresh_async", scheduled.append )
+    assert service.get( url ) is not None
+    assert scheduled == []
+
+    date, _ = service._dates[url]
+    service._dates[url] = (date, time.time() - 61)
+    assert service.get( url ) == date, "Stale dates should still be returned while they are refreshed."
+    assert scheduled == [url]
+
+
+def test_rate_limit_pauses_refreshes( monkeypatch ):
+    service, session = service_with_session()
+    url = REF_URL.format( branch="master" )
+    session.rate_limited = time.time() + 3600
+    service.refresh( url )
+    assert service._blocked_until == session.rate_limited
+    assert service.get( url ) is None
+
+    started = list()
+    monkeypatch.setattr( "threading.Thread.start", lambda thread: started.append( thread ) )
+    service.refresh_async( url )
+    assert started == [] and url not in service._refreshing
+
+
+def test_caches_are_bounded():
+    service, session = service_with_session( maxsize=2 )
+    urls = [REF_URL.format( branch=f"branch{i}" ) for i in range( 5 )]
+    for i, url in enumerate( urls ):
+        session.refs[url] = str( i + 1 )
+        service.refresh( url )
+    assert len( service._responses ) == 2 and len( service._commit_dates ) == 2
+    assert list( service._commit_dates ) == [COMMIT_URL.format( sha="4" ), COMMIT_URL.format( sha="5" )]
+    assert all( service.get( url ) is not None for url in urls ), "Evicting responses shouldn't lose the dates."
+
+
+def test_start_prefetches_once_per_process( monkeypatch ):
+    service, session = service_with_session()
+    scheduled = list()
+    monkeypatch.setattr( service, "refresh_async", scheduled.append )
+    urls = [REF_URL.format( branch="master" )]
+    service.start( urls )
+    service.start( urls )
+    assert scheduled == urls
+
+    service._started_pid = -1
+    service.start( urls )
+    assert scheduled == urls * 2, "A forked process should prefetch again."
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.daily_cases import forward_window_max, interpolate_daily_cases
+
+
+def reference( df, start=None ):
+    """ The per-ZIP groupby-apply previously used by the update scripts.
+    """
+    def _add_missing_cases( entry ):
+        first = entry["updatedate"].min() if start is None else start
+        entry = entry.set_index( "updatedate" ).reindex( pd.date_range( first, entry["updatedate"].max() ) ).rename_axis( "updatedate" ).reset_index()
+        indexer = pd.api.indexers.FixedForwardWindowIndexer( window_size=7 )
+        entry["new_cases"] = entry.rolling( window=indexer, min_periods=1 )["new_cases"].apply( lambda x: x.max() / 7 )
+        return entry
+
+    result = df.groupby( "ziptext" ).apply( _add_missing_cases )
+    result = result.drop( columns="ziptext" ).reset_index()
+    return result.drop( columns="level_1" )
+
+
+@pytest.fixture
+def weekly_cases():
+    rng = np.random.default_rng( 42 )
+    rows = []
+    for zipcode in ["92037", "91950", "92101", "92154", "92110"]:
+        first = pd.Timestamp( "2021-06-29" ) + pd.Timedelta( days=int( rng.integers( 0, 10 ) ) )
+        dates = first + pd.to_timedelta( np.cumsum( rng.choice( [1, 3, 7, 7, 7, 14], size=30 ) ), unit="D" )
+        for updatedate in dates:
+            rows.append( { "ziptext" : zipcode, "case_count" : int( rng.integers( 0, 5000 ) ), "updatedate" : updatedate,
+                           "new_cases" : float( rng.integers( 0, 300 ) ) if rng.random() > 0.1 else np.nan,
+                           "population" : 30000 } )
+    return pd.DataFrame( rows )
+
+
+def test_matches_groupby_apply( weekly_cases ):
+    pd.testing.assert_frame_equal( interpolate_daily_cases( weekly_cases ), reference( weekly_cases ) )
+
+
+def test_matches_groupby_apply_with_common_start( weekly_cases ):
+    start = pd.Timestamp( "2021-06-30" )
+    pd.testing.assert_frame_equal( interpolate_daily_cases( weekly_cases, start=start ), reference( weekly_cases, start=start ) )
+
+
+def test_forward_window_max():
+    values = np.array( [1.0, np.nan, 3.0, np.nan, np.nan, np.nan, np.nan, np.nan, 2.0] )
+    expected = pd.Series( values ).rolling( window=pd.api.indexers.FixedForwardWindowIndexer( window_size=3 ), min_periods=1 ).max()
+    np.testing.assert_array_equal( forward_window_max( values, 3 ), expected.to_numpy() )
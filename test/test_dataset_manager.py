@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.signal import savgol_filter
+
+from src.dataset_manager import CATCHMENTS, Dataset, DatasetManager, load_catchment_cases
+
+
+def make_manager( path ):
+    loads = []
+
+    def loader( version ):
+        with open( path ) as f:
+            loads.append( f.read() )
+        return Dataset( loads[-1], None, None, None, version )
+
+    return DatasetManager( paths=[str( path )], loader=loader ), loads
+
+
+def touch( path, content, offset ):
+    path.write_text( content )
+    stat = os.stat( path )
+    os.utime( path, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset) )
+
+
+def test_swaps_in_new_version_once_settled( tmp_path ):
+    path = tmp_path / "sequences.csv"
+    path.write_text( "a" )
+    manager, loads = make_manager( path )
+    previous = manager.current
+
+    touch( path, "b", 10**9 )
+    assert not manager.check(), "A change should settle for a full interval before being loaded."
+    assert manager.check()
+    assert manager.current.sequences == "b"
+    assert manager.current.version != previous.version
+    assert previous.sequences == "a", "Requests holding the previous version should be unaffected."
+    assert not manager.check()
+    assert loads == ["a", "b"]
+
+
+def test_unchanged_content_is_not_reloaded( tmp_path ):
+    path = tmp_path / "sequences.csv"
+    path.write_text( "a" )
+    manager, loads = make_manager( path )
+
+    touch( path, "a", 10**9 )
+    manager.check()
+    assert not manager.check()
+    assert loads == ["a"]
+
+
+def test_failed_load_keeps_current_version( tmp_path, caplog ):
+    path = tmp_path / "sequences.csv"
+    path.write_text( "a" )
+    manager, loads = make_manager( path )
+    previous = manager.current
+
+    def failing_loader( version ):
+        raise ValueError( "truncated file" )
+
+    manager.loader = failing_loader
+    touch( path, "b", 10**9 )
+    manager.check()
+    assert not manager.check()
+    assert manager.current is previous
+    assert "truncated file" in caplog.text
+
+
+def baseline_catchment_cases( cases, source ):
+    """ The smoothing previously done by get_cases() in every wastewater callback.
+    """
+    new_cases = cases.loc[cases["catchment"] == source].groupby( "updatedate" ).agg(
+        reported_cases=("new_cases", sum),
+        population=("population", sum ) )
+    new_cases["reported_cases_rolling"] = savgol_filter( new_cases["reported_cases"], window_length=21, polyorder=2 )
+    new_cases.loc[new_cases["reported_cases_rolling"] < 0] = 0
+    new_cases["reported_cases_rolling"] = new_cases["reported_cases_rolling"] / new_cases["population"]
+    return new_cases
+
+
+def test_catchment_cases_match_baseline():
+    rng = np.random.default_rng( 3 )
+    dates = pd.date_range( "2022-06-01", periods=60 )
+    cases = pd.DataFrame( { "updatedate" : np.tile( dates, 3 ),
+                            "ziptext" : np.repeat( ["92037", "91950", "92101"], len( dates ) ),
+                            "catchment" : np.repeat( ["PointLoma", "SouthBay", "PointLoma"], len( dates ) ),
+                            "new_cases" : rng.poisson( 5, 3 * len( dates ) ).astype( float ),
+                            "population" : np.repeat( [45000, 60000, 30000], len( dates ) ) } )
+    # Encina has too few days to smooth, Other has no cases at all.
+    encina = pd.DataFrame( { "updatedate" : dates[:10], "ziptext" : "92008", "catchment" : "Encina", "new_cases" : 1.0, "population" : 1000 } )
+    cases = pd.concat( [cases, encina], ignore_index=True )
+    cases["catchment"] = cases["catchment"].astype( "category" )
+
+    catchment_cases = load_catchment_cases( cases )
+    for source in CATCHMENTS:
+        try:
+            expected = baseline_catchment_cases( cases, source )
+        except ValueError:
+            assert source not in catchment_cases
+            continue
+        pd.testing.assert_frame_equal( catchment_cases[source], expected )
+    assert set( catchment_cases ) == { "PointLoma", "SouthBay" }
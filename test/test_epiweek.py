@@ -0,0 +1,17 @@
+import pandas as pd
+from epiweeks import Week
+
+from src.epiweek import epiweek_start
+
+
+def test_matches_epiweeks_package():
+    dates = pd.Series( pd.date_range( "2019-12-01", "2026-01-31", freq="D" ) )
+    expected = dates.apply( lambda x: pd.Timestamp( Week.fromdate( x ).startdate() ) )
+    pd.testing.assert_series_equal( epiweek_start( dates ), expected )
+
+
+def test_accepts_strings_and_times():
+    dates = pd.Series( ["2021-01-02", "2021-01-03 13:45:00", "2022-12-31"], index=[4, 5, 6] )
+    assert epiweek_start( dates ).tolist() == [pd.Timestamp( "2020-12-27" ), pd.Timestamp( "2021-01-03" ), pd.Timestamp( "2022-12-25" )]
+    assert epiweek_start( dates ).index.tolist() == [4, 5, 6]
+    assert list( epiweek_start( pd.to_datetime( ["2021-01-09"] ) ) ) == [pd.Timestamp( "2021-01-03" )]
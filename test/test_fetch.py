@@ -0,0 +1,46 @@
+import threading
+
+import pytest
+
+from src import fetch
+from src.fetch import FetchError, fetch_all, fetch_first
+
+
+def test_fetch_all( server ):
+    server.files["/other.csv"] = b"c\n1\n"
+    urls = [f"{server.url}/data.csv", f"{server.url}/other.csv"]
+    assert fetch_all( urls, retries=0 ) == { urls[0] : b"a,b\n1,2\n", urls[1] : b"c\n1\n" }
+
+    with pytest.raises( FetchError ):
+        fetch_all( urls + [f"{server.url}/missing.csv"], retries=0 )
+
+
+def test_fetch_first_prefers_earlier_candidates( server ):
+    server.files["/older.csv"] = b"old\n"
+    candidates = [f"{server.url}/missing.csv", f"{server.url}/data.csv", f"{server.url}/older.csv"]
+    assert fetch_first( candidates, retries=0 ) == (candidates[1], b"a,b\n1,2\n")
+    assert server.requests.count( "/missing.csv" ) == 1, "A 404 shouldn't be retried."
+
+    with pytest.raises( FetchError ):
+        fetch_first( [f"{server.url}/missing.csv"], retries=0 )
+
+
+def test_fetch_first_closes_other_candidates( server, monkeypatch ):
+    server.files["/older.csv"] = b"old\n" * 1000
+    responses = dict()
+    stream = fetch.stream
+
+    def recording_stream( url, *args, **kwargs ):
+        responses[url] = stream( url, *args, **kwargs )
+        return responses[url]
+
+    monkeypatch.setattr( "src.fetch.stream", recording_stream )
+    candidates = [f"{server.url}/data.csv", f"{server.url}/older.csv"]
+    assert fetch_first( candidates, retries=0 ) == (candidates[0], b"a,b\n1,2\n")
+
+    for _ in range( 100 ):
+        if len( responses ) == 2 and responses[candidates[1]].raw.closed:
+            break
+        threading.Event().wait( 0.01 )
+    assert responses[candidates[1]].raw.closed
+    assert not responses[candidates[1]]._content_consumed, "The body of other candidates shouldn't be downloaded."
@@ -0,0 +1,32 @@
+from src.figure_cache import FigureCache
+
+
+def test_equivalent_inputs_share_an_entry( tmp_path ):
+    cache = FigureCache( cache_dir=str( tmp_path ) )
+    calls = []
+
+    @cache.memoize( "graph", lambda: "v1" )
+    def callback( url, provider, zip_f ):
+        calls.append( (url, provider, zip_f) )
+        return { "data" : [{ "x" : [1, 2], "y" : [3, 4] }] }
+
+    assert callback( "/", ["b", "a"], None ) == callback( "/", ["a", "b"], [] )
+    assert len( calls ) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_are_keyed_on_version_and_shared_through_disk( tmp_path ):
+    first = FigureCache( cache_dir=str( tmp_path ) )
+    first.put( FigureCache.key( "graph", "v1", "/" ), '{"data": []}' )
+
+    second = FigureCache( cache_dir=str( tmp_path ) )
+    assert second.get( FigureCache.key( "graph", "v1", "/" ) ) == '{"data": []}'
+    assert second.get( FigureCache.key( "graph", "v2", "/" ) ) is None
+
+
+def test_memory_is_bounded( tmp_path ):
+    cache = FigureCache( maxsize=2, cache_dir=None )
+    for i in range( 3 ):
+        cache.put( str( i ), "{}" )
+    assert cache.get( "0" ) is None
+    assert cache.get( "2" ) == "{}"
@@ -0,0 +1,57 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sm = pytest.importorskip( "statsmodels.api" )
+
+from src.growth_model import aggregate_counts, fit_growth_model, load_start_params
+
+
+@pytest.fixture
+def sequences():
+    rng = np.random.default_rng( 0 )
+    weeks = rng.choice( np.arange( 0, 56, 7.0 ), size=2000 )
+    odds = np.exp( np.column_stack( [np.zeros_like( weeks ), 0.05 * weeks - 1, -0.03 * weeks] ) )
+    lineages = ( rng.random( len( weeks ) )[:, None] > ( odds / odds.sum( axis=1, keepdims=True ) ).cumsum( axis=1 ) ).sum( axis=1 )
+    return pd.DataFrame( { "epiweek" : weeks, "collapsed_linege" : pd.Categorical.from_codes( lineages, categories=["Other", "B", "A"] ) } )
+
+
+def test_matches_unaggregated_fit( sequences, tmp_path ):
+    counts = aggregate_counts( sequences["epiweek"], sequences["collapsed_linege"] )
+    assert counts["count"].sum() == len( sequences ) and len( counts ) == 8 * 3
+
+    fit = fit_growth_model( sequences["epiweek"], sequences["collapsed_linege"] )
+    exog = sequences.assign( const=1 )[["epiweek", "const"]]
+    reference = sm.MNLogit( sequences["collapsed_linege"], exog ).fit_regularized( maxiter=1000, disp=0 )
+    assert list( fit.model._ynames_map.values() ) == ["Other", "B", "A"]
+    np.testing.assert_allclose( fit.params, reference.params, rtol=1e-4 )
+    np.testing.assert_allclose( fit.cov_params(), reference.cov_params(), rtol=1e-4 )
+
+    loc = tmp_path / "clinical.model"
+    with open( loc, "wb" ) as model_file:
+        pickle.dump( fit, model_file )
+    np.testing.assert_array_equal( load_start_params( loc, ["Other", "B", "A"], ["epiweek", "const"] ), np.asarray( fit.params ).ravel( order="F" ) )
+    assert load_start_params( loc, ["Other", "A", "B"], ["epiweek", "const"] ) is None
+    assert load_start_params( tmp_path / "missing.model", ["Other", "B", "A"], ["epiweek", "const"] ) is None
+
+    warm = fit_growth_model( sequences["epiweek"], sequences["collapsed_linege"], previous_model=loc )
+    np.testing.assert_allclose( warm.params, fit.params, rtol=1e-6 )
+
+
+def test_results_describe_unaggregated_data( sequences ):
+    fit = fit_growth_model( sequences["epiweek"], sequences["collapsed_linege"] )
+    exog = sequences.assign( const=1 )[["epiweek", "const"]]
+    reference = sm.MNLogit( sequences["collapsed_linege"], exog ).fit_regularized( maxiter=1000, disp=0 )
+
+    assert fit.nobs == reference.nobs == len( sequences )
+    assert fit.df_resid == reference.df_resid
+    for statistic in ["llf", "llnull", "bic", "prsquared"]:
+        assert np.isclose( getattr( fit, statistic ), getattr( reference, statistic ), rtol=1e-6 ), statistic
+
+    summary = fit.summary().tables[0].data
+    reference_summary = reference.summary().tables[0].data
+    # Everything but the model name, date and time.
+    assert [row[2:] for row in summary] == [row[2:] for row in reference_summary]
+    assert [row[:2] for row in summary][4:] == [row[:2] for row in reference_summary][4:]
@@ -0,0 +1,45 @@
+import types
+
+import numpy as np
+import pandas as pd
+
+from src.growth_predictions import design_matrix, predict_prevalence
+
+
+def softmax( exog, params ):
+    odds = np.exp( np.column_stack( [np.zeros( len( exog ) ), exog @ params] ) )
+    return odds / odds.sum( axis=1, keepdims=True )
+
+
+def stand_in_results( params, cov ):
+    """ The attributes of a fitted MNLogit read by predict_prevalence.
+    """
+    model = types.SimpleNamespace( _ynames_map={ 0 : "Other", 1 : "B", 2 : "A" } )
+    return types.SimpleNamespace( params=pd.DataFrame( params ), cov_params=lambda: pd.DataFrame( cov ),
+                                  predict=lambda exog: softmax( exog, params ), model=model )
+
+
+def test_predict_prevalence():
+    rng = np.random.default_rng( 0 )
+    params = np.array( [[0.05, -0.02], [-2.0, 1.0]] )
+    root = rng.normal( scale=0.01, size=(4, 4) )
+    cov = root @ root.T
+    weeks = [0.0, 7.0, 14.0]
+
+    prevalence = predict_prevalence( stand_in_results( params, cov ), weeks, delta=True )
+    assert list( prevalence["variant"] ) == ["A"] * 3 + ["B"] * 3
+    assert list( prevalence.index ) == weeks * 2
+
+    # Matches computing a single variant and week, where A is the second equation.
+    x = design_matrix( weeks )[1:2]
+    a = softmax( x, params )[0, 2]
+    se = np.sqrt( x[0] @ cov[2:, 2:] @ x[0] )
+    assert np.isclose( prevalence["prevalence"].iloc[1], a )
+    assert np.isclose( prevalence["upper"].iloc[1], 1 / ( 1 + np.exp( -np.log( a / ( 1 - a ) ) - 1.96 * se ) ) )
+
+    # Delta method standard errors match the gradient computed by finite differences.
+    flat = params.T.ravel()
+    step = 1e-6
+    gradient = np.array( [( softmax( x, ( flat + h ).reshape( 2, 2 ).T )[0, 2] - softmax( x, ( flat - h ).reshape( 2, 2 ).T )[0, 2] ) / ( 2 * step )
+                          for h in np.eye( 4 ) * step] )
+    assert np.isclose( prevalence["delta_upper"].iloc[1], a + 1.96 * np.sqrt( gradient @ cov @ gradient ), rtol=1e-5 )
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip( "statsmodels" )
+
+from src.growth_scan import fit_window, scan_growth_rates
+from src.lineage_collapse import LineageCollapser
+
+
+class StandInAliasor:
+    def uncompress( self, lineage ):
+        return lineage
+
+    def partial_compress( self, lineage, accepted_aliases ):
+        return lineage
+
+
+@pytest.fixture
+def sequences():
+    rng = np.random.default_rng( 0 )
+    lineages = np.array( ["BA.5.2", "BQ.1.1", "BQ.1.1.3", "XBB.1.5"] )
+    epiweeks = pd.date_range( "2022-10-02", periods=6, freq="7D" )
+    regions = list()
+    for state, n in [("San Diego", 1500), ("Baja California", 400)]:
+        weeks = rng.integers( 0, len( epiweeks ), n )
+        odds = np.exp( np.outer( weeks, [-0.3, 0, 0.05, 0.3] ) )
+        lineage = ( rng.random( n )[:, None] > ( odds / odds.sum( axis=1, keepdims=True ) ).cumsum( axis=1 ) ).sum( axis=1 )
+        regions.append( pd.DataFrame( { "epiweek" : epiweeks[weeks], "lineage" : lineages[np.minimum( lineage, 3 )], "state" : state } ) )
+    return pd.concat( regions, ignore_index=True )
+
+
+def test_scan_is_deterministic( sequences ):
+    def scan( **kwargs ):
+        return scan_growth_rates( sequences, LineageCollapser( StandInAliasor() ), ["XBB.1.5"], windows=[4, 8], replicates=5, **kwargs )
+
+    serial = scan( max_workers=1 )
+    pd.testing.assert_frame_equal( serial, scan( max_workers=2 ) )
+    assert not serial["bootstrap_lower"].equals( scan( max_workers=1, seed=1 )["bootstrap_lower"] )
+
+    # Neither region has 8 epiweeks of sequences.
+    assert set( zip( serial["region"], serial["window"] ) ) == { ("San Diego", 4), ("Baja California", 4) }
+    xbb = serial.loc[serial["lineage"] == "XBB.1.5"]
+    assert ( xbb["growth_rate"] > 0 ).all()
+    assert ( xbb["bootstrap_lower"] < xbb["growth_rate"] ).all() and ( xbb["growth_rate"] < xbb["bootstrap_upper"] ).all()
+
+
+def test_failed_windows_are_skipped():
+    # Each lineage is only sequenced in one epiweek, so their growth rates can't be estimated.
+    counts = pd.DataFrame( { "week" : [0.0, 0.0, 7.0, 7.0], "lineage" : pd.Categorical( ["Other", "A", "Other", "B"], categories=["Other", "A", "B"] ),
+                             "count" : [10, 10, 10, 10] } )
+    assert fit_window( counts ) is None
@@ -0,0 +1,58 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from src.http_cache import output_ids, register_http_cache
+
+
+@pytest.fixture
+def server():
+    server = Flask( __name__ )
+    server.calls = 0
+    server.version = "v1"
+
+    @server.route( "/_dash-update-component", methods=["POST"] )
+    def update():
+        server.calls += 1
+        return jsonify( { "response" : { "points" : list( range( 1000 ) ) } } )
+
+    register_http_cache( server, lambda: server.version, uncached_outputs=["commit-date"] )
+    return server
+
+
+def post( client, output="zip-graph.figure", **headers ):
+    body = { "output" : output, "inputs" : [{ "id" : "url", "property" : "pathname", "value" : "/" }] }
+    return client.post( "/_dash-update-component", data=json.dumps( body ), content_type="application/json", headers=headers )
+
+
+def test_revalidation( server ):
+    client = server.test_client()
+    response = post( client )
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+
+    assert post( client, **{ "If-None-Match" : etag } ).status_code == 304
+    assert server.calls == 1, "Revalidated requests shouldn't run the callback."
+
+    server.version = "v2"
+    assert post( client, **{ "If-None-Match" : etag } ).status_code == 200
+
+    uncached = post( client, output="commit-date.children" )
+    assert "ETag" not in uncached.headers
+
+
+def test_compression( server ):
+    client = server.test_client()
+    plain = post( client )
+    compressed = post( client, **{ "Accept-Encoding" : "gzip" } )
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress( compressed.data ) == plain.data
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+    assert post( client, **{ "If-None-Match" : compressed.headers["ETag"] } ).status_code == 304
+
+
+def test_output_ids():
+    assert output_ids( "zip-graph.figure" ) == { "zip-graph" }
+    assert output_ids( "..cum-graph.figure...daily-graph.figure..." ) == { "cum-graph", "daily-graph" }
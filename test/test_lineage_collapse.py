@@ -0,0 +1,38 @@
+import pandas as pd
+
+from src.lineage_collapse import LineageCollapser
+
+
+class StandInAliasor:
+    def uncompress( self, lineage ):
+        return lineage.replace( "BQ", "B.1.1.529.5.3.1.1.1.1.1", 1 )
+
+    def partial_compress( self, lineage, accepted_aliases ):
+        return lineage.replace( "B.1.1.529", "BA", 1 )
+
+
+def test_collapse():
+    lineages = pd.Series( ["BQ.1.1"] * 3 + ["BQ.1"] * 2 + ["BA.5.3.1.1.1.1.1.1.2"] * 2 + ["BA.2.3"] * 4 + ["XBB.1.5"] )
+    collapser = LineageCollapser( StandInAliasor() )
+
+    collapsed = collapser.collapse( lineages, forced_lineages=["XBB.1.5"], rounds=3, min_sequences=3, verbose=False )
+    assert collapsed == { "BA.2.3" : "BA.2.3", "BA.5.3.1.1.1.1.1.1.2" : "BA.5.3.1.1.1.1.1.1", "BQ.1" : "BA.5.3.1.1.1.1.1.1",
+                          "BQ.1.1" : "BA.5.3.1.1.1.1.1.1", "XBB.1.5" : "XBB.1.5" }
+    assert collapser.collapse( lineages, forced_lineages=[], rounds=3, min_sequences=4, verbose=False )["BA.2.3"] == "Other"
+
+    # Aliases are only expanded the first time a lineage is seen.
+    assert collapser.parents[collapser.node( "BQ.1" )] == collapser.node( "BA.5.3.1.1.1.1.1.1" )
+    # Single level BA lineages are compressed back into themselves, so they are never collapsed further.
+    assert collapser.parent( "BA.2" ) == "BA.2"
+
+
+def test_parents_are_resolved_once():
+    collapser = LineageCollapser( StandInAliasor() )
+    resolved = list()
+    parent = collapser.parent
+    collapser.parent = lambda lineage: resolved.append( lineage ) or parent( lineage )
+
+    collapser.node( "BQ.1.1" )
+    collapser.node( "BQ.1" )
+    assert sorted( resolved ) == sorted( set( resolved ) )
+    assert collapser.names[collapser.parents[collapser.node( "BQ.1.1" )]] == "BQ.1"
@@ -0,0 +1,65 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.lineage_counts import LineageCube
+from src.sequence_store import SequenceStore
+
+
+@pytest.fixture( scope="module" )
+def cube():
+    rng = np.random.default_rng( 11 )
+    n = 600
+    seqs = pd.DataFrame( { "ID" : [f"SEQ{i}" for i in range( n )],
+                           "epiweek" : pd.Timestamp( "2022-01-02" ) + pd.to_timedelta( 7 * rng.integers( 0, 12, n ), unit="D" ),
+                           "zipcode" : rng.choice( ["91950", "92037", "nan", None], n ),
+                           "provider" : rng.choice( ["SEARCH", "Helix", None], n ),
+                           "sequencer" : rng.choice( ["SEARCH", "Helix"], n ),
+                           "state" : rng.choice( ["San Diego", "Baja California"], n, p=[0.8, 0.2] ),
+                           "lineage" : rng.choice( ["BA.2", "BA.5.2.1", "B.1.617.2", None], n, p=[0.4, 0.3, 0.2, 0.1] ),
+                           "days_past" : rng.integers( 0, 400, n ) } )
+    seqs.loc[rng.choice( n, 10, replace=False ), "epiweek"] = pd.NaT
+    for column in ["zipcode", "provider", "sequencer", "state", "lineage"]:
+        seqs[column] = seqs[column].astype( "category" )
+    return LineageCube( SequenceStore( seqs ) )
+
+
+def reference( seqs, state=None, window=None, provider=None, sequencer=None, zip_f=None ):
+    """ Per-callback pivot_table the cube replaced.
+    """
+    mask = pd.Series( True, index=seqs.index )
+    if state:
+        mask &= seqs["state"] == state
+    if window:
+        mask &= seqs["days_past"] <= window
+    if provider:
+        mask &= seqs["provider"] == provider
+    if sequencer:
+        mask &= seqs["sequencer"] == sequencer
+    if zip_f:
+        mask &= seqs["zipcode"].isin( zip_f if isinstance( zip_f, list ) else [zip_f] )
+    counts = seqs.loc[mask].pivot_table( index="epiweek", columns="lineage", values="ID", aggfunc="count", fill_value=0 )
+    counts = counts.loc[( counts > 0 ).any( axis=1 ), ( counts > 0 ).any( axis=0 )]
+    counts.columns = pd.Index( counts.columns.astype( object ), name="lineage" )
+    return counts.astype( np.int64 )
+
+
+FILTERS = list( itertools.product( [None, "San Diego", "Baja California"], [None, 30, 365, 90], [None, "Helix"], [None, "SEARCH"],
+                                   [None, "92037", ["91950", "nan"]] ) )
+
+
+@pytest.mark.parametrize( "state,window,provider,sequencer,zip_f", FILTERS )
+def test_counts_match_pivot_table( cube, state, window, provider, sequencer, zip_f ):
+    expected = reference( cube.store.sequences, state, window, provider, sequencer, zip_f )
+    counts = cube.counts( state, window, provider, sequencer, zip_f )
+    counts.columns = counts.columns.astype( object )
+    pd.testing.assert_frame_equal( counts, expected )
+
+
+def test_rows_with_missing_metadata_are_counted( cube ):
+    seqs = cube.store.sequences
+    counted = seqs["epiweek"].notna() & seqs["lineage"].notna()
+    assert ( seqs.loc[counted, "provider"].isna() ).any() and ( seqs.loc[counted, "zipcode"].isna() ).any()
+    assert cube.counts().to_numpy().sum() == counted.sum()
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from src.plot import compact_series, lttb, plot_wastewater_seqs
+
+
+def test_lttb_keeps_extremes():
+    x = np.arange( 1000, dtype=float )
+    y = np.sin( x / 50 )
+    y[437] = 5
+    kept = lttb( x, y, 100 )
+    assert len( kept ) == 100
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all( np.diff( kept ) > 0 )
+    assert 437 in kept
+
+    np.testing.assert_array_equal( lttb( x[:50], y[:50], 100 ), np.arange( 50 ) )
+
+
+def test_compact_series_round_trip():
+    dates = pd.Series( pd.date_range( "2021-01-01", periods=10 ) )
+    values = pd.Series( np.arange( 10 ) / 3 )
+
+    data = compact_series( dates, values )
+    assert data["x0"] == dates[0].value // 10**6
+    assert data["dx"] == 24 * 60 * 60 * 1000
+    np.testing.assert_allclose( data["y"], values, rtol=1e-5 )
+
+    # Markers on missing days are left empty, lines keep explicit dates so their gaps aren't drawn.
+    gaps = compact_series( dates.drop( [3, 4] ), values.drop( [3, 4] ).round(), markers=True )
+    assert list( gaps["y"] ) == [0, 0, 1, None, None, 2, 2, 2, 3, 3]
+    lines = compact_series( dates.drop( [3, 4] ), values.drop( [3, 4] ) )
+    assert list( pd.to_datetime( lines["x"], unit="ms" ) ) == list( dates.drop( [3, 4] ) )
+
+
+def test_stacked_wastewater_traces_share_dates():
+    dates = pd.date_range( "2022-01-01", periods=60, name="Date" )
+    rng = np.random.default_rng( 5 )
+    seqs = pd.DataFrame( { "BA.2" : rng.uniform( 0, 50, len( dates ) ), "XBB" : rng.uniform( 0, 40, len( dates ) ),
+                           "source" : "PointLoma" }, index=dates )
+    config = { "Omicron" : { "members" : ["BA.2"], "name" : "Omicron", "color" : "#56B4E9" },
+               "Recombinants" : { "members" : ["XBB"], "name" : "Recombinants", "color" : "#D55E00" },
+               "Other" : { "members" : [], "name" : "Other", "color" : "#dddddd" } }
+
+    compact = plot_wastewater_seqs( None, seqs, None, config, "prevalence", smooth=False )
+    full = plot_wastewater_seqs( None, seqs, None, config, "prevalence", smooth=False, compact=False )
+    assert len( { ( trace.x0, trace.dx ) for trace in compact.data } ) == 1, "Stacked traces have to share their dates."
+    for compact_trace, full_trace in zip( compact.data, full.data ):
+        assert len( compact_trace.y ) == len( dates )
+        np.testing.assert_allclose( np.asarray( compact_trace.y, dtype=float ), np.asarray( full_trace.y, dtype=float ), rtol=1e-5 )
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+
+from src.remote_cache import RemoteCache
+
+
+def test_get_reads_from_memory( server, tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    url = f"{server.url}/data.csv"
+    assert cache.get( url ) == b"a,b\n1,2\n"
+    assert cache.get( url ) == b"a,b\n1,2\n"
+    assert len( server.requests ) == 1, "Second read should be served from memory."
+
+
+def test_refresh_revalidates( server, tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    url = f"{server.url}/data.csv"
+    version = cache.version( url )
+
+    assert not cache.refresh( url ), "Unchanged file should be answered with a 304."
+    assert cache.version( url ) == version
+
+    server.files["/data.csv"] = b"a,b\n3,4\n"
+    assert cache.refresh( url )
+    assert cache.get( url ) == b"a,b\n3,4\n"
+    assert cache.version( url ) != version
+
+
+def test_disk_copy_used_when_remote_unreachable( server, tmp_path ):
+    url = f"{server.url}/data.csv"
+    RemoteCache( cache_dir=str( tmp_path ), background=False ).get( url )
+
+    server.files.clear()
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    assert cache.get( url ) == b"a,b\n1,2\n"
+    assert not cache.refresh( url ), "A failed refresh should keep serving the previous copy."
+    assert cache.get( url ) == b"a,b\n1,2\n"
+
+
+def test_local_fallback( server, tmp_path ):
+    fallback = tmp_path / "fallback.csv"
+    fallback.write_bytes( b"a,b\n5,6\n" )
+    cache = RemoteCache( cache_dir=str( tmp_path / "cache" ), background=False )
+    url = f"{server.url}/missing.csv"
+    cache.register( url, fallback=str( fallback ) )
+    assert cache.get( url ) == b"a,b\n5,6\n"
+
+
+def test_memoize_recomputes_on_change( server, tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    url = f"{server.url}/data.csv"
+    calls = []
+
+    @cache.memoize( url )
+    def loader():
+        calls.append( 1 )
+        return cache.get( url )
+
+    loader()
+    loader()
+    assert len( calls ) == 1
+
+    server.files["/data.csv"] = b"a,b\n7,8\n"
+    cache.refresh( url )
+    assert loader() == b"a,b\n7,8\n"
+    assert len( calls ) == 2
+
+
+def test_background_refresh( server, tmp_path ):
+    cache = RemoteCache( ttl=0, cache_dir=str( tmp_path ), background=True )
+    url = f"{server.url}/data.csv"
+    cache.get( url )
+    server.files["/data.csv"] = b"a,b\n9,9\n"
+
+    cache.start( interval=0.05 )
+    try:
+        for _ in range( 100 ):
+            if cache.get( url ) == b"a,b\n9,9\n":
+                break
+            threading.Event().wait( 0.05 )
+    finally:
+        cache.stop()
+    assert cache.get( url ) == b"a,b\n9,9\n"
+
+
+def test_lock_is_reinitialized_after_fork( tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    cache._lock.acquire()
+    pid = os.fork()
+    if pid == 0:
+        acquired = cache._lock.acquire( timeout=1 )
+        os._exit( 0 if acquired and cache._session_pid == os.getpid() else 1 )
+    _, status = os.waitpid( pid, 0 )
+    cache._lock.release()
+    assert os.WEXITSTATUS( status ) == 0
+
+
+def test_start_requires_background( tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    cache.start()
+    assert cache._thread is None
+
+
+def test_combined_version_only_depends_on_content( server, tmp_path ):
+    server.files["/other.csv"] = b"c\n1\n"
+    urls = [f"{server.url}/data.csv", f"{server.url}/other.csv"]
+    first, second = [RemoteCache( cache_dir=str( tmp_path / name ), background=False ) for name in ["first", "second"]]
+    for cache in [first, second]:
+        for url in urls:
+            cache.register( url )
+    first.get( urls[0] )
+    assert first.combined_version() == second.combined_version(), "Versions shouldn't depend on the files used so far."
+
+    server.files["/other.csv"] = b"c\n2\n"
+    version = first.combined_version()
+    first.refresh( urls[1] )
+    assert first.combined_version() != version
+
+
+def test_start_prefetches_registered_files( server, tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=True )
+    url = f"{server.url}/data.csv"
+    cache.register( url )
+    cache.register( f"{server.url}/missing.csv" )
+    cache.start( interval=60 )
+    try:
+        assert url in cache._entries, "Registered files should be loaded before serving."
+        assert cache._thread.is_alive(), "A file that can't be loaded shouldn't stop the refresh thread."
+    finally:
+        cache.stop()
+
+
+def test_not_modified_only_rewrites_metadata( server, tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    url = f"{server.url}/data.csv"
+    cache.get( url )
+    path = cache._disk_path( url )
+    data_mtime = os.stat( path + ".data" ).st_mtime_ns
+    with open( path + ".json", "r" ) as f:
+        fetched_at = json.load( f )["fetched_at"]
+
+    threading.Event().wait( 0.01 )
+    assert not cache.refresh( url )
+    assert os.stat( path + ".data" ).st_mtime_ns == data_mtime, "A 304 shouldn't rewrite the content."
+    with open( path + ".json", "r" ) as f:
+        assert json.load( f )["fetched_at"] > fetched_at
@@ -0,0 +1,59 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.sequence_store import RECENCY_BUCKETS, SequenceStore
+
+ZIPS = ["91950", "92037", "92101", "nan"]
+
+
+@pytest.fixture( scope="module" )
+def store():
+    rng = np.random.default_rng( 7 )
+    n = 400
+    seqs = pd.DataFrame( { "ID" : [f"SEQ{i}" for i in range( n )],
+                           "zipcode" : rng.choice( ZIPS, n ),
+                           "provider" : rng.choice( ["SEARCH", "Helix", "CDPH"], n ),
+                           "sequencer" : rng.choice( ["SEARCH", "Helix"], n ),
+                           "state" : rng.choice( ["San Diego", "Baja California"], n, p=[0.8, 0.2] ),
+                           "lineage" : rng.choice( ["BA.2", "BA.5.2.1", "B.1.617.2"], n ),
+                           "days_past" : rng.integers( 0, 500, n ) },
+                         index=rng.permutation( n ) )
+    for column in ["zipcode", "provider", "sequencer", "state"]:
+        seqs[column] = seqs[column].astype( "category" )
+    return SequenceStore( seqs )
+
+
+def reference( seqs, state=None, window=None, provider=None, sequencer=None, zip_f=None ):
+    """ Boolean filters of the per-callback implementation SequenceStore replaced.
+    """
+    mask = pd.Series( True, index=seqs.index )
+    if state:
+        mask &= seqs["state"] == state
+    if window:
+        mask &= seqs["days_past"] <= window
+    if provider:
+        mask &= seqs["provider"].isin( provider if isinstance( provider, list ) else [provider] )
+    if sequencer:
+        mask &= seqs["sequencer"].isin( sequencer if isinstance( sequencer, list ) else [sequencer] )
+    if zip_f:
+        mask &= seqs["zipcode"].isin( zip_f if isinstance( zip_f, list ) else [zip_f] )
+    return seqs.loc[mask]
+
+
+FILTERS = list( itertools.product( [None, "San Diego", "Baja California"], [None, *RECENCY_BUCKETS, 90], [None, "Helix", ["SEARCH", "CDPH"]],
+                                   [None, "SEARCH"], [None, "92037", ["91950", "nan"]] ) )
+
+
+@pytest.mark.parametrize( "state,window,provider,sequencer,zip_f", FILTERS )
+def test_select_matches_boolean_filters( store, state, window, provider, sequencer, zip_f ):
+    expected = reference( store.sequences, state, window, provider, sequencer, zip_f )
+    pd.testing.assert_frame_equal( store.select( state, window, provider, sequencer, zip_f ), expected )
+
+
+def test_unknown_values_select_nothing( store ):
+    assert len( store.select( state="Los Angeles" ) ) == 0
+    assert len( store.select( zip_f="00000" ) ) == 0
+    np.testing.assert_array_equal( store.value_codes( "zipcode", ["92037", "00000"] ), [ZIPS.index( "92037" ), -1] )
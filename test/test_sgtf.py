@@ -0,0 +1,71 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import savgol_filter
+
+import src.format_resources as format_data
+from src.remote_cache import RemoteCache
+
+PARAMETERS = [0.01, 0.1, 0.003, 0.1, 2e-7, 0.1, 1e-9, 0.1, 1e-11, 0.05]
+
+
+def sgtf_tests( days: int = 400 ) -> pd.DataFrame:
+    """ SGTF data following the mixture model, as prepared by load_sgtf_data().
+    """
+    rng = np.random.default_rng( 1 )
+    ndays = np.arange( 1, days + 1 )
+    percent = np.clip( format_data._lgm_mixture( ndays, *PARAMETERS ) + rng.normal( 0, 0.01, days ), 0, 1 )
+    tests = pd.DataFrame( { "Date" : pd.date_range( "2021-11-01", periods=days ), "percent" : percent, "ndays" : ndays } )
+    tests["percent_filter"] = savgol_filter( tests["percent"], window_length=7, polyorder=2 )
+    return tests
+
+
+def test_vectorized_fit_matches_per_day_evaluation():
+    fit, covar, fit_df, estimates = format_data.fit_sgtf_model( sgtf_tests() )
+
+    # Evaluated one day at a time, as the curves were before being vectorized.
+    sigma = np.sqrt( np.diagonal( covar ) ) * np.array( [1, 1, 1, 1, -1, -1, 1, 1, -0.5, -1] )
+    for column, parameters in [("fit_y", fit), ("fit_lower", fit + sigma), ("fit_upper", fit - sigma)]:
+        expected = [format_data._lgm_mixture( i, *parameters ) for i in range( len( fit_df ) )]
+        np.testing.assert_allclose( fit_df[column], expected, rtol=1e-12 )
+
+
+SGTF_CSV = b"""Date,sgtf_all,sgtf_likely,sgtf_unlikely,no_sgtf,total_positive,percent_low,percent_all
+2022-01-01,1,1,0,9,10,0.1,0.1
+2022-01-02,2,1,1,8,10,0.1,0.2
+"""
+
+
+@pytest.fixture
+def sgtf_server( server, monkeypatch ):
+    server.files["/sgtf.csv"] = SGTF_CSV
+    monkeypatch.setattr( format_data, "SGTF_URL", f"{server.url}/sgtf.csv" )
+    monkeypatch.setattr( format_data, "_sgtf_fits", dict() )
+    fits = list()
+    monkeypatch.setattr( format_data, "savgol_filter", lambda values, **kwargs: values )
+    monkeypatch.setattr( format_data, "fit_sgtf_model", lambda tests: fits.append( tests ) or (np.ones( 10 ), np.eye( 10 ), pd.DataFrame(), pd.DataFrame()) )
+    return fits
+
+
+def test_fit_without_cache_dir( sgtf_server, monkeypatch ):
+    monkeypatch.setattr( format_data, "remote_data", RemoteCache( cache_dir=None, background=False ) )
+    format_data.load_sgtf_data()
+    assert len( sgtf_server ) == 1
+
+
+def test_previous_fits_are_removed( sgtf_server, monkeypatch, tmp_path ):
+    cache = RemoteCache( cache_dir=str( tmp_path ), background=False )
+    monkeypatch.setattr( format_data, "remote_data", cache )
+    with open( tmp_path / "sgtf_fit_previous.pkl", "wb" ) as f:
+        pickle.dump( { "results" : (pd.DataFrame(), pd.DataFrame()) }, f )
+
+    format_data.load_sgtf_data()
+    fit_path = f"sgtf_fit_{cache.version( format_data.SGTF_URL )}.pkl"
+    assert sorted( name for name in os.listdir( tmp_path ) if name.startswith( "sgtf_fit_" ) ) == [fit_path]
+
+    format_data._sgtf_fits.clear()
+    format_data.load_sgtf_data()
+    assert len( sgtf_server ) == 1, "The fit on disk should be reused."
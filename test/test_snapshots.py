@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+import pytest
+
+import src.format_resources as format_data
+import src.snapshots as snapshots
+
+pytest.importorskip( "pyarrow" )
+
+CSV = """ID,collection_date,epiweek,zipcode,sequencer,provider,lineage,state,days_past
+SEQ1,2022-01-03,2022-01-02,92037.0,SEARCH,SEARCH,BA.1,San Diego,10
+SEQ2,2022-01-05,2022-01-02,92101:92102,Helix,Helix,BA.2,San Diego,8
+SEQ3,2022-01-10,2022-01-09,,SEARCH,SEARCH,BA.2,Baja California,3
+"""
+
+
+@pytest.fixture
+def paths( tmp_path, monkeypatch ):
+    csv, snapshot = str( tmp_path / "sequences.csv" ), str( tmp_path / "sequences.arrow" )
+    with open( csv, "w" ) as f:
+        f.write( CSV )
+    monkeypatch.setattr( snapshots, "SEQUENCES_CSV", csv )
+    monkeypatch.setattr( snapshots, "SEQUENCES_SNAPSHOT", snapshot )
+    return csv, snapshot
+
+
+def test_round_trip( paths ):
+    csv, snapshot = paths
+    expected = snapshots.format_sequences( pd.read_csv( csv ) )
+    snapshots.write_snapshot( expected, snapshot, source=csv )
+    pd.testing.assert_frame_equal( snapshots.read_snapshot( snapshot, source=csv ), expected )
+
+
+def test_unchanged_source_isnt_hashed( paths, monkeypatch ):
+    csv, snapshot = paths
+    snapshots.write_snapshot( snapshots.format_sequences( pd.read_csv( csv ) ), snapshot, source=csv )
+
+    def fail( path ):
+        raise AssertionError( f"{path} shouldn't be hashed." )
+
+    monkeypatch.setattr( snapshots, "_file_hash", fail )
+    assert snapshots.read_snapshot( snapshot, source=csv ) is not None
+
+
+def test_stale_snapshot_is_ignored( paths ):
+    csv, snapshot = paths
+    snapshots.write_snapshot( snapshots.format_sequences( pd.read_csv( csv ) ), snapshot, source=csv )
+
+    # Same size, so staleness is only detected through the hash.
+    with open( csv, "w" ) as f:
+        f.write( CSV.replace( "BA.1", "BA.5" ) )
+    stat = os.stat( csv )
+    os.utime( csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1) )
+    assert snapshots.read_snapshot( snapshot, source=csv ) is None
+
+    with open( csv, "a" ) as f:
+        f.write( "SEQ4,2022-01-11,2022-01-09,92037,SEARCH,SEARCH,BA.2,San Diego,2\n" )
+    assert snapshots.read_snapshot( snapshot, source=csv ) is None
+
+
+def test_load_sequences_falls_back_to_csv( paths ):
+    csv, snapshot = paths
+    expected = snapshots.format_sequences( pd.read_csv( csv ) )
+    pd.testing.assert_frame_equal( format_data.load_sequences(), expected )
+
+    snapshots.write_snapshot( expected, snapshot, source=csv )
+    with open( csv, "a" ) as f:
+        f.write( "SEQ4,2022-01-11,2022-01-09,92037,SEARCH,SEARCH,BA.2,San Diego,2\n" )
+    assert len( format_data.load_sequences() ) == 4, "A stale snapshot should be replaced by the CSV."
+
+
+def test_columns_point_into_the_snapshot( paths ):
+    csv, snapshot = paths
+    snapshots.write_snapshot( snapshots.format_sequences( pd.read_csv( csv ) ), snapshot, source=csv )
+    sequences = snapshots.read_snapshot( snapshot, source=csv )
+    # Arrays backed by the read-only memory map, rather than private copies.
+    assert not sequences["days_past"].to_numpy().flags.writeable
+    assert not sequences["collection_date"].to_numpy().flags.writeable
@@ -0,0 +1,166 @@
+import importlib.util
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+SCRIPT = os.path.join( os.path.dirname( __file__ ), "..", ".github", "scripts", "update_seqs.py" )
+
+
+@pytest.fixture( scope="module" )
+def update_seqs():
+    spec = importlib.util.spec_from_file_location( "update_seqs", SCRIPT )
+    module = importlib.util.module_from_spec( spec )
+    spec.loader.exec_module( module )
+    return module
+
+
+def raw_metadata( n: int = 40, start: int = 10000 ) -> pd.DataFrame:
+    """ Upstream metadata, as strings, covering each provider and sequencer rule and rows that are filtered out.
+    """
+    rows = list()
+    for i in range( n ):
+        rows.append( { "ID" : f"SEARCH-{start + i}",
+                       "collection_date" : f"2022-0{1 + i % 9}-{10 + i % 19}",
+                       "location" : ["North America/USA/California/San Diego", "North America/Mexico/Baja California/Tijuana",
+                                     "North America/USA/California/Los Angeles"][i % 3],
+                       "authors" : ["SEARCH", "Helix"][i % 2],
+                       "originating_lab" : ["UCSD EXCITE", "Sharp HealthCare Laboratory", "Andersen lab at Scripps Research"][i % 3],
+                       "zipcode" : ["92037", "92101-1234", "", "91950"][i % 4],
+                       "host" : "Environment" if i % 8 == 7 else "Human",
+                       "percent_coverage_cds" : str( 90 + i % 10 ) } )
+    return pd.DataFrame( rows )
+
+
+def lineage_report( md: pd.DataFrame ) -> pd.DataFrame:
+    lineages = ["BA.2", "BA.5.2.1", "None", "B.1.617.2"]
+    return pd.DataFrame( { "taxon" : [f"{ID}/2022" for ID in md["ID"]],
+                           "lineage" : [lineages[i % len( lineages )] for i in range( len( md ) )] } )
+
+
+def as_csv( seqs: pd.DataFrame ) -> str:
+    # Compared as written to resources/sequences.csv.
+    return seqs.reset_index( drop=True ).to_csv( index=False )
+
+
+@pytest.fixture
+def workdir( tmp_path, monkeypatch ):
+    os.makedirs( tmp_path / "resources" )
+    for loc in ["resources/excite_providers.csv", "resources/sdphl_sequences.txt"]:
+        shutil.copy( loc, tmp_path / loc )
+    monkeypatch.chdir( tmp_path )
+    return tmp_path
+
+
+def write_upstream( workdir, md ) -> tuple:
+    md_loc, pango_loc = str( workdir / "metadata.csv" ), str( workdir / "lineage_report.csv" )
+    md.to_csv( md_loc, index=False )
+    lineage_report( md ).to_csv( pango_loc, index=False )
+    return md_loc, pango_loc
+
+
+def rebuild( update_seqs, md_loc, pango_loc ) -> pd.DataFrame:
+    md = update_seqs.update_metadata( update_seqs.load_metadata( md_loc ) )
+    return update_seqs.add_lineages( md.drop( columns=["row_hash"] ), update_seqs.load_lineages( md["num"], loc=pango_loc ) )
+
+
+def test_chunked_reads_match( update_seqs, workdir, monkeypatch ):
+    md_loc, pango_loc = write_upstream( workdir, raw_metadata() )
+    expected = rebuild( update_seqs, md_loc, pango_loc )
+    monkeypatch.setattr( update_seqs, "CHUNKSIZE", 3 )
+    assert as_csv( rebuild( update_seqs, md_loc, pango_loc ) ) == as_csv( expected )
+
+
+def test_hash_rows( update_seqs, workdir, monkeypatch ):
+    md = raw_metadata()
+    hashes = update_seqs.hash_rows( md )
+    assert len( set( hashes ) ) == len( md )
+    assert ( update_seqs.hash_rows( md.iloc[::-1] )[::-1] == hashes ).all(), "Hashes shouldn't depend on the position of a row."
+
+    changed = md.copy()
+    changed.loc[5, "originating_lab"] = "Helix"
+    assert ( ( update_seqs.hash_rows( changed ) != hashes ) == ( md.index == 5 ) ).all()
+
+
+def test_normalization_version( update_seqs, workdir, monkeypatch ):
+    version = update_seqs.normalization_version()
+    with open( "resources/sdphl_sequences.txt", "a" ) as f:
+        f.write( "SEARCH-10005\n" )
+    assert update_seqs.normalization_version() != version, "Changing a normalization source should change the version."
+
+    version = update_seqs.normalization_version()
+    monkeypatch.setattr( update_seqs, "NORMALIZATION_VERSION", update_seqs.NORMALIZATION_VERSION + 1 )
+    assert update_seqs.normalization_version() != version
+
+
+def write_previous_run( update_seqs, md_loc, pango_loc ) -> pd.DataFrame:
+    md = update_seqs.update_metadata( update_seqs.load_metadata( md_loc ) )
+    seqs = update_seqs.add_lineages( md.drop( columns=["row_hash"] ), update_seqs.load_lineages( md["num"], loc=pango_loc ) )
+    seqs.to_csv( update_seqs.SEQUENCES_CSV, index=False )
+    update_seqs.save_state( md )
+    return seqs
+
+
+def test_state_only_holds_hashes( update_seqs, workdir ):
+    write_previous_run( update_seqs, *write_upstream( workdir, raw_metadata() ) )
+    state = pd.read_csv( update_seqs.STATE_LOC, comment="#" )
+    assert list( state.columns ) == ["ID", "row_hash"]
+    assert update_seqs.load_state() is not None
+
+
+def test_stale_state_is_ignored( update_seqs, workdir, monkeypatch ):
+    write_previous_run( update_seqs, *write_upstream( workdir, raw_metadata() ) )
+    with monkeypatch.context() as patch:
+        patch.setattr( update_seqs, "NORMALIZATION_VERSION", update_seqs.NORMALIZATION_VERSION + 1 )
+        assert update_seqs.load_state() is None, "A change of normalization should force a full rebuild."
+    assert update_seqs.load_state() is not None
+
+    with open( update_seqs.SEQUENCES_CSV, "a" ) as f:
+        f.write( "SEARCH-99999,2022-01-10,92037,2022-01-09,1,Helix,Helix,BA.2,San Diego\n" )
+    assert update_seqs.load_state() is None, "The state should only be used with the sequences it was written with."
+
+
+def test_incremental_update_matches_full_rebuild( update_seqs, workdir, monkeypatch ):
+    old = raw_metadata()
+    md_loc, pango_loc = write_upstream( workdir, old )
+    previous = write_previous_run( update_seqs, md_loc, pango_loc )
+
+    # One row removed, one modified and a few added upstream.
+    new = pd.concat( [old.drop( index=4 ), raw_metadata( 5, start=20000 )], ignore_index=True )
+    new.loc[new["ID"] == "SEARCH-10009", "originating_lab"] = "Sharp HealthCare Laboratory"
+    md_loc, pango_loc = write_upstream( workdir, new )
+    expected = rebuild( update_seqs, md_loc, pango_loc )
+
+    # Loaded before normalize_metadata() is replaced, which would change the normalization version.
+    state = update_seqs.load_state()
+    normalized = list()
+    normalize_metadata = update_seqs.normalize_metadata
+    monkeypatch.setattr( update_seqs, "normalize_metadata", lambda md: normalized.extend( md["ID"] ) or normalize_metadata( md ) )
+    md = update_seqs.update_metadata( update_seqs.load_metadata( md_loc ), state )
+    seqs = update_seqs.add_lineages( md.drop( columns=["row_hash"] ), update_seqs.load_lineages( md["num"], loc=pango_loc ) )
+
+    assert as_csv( seqs ) == as_csv( expected )
+    # Sequences dropped for their lineage aren't kept by the previous run, so they are normalized again as well.
+    kept = set( update_seqs.load_metadata( md_loc )["ID"] )
+    assert set( normalized ) == kept - ( set( previous["ID"] ) - { "SEARCH-10009" } )
+    assert { "SEARCH-10009", "SEARCH-20000" } <= set( normalized )
+
+
+def test_full_flag_matches_incremental( update_seqs, workdir, monkeypatch ):
+    def download( url, path, **kwargs ):
+        shutil.copy( pango_loc, path )
+        return path
+
+    monkeypatch.setattr( update_seqs, "download", download )
+
+    old = raw_metadata()
+    md_loc, pango_loc = write_upstream( workdir, old )
+    load_metadata = update_seqs.load_metadata
+    monkeypatch.setattr( update_seqs, "load_metadata", lambda: load_metadata( md_loc ) )
+    update_seqs.download_search()
+
+    new = pd.concat( [old, raw_metadata( 3, start=30000 )], ignore_index=True )
+    md_loc, pango_loc = write_upstream( workdir, new )
+    incremental = as_csv( update_seqs.download_search( incremental=True ) )
+    assert as_csv( update_seqs.download_search( incremental=False ) ) == incremental
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from src.sequence_store import SequenceStore
+from src.variants import LineageClassifier
+
+VOC = { "B.1.617.2" : "Delta-like", "AY.4" : "Delta-like", "BA.2" : "Omicron-like", "B.1.1.7" : "Alpha-like" }
+VOI = { "C.37" : "Lambda-like" }
+ALIASES = { "AY" : "B.1.617.2", "BA" : "B.1.1.529", "BQ" : "B.1.1.529.5.3.1.1.1.1", "C" : "B.1.1.1", "XBB" : "XBB" }
+
+
+def test_descendants_are_classified():
+    classifier = LineageClassifier( VOC, VOI, aliases=ALIASES )
+    assert classifier.classify( "B.1.617.2" ) == "Delta-like"
+    assert classifier.classify( "AY.4.2" ) == "Delta-like"
+    assert classifier.classify( "AY.103" ) == "Delta-like", "Aliases should be expanded before matching."
+    assert classifier.classify( "BA.2.12.1" ) == "Omicron-like"
+    assert classifier.classify( "BA.1" ) is None
+    assert classifier.classify( "BQ.1.1" ) is None
+    assert classifier.classify( "C.37.1" ) == "Lambda-like"
+    assert classifier.is_voi( "C.37.1" ) and not classifier.is_voc( "C.37.1" )
+    assert classifier.classify( "XBB.1.5" ) is None
+    assert classifier.classify( np.nan ) is None
+
+
+def test_deepest_listed_ancestor_wins():
+    classifier = LineageClassifier( { "B.1" : "Broad", "B.1.1.7" : "Alpha-like" } )
+    assert classifier.classify( "B.1.1.7.1" ) == "Alpha-like"
+    assert classifier.classify( "B.1.2" ) == "Broad"
+
+
+def test_codes_match_classify():
+    classifier = LineageClassifier( VOC, VOI, aliases=ALIASES )
+    lineages = pd.Series( ["AY.4.2", "BA.1", None, "C.37", "BA.2.75", "AY.4.2"], dtype="category" )
+    expected = [classifier.classify( lineage ) for lineage in lineages]
+    codes = classifier.codes( lineages )
+    assert [classifier.variants[c] if c >= 0 else None for c in codes] == expected
+
+    vocs = classifier.classify_all( lineages, other="Other", variants=classifier.voc )
+    assert list( vocs ) == ["Delta-like", "Other", "Other", "Other", "Omicron-like", "Delta-like"]
+
+
+def test_sequence_store_codes_match_selection():
+    classifier = LineageClassifier( VOC, VOI, aliases=ALIASES )
+    seqs = pd.DataFrame( { "lineage" : ["AY.4.2", "BA.1", None, "C.37", "BA.2.75", "AY.4.2"],
+                           "state" : ["San Diego", "San Diego", "San Diego", "Baja California", "San Diego", "Baja California"],
+                           "provider" : "SEARCH", "sequencer" : "SEARCH", "zipcode" : "92037", "days_past" : [1, 40, 3, 5, 100, 2] } )
+    store = SequenceStore( seqs, classifier=classifier )
+    idx = store.indices( state="San Diego" )
+    expected = classifier.codes( store.sequences.take( idx )["lineage"], variants=classifier.voc )
+    np.testing.assert_array_equal( store.voc_codes[idx], expected )